@@ -0,0 +1,133 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+import math
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+from scipy.special import erf
+
+# Synthetic mammography edge phantoms with a known MTF. The phantom is a
+# rotated square plate blurred by an isotropic Gaussian PSF of standard
+# deviation sigma (mm, at the detector). A rectangle blurred by a separable
+# Gaussian is the product of two blurred steps, so the image is exact, and
+# the MTF of each edge is exp(-2 pi^2 sigma^2 f^2). Pixels are point sampled,
+# so no pixel aperture term is added to the ground truth.
+
+DIGITAL_MAMMO_SOP_CLASS = "1.2.840.10008.5.1.4.1.1.1.2"
+
+VENDOR_HEADERS = {
+    "hologic": {
+        "Manufacturer": "HOLOGIC, Inc.",
+        "ManufacturerModelName": "Selenia Dimensions",
+        "PhotometricInterpretation": "MONOCHROME2",
+    },
+    "ge": {
+        "Manufacturer": "GE MEDICAL SYSTEMS",
+        "ManufacturerModelName": "Senographe Pristina",
+        "PhotometricInterpretation": "MONOCHROME2",
+    },
+    "siemens": {
+        "Manufacturer": "SIEMENS",
+        "ManufacturerModelName": "Mammomat Revelation",
+        "PhotometricInterpretation": "MONOCHROME2",
+    },
+    "fuji": {
+        "Manufacturer": "FUJIFILM Corporation",
+        "ManufacturerModelName": "FDR MS-3500",
+        "PhotometricInterpretation": "MONOCHROME1",
+    },
+}
+
+PADDLES = {"conventional": "24x30 CONTACT", "mag": "10CM MAG"}
+
+
+@dataclass
+class PhantomSpec:
+    vendor: str = "hologic"
+    mode: str = "conventional"
+    shape: tuple[int, int] = (1024, 768)
+    pixel_spacing: float = 0.07  # mm
+    angle: float = 3.0  # degrees, edge tilt from the pixel grid
+    sigma: float = 0.06  # mm, Gaussian PSF at the detector
+    noise: float = 0.0  # standard deviation, in pixel values
+    laterality: str = "L"
+    seed: int = 0
+
+    def true_mtf(self, f: np.ndarray, magnification: float) -> np.ndarray:
+        """
+        Ground truth MTF at frequencies f (cycles/mm). The calculator scales
+        pixel spacing by the magnification factor, so f is at the object plane.
+        """
+        sigma = self.sigma / magnification
+        return np.exp(-2 * math.pi**2 * sigma**2 * np.asarray(f) ** 2)
+
+
+def phantom_pixels(spec: PhantomSpec) -> np.ndarray:
+    """Blurred square plate covering the middle half of the image."""
+    rows, cols = spec.shape
+    y, x = np.indices(spec.shape, dtype=float)
+    y = (y - rows / 2) * spec.pixel_spacing
+    x = (x - cols / 2) * spec.pixel_spacing
+    theta = math.radians(spec.angle)
+    u = x * math.cos(theta) + y * math.sin(theta)
+    v = -x * math.sin(theta) + y * math.cos(theta)
+    half = min(rows, cols) * spec.pixel_spacing / 4
+    scale = math.sqrt(2) * spec.sigma
+
+    def blurred_slab(t: np.ndarray) -> np.ndarray:
+        return 0.5 * (erf((t + half) / scale) - erf((t - half) / scale))
+
+    plate = blurred_slab(u) * blurred_slab(v)
+    pixels = 3000 - 2000 * plate
+    if spec.noise:
+        pixels += np.random.default_rng(spec.seed).normal(0, spec.noise, spec.shape)
+    pixels = np.clip(np.round(pixels), 0, 2**14 - 1)
+    if VENDOR_HEADERS[spec.vendor]["PhotometricInterpretation"] == "MONOCHROME1":
+        pixels = 2**14 - 1 - pixels
+    return pixels.astype(np.uint16)
+
+
+def phantom_dataset(spec: PhantomSpec) -> Dataset:
+    """DICOM dataset with the phantom and vendor specific headers."""
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+    ds.file_meta.MediaStorageSOPClassUID = DIGITAL_MAMMO_SOP_CLASS
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.SOPClassUID = DIGITAL_MAMMO_SOP_CLASS
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.StudyInstanceUID = generate_uid()
+    ds.SeriesInstanceUID = generate_uid()
+    ds.Modality = "MG"
+    ds.PatientName = "Edge^Phantom"
+    ds.PatientID = "PHANTOM"
+    ds.DeviceSerialNumber = f"{spec.vendor.upper()}-0001"
+    for keyword, value in VENDOR_HEADERS[spec.vendor].items():
+        setattr(ds, keyword, value)
+    ds.ImageType = ["ORIGINAL", "PRIMARY", ""]
+    ds.PaddleDescription = PADDLES[spec.mode]
+    ds.EstimatedRadiographicMagnificationFactor = 1.8 if spec.mode == "mag" else 1.0
+    ds.ImageLaterality = spec.laterality
+    ds.ViewPosition = "CC"
+    ds.ImagerPixelSpacing = [spec.pixel_spacing, spec.pixel_spacing]
+    ds.Rows, ds.Columns = spec.shape
+    ds.SamplesPerPixel = 1
+    ds.BitsAllocated = 16
+    ds.BitsStored = 14
+    ds.HighBit = 13
+    ds.PixelRepresentation = 0
+    ds.PixelData = phantom_pixels(spec).tobytes()
+    return ds
+
+
+def write_phantoms(out_dir: str | Path, specs: list[PhantomSpec]) -> list[Path]:
+    """Write one file per spec, named so every file name is unique."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fpaths = []
+    for index, spec in enumerate(specs):
+        fpath = out_dir / f"{index:04d}_{spec.vendor}_{spec.mode}.dcm"
+        phantom_dataset(spec).save_as(fpath, enforce_file_format=True)
+        fpaths.append(fpath)
+    return fpaths
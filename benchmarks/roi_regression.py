@@ -0,0 +1,152 @@
+"""
+Check that coarse to fine ROI search matches the full resolution search.
+
+    python -m benchmarks.roi_regression --factor 4 --shape 3328 2560
+
+For each synthetic phantom, the ROIs are found by mtf.get_labelled_rois over
+the whole image and by the pyramid search. Every ROI must be found by both,
+with no side more than --tolerance pixels apart, canny edge maps overlapping
+by at least --min-overlap, and MTFs within --max-mtf-diff. Exits with 1 if any
+phantom fails, printing the search time of each method.
+"""
+
+from __future__ import annotations
+import argparse
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from gui.calculator import MammoTemplateCalc
+from gui.pipeline import ImagePipeline
+from gui.roi import Box, pyramid_label, roi_boxes
+from gui.utils import lazy_import
+from .phantom import PhantomSpec, phantom_dataset
+
+mtf = lazy_import("mtf")
+
+PARAMS_PATH = Path(__file__).parent.parent / "template_parameters.json"
+
+
+def canny_overlap(
+    full_box: Box, full_canny: np.ndarray, box: Box, canny: np.ndarray
+) -> float:
+    """Intersection over union of the edge pixels where the two ROIs overlap."""
+    common = Box(
+        max(full_box.top, box.top),
+        max(full_box.left, box.left),
+        min(full_box.bottom, box.bottom),
+        min(full_box.right, box.right),
+    )
+    if common.bottom <= common.top or common.right <= common.left:
+        return 0.0
+
+    def crop(roi_box: Box, edges: np.ndarray) -> np.ndarray:
+        return (
+            edges[
+                common.top - roi_box.top : common.bottom - roi_box.top,
+                common.left - roi_box.left : common.right - roi_box.left,
+            ]
+            > 0
+        )
+
+    a, b = crop(full_box, full_canny), crop(box, canny)
+    union = np.count_nonzero(a | b)
+    return np.count_nonzero(a & b) / union if union else 1.0
+
+
+def compare(
+    calculator: MammoTemplateCalc, spec: PhantomSpec, args: argparse.Namespace
+) -> dict:
+    pipeline = ImagePipeline.from_dataset(phantom_dataset(spec), "phantom.dcm")
+    preprocessed = pipeline.preprocessed
+    array = preprocessed.array
+    metadata, sample_spacing = calculator._get_metadata_from_preprocessed(preprocessed)
+
+    start = time.perf_counter()
+    full_rois, full_canny = mtf.get_labelled_rois(array)
+    full_s = time.perf_counter() - start
+    start = time.perf_counter()
+    labelled = pyramid_label(array, args.factor)
+    pyramid_s = time.perf_counter() - start
+    report = {"vendor": spec.vendor, "full_s": full_s, "pyramid_s": pyramid_s}
+    if labelled is None:
+        return dict(report, ok=False, reason="pyramid search failed")
+
+    rois, canny = labelled
+    full_boxes, boxes = roi_boxes(array, full_rois), roi_boxes(array, rois)
+    if not full_boxes or boxes.keys() != full_boxes.keys():
+        return dict(report, ok=False, reason="different edges found")
+    offset = max(boxes[edge].offset(full_boxes[edge]) for edge in boxes)
+    overlap = min(
+        canny_overlap(full_boxes[edge], full_canny[edge], boxes[edge], canny[edge])
+        for edge in boxes
+    )
+    full_mtf, _ = calculator.results_from_edges(
+        calculator.calculate_edge_mtfs(full_rois, full_canny, sample_spacing), metadata
+    )
+    pyramid_mtf, _ = calculator.results_from_edges(
+        calculator.calculate_edge_mtfs(rois, canny, sample_spacing), metadata
+    )
+    mtf_diff = float(np.nanmax(np.abs(full_mtf[:, 1:] - pyramid_mtf[:, 1:]), initial=0))
+    ok = (
+        offset <= args.tolerance
+        and overlap >= args.min_overlap
+        and mtf_diff <= args.max_mtf_diff
+    )
+    return dict(report, ok=ok, offset=offset, overlap=overlap, mtf_diff=mtf_diff)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.roi_regression",
+        description=__doc__.split("\n\n")[0],
+    )
+    parser.add_argument(
+        "--vendors",
+        nargs="+",
+        default=["hologic", "ge", "siemens", "fuji"],
+        choices=["hologic", "ge", "siemens", "fuji"],
+    )
+    parser.add_argument("--angles", nargs="+", type=float, default=[2.0, 4.0])
+    parser.add_argument("--shape", nargs=2, type=int, default=[2048, 1536])
+    parser.add_argument("--factor", type=int, default=4)
+    parser.add_argument("--noise", type=float, default=5.0, help="pixel values")
+    parser.add_argument("--tolerance", type=int, default=2, help="pixels")
+    parser.add_argument("--min-overlap", type=float, default=0.9)
+    parser.add_argument("--max-mtf-diff", type=float, default=0.01)
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    calculator = MammoTemplateCalc(PARAMS_PATH)
+    print(
+        f"{'vendor':<10}{'angle':>7}{'full ms':>10}{'pyramid ms':>12}"
+        f"{'offset':>8}{'overlap':>9}{'MTF diff':>10}  result"
+    )
+    failed = 0
+    for seed, (vendor, angle) in enumerate(
+        (vendor, angle) for vendor in args.vendors for angle in args.angles
+    ):
+        spec = PhantomSpec(
+            vendor=vendor,
+            shape=tuple(args.shape),
+            angle=angle,
+            noise=args.noise,
+            seed=seed,
+        )
+        report = compare(calculator, spec, args)
+        failed += not report["ok"]
+        print(
+            f"{vendor:<10}{angle:>7.1f}{report['full_s'] * 1e3:>10.1f}"
+            f"{report['pyramid_s'] * 1e3:>12.1f}"
+            f"{report.get('offset', float('nan')):>8}"
+            f"{report.get('overlap', float('nan')):>9.3f}"
+            f"{report.get('mtf_diff', float('nan')):>10.4f}  "
+            f"{'ok' if report['ok'] else 'FAILED ' + report.get('reason', '')}"
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,198 @@
+"""
+Benchmark the MTF pipeline on synthetic edge phantoms with a known MTF.
+
+    python -m benchmarks.run --vendors hologic ge siemens fuji --sizes 1 8 32
+
+Reports the time spent in each pipeline stage, images/sec and peak Python
+memory of Model.calculate_all at each batch size, and the error of the
+calculated MTF against the analytic ground truth. Peak memory is traced in
+this process only, so run with --workers 1 to include the calculation.
+"""
+
+from __future__ import annotations
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from pathlib import Path
+import numpy as np
+from gui.calculator import ColumnIndex, MammoTemplateCalc
+from gui.metrics import crossing_frequencies
+from gui.model import Model
+from gui.pipeline import ImagePipeline
+from .phantom import PhantomSpec, write_phantoms
+
+PARAMS_PATH = Path(__file__).parent.parent / "template_parameters.json"
+
+# Pipeline stages in the order they are computed, as ImagePipeline attributes.
+STAGES = ("header", "dataset", "pixels", "preprocessed", "labelled_rois", "mtf")
+
+
+def make_specs(args: argparse.Namespace, n: int) -> list[PhantomSpec]:
+    """n phantoms cycling through the vendors, each with its own noise seed."""
+    return [
+        PhantomSpec(
+            vendor=args.vendors[index % len(args.vendors)],
+            mode=args.mode,
+            shape=tuple(args.shape),
+            pixel_spacing=args.pixel_spacing,
+            angle=args.angle,
+            sigma=args.sigma,
+            noise=args.noise,
+            seed=index,
+        )
+        for index in range(n)
+    ]
+
+
+def time_stages(
+    calculator: MammoTemplateCalc, fpaths: list[Path]
+) -> dict[str, list[float]]:
+    """Seconds spent computing each pipeline stage, per image."""
+    timings = defaultdict(list)
+    for fpath in fpaths:
+        pipeline = ImagePipeline(fpath, calculator)
+        for stage in STAGES:
+            start = time.perf_counter()
+            getattr(pipeline, stage)
+            timings[stage].append(time.perf_counter() - start)
+    return timings
+
+
+def time_calculate_all(
+    calculator: MammoTemplateCalc, fpaths: list[Path], workers: int
+) -> tuple[float, int, Model]:
+    """Run Model.calculate_all once, returning seconds and peak traced bytes."""
+    model = Model(calculator, workers=workers)
+    model.add_edge_files(map(str, fpaths))
+    tracemalloc.start()
+    start = time.perf_counter()
+    model.calculate_all()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, model
+
+
+def accuracy(
+    calculator: MammoTemplateCalc, model: Model, specs: dict[str, PhantomSpec]
+) -> dict[str, float]:
+    """
+    Error of every calculated edge MTF against the ground truth, up to the
+    frequency where the true MTF falls to 10%, and the error of MTF50.
+    """
+    details, mtf_data = model.get_processed_array()
+    abs_errors, mtf50_errors = [], []
+    for (name, manufacturer, mode, _), results in zip(details, mtf_data):
+        spec = specs[name]
+        magnification = calculator.params_dict[manufacturer]["magnification_factor"][
+            mode
+        ]
+        f = results[:, 0]
+        truth = spec.true_mtf(f, magnification)
+        in_band = truth >= 0.1
+        true_mtf50 = crossing_frequencies(truth[None, :], f, 0.5)[0]
+        for edge in ColumnIndex:
+            measured = results[:, edge.value]
+            if np.isnan(measured).all():
+                continue
+            abs_errors.append(np.nanmax(np.abs(measured - truth)[in_band]))
+            mtf50 = crossing_frequencies(measured[None, :], f, 0.5)[0]
+            mtf50_errors.append(abs(mtf50 - true_mtf50) / true_mtf50)
+    return {
+        "edges": len(abs_errors),
+        "max_abs_error": _finite_stat(np.max, abs_errors),
+        "mean_abs_error": _finite_stat(np.mean, abs_errors),
+        "max_mtf50_rel_error": _finite_stat(np.max, mtf50_errors),
+    }
+
+
+def _finite_stat(func, values: list[float]) -> float:
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    return float(func(values)) if values.size else float("nan")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0]
+    )
+    parser.add_argument(
+        "--vendors",
+        nargs="+",
+        default=["hologic", "ge", "siemens", "fuji"],
+        choices=["hologic", "ge", "siemens", "fuji"],
+    )
+    parser.add_argument(
+        "--mode", default="conventional", choices=["conventional", "mag"]
+    )
+    parser.add_argument(
+        "--sizes", nargs="+", type=int, default=[1, 8, 32], help="Batch sizes."
+    )
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--shape", nargs=2, type=int, default=[1024, 768])
+    parser.add_argument("--pixel-spacing", type=float, default=0.07, help="mm")
+    parser.add_argument("--angle", type=float, default=3.0, help="degrees")
+    parser.add_argument("--sigma", type=float, default=0.06, help="PSF, mm")
+    parser.add_argument("--noise", type=float, default=5.0, help="pixel values")
+    parser.add_argument("--vectorized", action="store_true")
+    parser.add_argument("--json", help="Also write the report to this file.")
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    calculator = MammoTemplateCalc(PARAMS_PATH, vectorized=args.vectorized)
+    calculator.warm_up()
+    report = {"settings": vars(args), "stages": {}, "batches": []}
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        all_specs = make_specs(args, max(args.sizes))
+        fpaths = write_phantoms(tmp_dir, all_specs)
+        specs = {fpath.name: spec for fpath, spec in zip(fpaths, all_specs)}
+
+        stage_times = time_stages(calculator, fpaths[: min(len(fpaths), 8)])
+        print(f"{'stage':<16}{'mean ms':>10}{'max ms':>10}")
+        for stage, seconds in stage_times.items():
+            report["stages"][stage] = {
+                "mean_s": float(np.mean(seconds)),
+                "max_s": float(np.max(seconds)),
+            }
+            print(
+                f"{stage:<16}{np.mean(seconds) * 1e3:>10.1f}"
+                f"{np.max(seconds) * 1e3:>10.1f}"
+            )
+
+        print(
+            f"\n{'images':>8}{'images/s':>10}{'peak MB':>10}"
+            f"{'max err':>10}{'mean err':>10}{'MTF50 err':>11}"
+        )
+        for size in args.sizes:
+            elapsed, peak, model = time_calculate_all(
+                calculator, fpaths[:size], args.workers
+            )
+            errors = accuracy(calculator, model, specs)
+            batch = {
+                "images": size,
+                "seconds": elapsed,
+                "images_per_s": size / elapsed,
+                "peak_bytes": peak,
+                **errors,
+            }
+            report["batches"].append(batch)
+            print(
+                f"{size:>8}{size / elapsed:>10.2f}{peak / 2**20:>10.1f}"
+                f"{errors['max_abs_error']:>10.4f}{errors['mean_abs_error']:>10.4f}"
+                f"{errors['max_mtf50_rel_error']:>10.1%}"
+            )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,276 @@
+import queue
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, Future, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
+import numpy as np
+from .frames import FrameReader, slice_image
+from .ingest import header_mode
+
+
+@dataclass
+class BatchResult:
+    fpath: str
+    results_array: np.ndarray = None
+    metadata: dict = field(default_factory=dict)
+    error: str = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def _calculate_worker(calculator, fpath: str) -> tuple[np.ndarray, dict]:
+    """Runs in a worker process, so must be importable at module level."""
+    return calculator.calculate_mtf(fpath)
+
+
+def _warm_up_worker(calculator) -> None:
+    """Pool initializer, compiles the numba kernels once in each worker."""
+    calculator.warm_up()
+
+
+class WorkerPool:
+    """
+    A process pool kept open across batches. With warm_up, each worker runs
+    the calculator's warm-up as it starts, so numba compiles once per worker
+    process rather than in the first image of every batch. A pool broken by
+    a crashed worker is replaced with a new one by restart.
+    """
+
+    def __init__(self, calculator, workers: int, warm_up: bool = True) -> None:
+        self.calculator = calculator
+        self.workers = workers
+        self.warm_up = warm_up
+        self.executor: ProcessPoolExecutor = None
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        if not self.warm_up:
+            return ProcessPoolExecutor(max_workers=self.workers)
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_warm_up_worker,
+            initargs=(self.calculator,),
+        )
+
+    def start(self) -> None:
+        """
+        Start every worker now, so they warm up before the first batch. Where
+        workers are spawned rather than forked, the pool only starts one per
+        task submitted while none is idle, hence the empty tasks.
+        """
+        if self.executor is None:
+            self.executor = self._new_executor()
+        for _ in range(self.workers):
+            self.executor.submit(int)
+
+    def submit(self, fpath: str) -> Future:
+        if self.executor is None:
+            self.executor = self._new_executor()
+        return self.executor.submit(_calculate_worker, self.calculator, fpath)
+
+    def restart(self) -> None:
+        """Replace a pool broken by a crashed worker."""
+        self.shutdown()
+        self.start()
+
+    def shutdown(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+def _iter_completed(
+    pool: WorkerPool, fpaths: list[str]
+) -> Iterator[tuple[str, Future]]:
+    """
+    Submit every path to the pool and yield (path, future) pairs as they
+    finish. Closing the generator cancels any futures not yet started.
+    """
+    futures = {}
+    try:
+        futures = {pool.submit(fpath): fpath for fpath in fpaths}
+        for future in as_completed(futures):
+            yield futures[future], future
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+def _result_from_future(fpath: str, future: Future) -> BatchResult:
+    try:
+        results_array, metadata = future.result()
+    except Exception as e:
+        return BatchResult(fpath, error=f"{type(e).__name__}: {e}")
+    return BatchResult(fpath, results_array, metadata)
+
+
+def calculate_batch(
+    calculator, fpaths: Iterable[str], workers: int = 1, pool: WorkerPool = None
+) -> Iterator[BatchResult]:
+    """
+    Calculate MTF for each path, yielding a BatchResult as each image finishes.
+    With workers > 1 the paths are fanned out to a process pool, the pool
+    given or else one for this batch only. An exception or a crashed worker
+    only fails the image that caused it.
+    """
+    fpaths = list(fpaths)
+    if workers <= 1:
+        for fpath in fpaths:
+            try:
+                results_array, metadata = calculator.calculate_mtf(fpath)
+            except Exception as e:
+                yield BatchResult(fpath, error=f"{type(e).__name__}: {e}")
+            else:
+                yield BatchResult(fpath, results_array, metadata)
+        return
+
+    # A crashed worker breaks the pool and fails every pending future with it,
+    # so the broken paths go round again in a new pool. The pool dispatches
+    # paths in order, at most one beyond its workers, so only the first
+    # workers + 1 broken paths can have been running when it broke. Paths
+    # running at two crashes are each run alone to find the culprit.
+    own_pool = pool is None
+    if own_pool:
+        pool = WorkerPool(calculator, workers, warm_up=False)
+    workers = pool.workers
+    pending = fpaths
+    suspects = set()
+    try:
+        while pending:
+            broken = set()
+            for fpath, future in _iter_completed(pool, pending):
+                if isinstance(future.exception(), BrokenProcessPool):
+                    broken.add(fpath)
+                else:
+                    yield _result_from_future(fpath, future)
+            if broken:
+                pool.restart()
+            pending = [fpath for fpath in pending if fpath in broken]
+            running = pending[: workers + 1]
+            isolated = [fpath for fpath in running if fpath in suspects]
+            suspects.update(running)
+            pending = [fpath for fpath in pending if fpath not in isolated]
+            yield from _iter_isolated(calculator, isolated)
+    finally:
+        if own_pool:
+            pool.shutdown()
+
+
+def _iter_isolated(calculator, fpaths: list[str]) -> Iterator[BatchResult]:
+    """
+    Run each path alone in a worker process of its own, all at once, so a
+    crash can only be the path that its worker was running.
+    """
+    executors = [ProcessPoolExecutor(max_workers=1) for _ in fpaths]
+    try:
+        futures = {
+            executor.submit(_calculate_worker, calculator, fpath): fpath
+            for executor, fpath in zip(executors, fpaths)
+        }
+        for future in as_completed(futures):
+            fpath = futures[future]
+            if isinstance(future.exception(), BrokenProcessPool):
+                yield BatchResult(fpath, error="Worker process crashed.")
+            else:
+                yield _result_from_future(fpath, future)
+    finally:
+        for executor in executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def calculate_sweep(
+    calculator, fpath: str, slices: Iterable[int] = None
+) -> Iterator[BatchResult]:
+    """
+    Calculate MTF for every reconstructed slice of a tomo volume, or only the
+    slices given, giving MTF against depth. Frames are read and processed one
+    at a time, so memory use does not grow with the depth of the volume. Each
+    result is labelled "<fpath>[<slice>]" and has the slice in its metadata.
+    """
+    frames = FrameReader(fpath)
+    # Named per vendor as when the file is dropped, usually "tomo".
+    manufacturer = str(frames.header.get("Manufacturer", ""))
+    acquisition = header_mode(frames.header, manufacturer)
+    for index, frame in frames.iter_frames(slices):
+        label = f"{fpath}[{index}]"
+        try:
+            results_array, metadata = calculator.calculate_mtf_from_preprocessed(
+                slice_image(frames.header, frame, index, acquisition)
+            )
+        except Exception as e:
+            yield BatchResult(label, error=f"{type(e).__name__}: {e}")
+        else:
+            metadata["slice"] = index
+            yield BatchResult(label, results_array, metadata)
+
+
+class BackgroundCalculation:
+    """
+    Consumes an iterator of BatchResults on a worker thread. Results are queued
+    for the caller to drain from its own thread, since the model's database
+    connection belongs to the thread that created it. Cancelling stops the
+    batch after the image in progress and cancels work not yet started.
+    """
+
+    def __init__(self, results: Iterator[BatchResult], total: int) -> None:
+        self.results = results
+        self.total = total
+        self.completed = 0
+        self.queue: queue.Queue[BatchResult] = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.start_time = None
+        self.finished = False
+
+    def _run(self) -> None:
+        try:
+            for result in self.results:
+                self.queue.put(result)
+                if self.cancel_event.is_set():
+                    break
+        finally:
+            self.results.close()
+            self.finished = True
+
+    def start(self) -> None:
+        self.start_time = time.perf_counter()
+        self.thread.start()
+
+    def cancel(self) -> None:
+        self.cancel_event.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @property
+    def done(self) -> bool:
+        """True once the thread has stopped and every result has been drained."""
+        return self.finished and self.queue.empty()
+
+    def drain(self) -> list[BatchResult]:
+        """Return the results finished since the last call."""
+        drained = []
+        while True:
+            try:
+                drained.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        self.completed += len(drained)
+        return drained
+
+    @property
+    def throughput(self) -> float:
+        """Images per second."""
+        elapsed = time.perf_counter() - self.start_time
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self) -> float | None:
+        """Estimated seconds remaining, None until the first image finishes."""
+        if self.completed == 0:
+            return None
+        return (self.total - self.completed) / self.throughput
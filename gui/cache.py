@@ -0,0 +1,156 @@
+from __future__ import annotations
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable
+import numpy as np
+
+# Full-field mammograms held as float arrays take tens to hundreds of MB
+# each. ArrayCache keeps the most recently used arrays in memory up to a
+# byte budget and spills the rest to disk.
+
+DEFAULT_BUDGET_BYTES = 2 * 2**30
+
+
+def compact_dtype(array: np.ndarray) -> np.dtype:
+    """
+    Narrowest dtype holding every value of the array exactly. Integer valued
+    float arrays, common after preprocessing detector counts, are stored as
+    integers, other floats as float32 where that loses nothing.
+    """
+    if array.size == 0 or array.dtype.kind not in "iuf":
+        return array.dtype
+    if array.dtype.kind == "f":
+        if not np.isfinite(array).all():
+            return _float_dtype(array)
+        if not np.array_equal(array, np.rint(array)):
+            return _float_dtype(array)
+    low, high = int(array.min()), int(array.max())
+    dtype = np.result_type(np.min_scalar_type(low), np.min_scalar_type(high))
+    if dtype.kind not in "iu":  # Outside the range of int64 and uint64
+        return _float_dtype(array)
+    return dtype if dtype.itemsize < array.dtype.itemsize else array.dtype
+
+
+def _float_dtype(array: np.ndarray) -> np.dtype:
+    if array.dtype.itemsize > 4:
+        single = array.astype(np.float32)
+        if np.array_equal(single, array, equal_nan=True):
+            return single.dtype
+    return array.dtype
+
+
+class ArrayCache:
+    """
+    Least recently used arrays, held in memory up to budget_bytes. Arrays are
+    stored in their compact_dtype and returned in their own dtype, converted
+    on each get where the two differ. Arrays evicted are written in their own
+    dtype to .npy files in a scratch directory and memory-mapped on the next
+    get, rather than being decoded again, then moved back into memory once
+    the budget has room. Arrays returned are read-only views of what is
+    held, so callers copy before modifying them.
+    """
+
+    def __init__(
+        self, budget_bytes: int = DEFAULT_BUDGET_BYTES, scratch_dir: str | Path = None
+    ) -> None:
+        self.budget_bytes = budget_bytes
+        self.scratch_dir = scratch_dir
+        self._scratch: tempfile.TemporaryDirectory = None
+        self._memory: OrderedDict[Hashable, np.ndarray] = OrderedDict()
+        self._spilled: dict[Hashable, tuple[Path, int]] = {}  # Path, nbytes held
+        self._dtypes: dict[Hashable, np.dtype] = {}
+        self._lock = threading.Lock()
+        self._spill_count = 0
+        self.nbytes = 0  # Held in memory
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._dtypes
+
+    def __len__(self) -> int:
+        return len(self._dtypes)
+
+    def _scratch_path(self) -> Path:
+        if self._scratch is None:
+            if self.scratch_dir is not None:
+                os.makedirs(self.scratch_dir, exist_ok=True)
+            self._scratch = tempfile.TemporaryDirectory(
+                prefix="drmam_cache_", dir=self.scratch_dir, ignore_cleanup_errors=True
+            )
+        return Path(self._scratch.name)
+
+    def put(self, key: Hashable, array: np.ndarray) -> None:
+        """Add or replace an array, evicting the least recently used if over budget."""
+        stored = np.ascontiguousarray(array, dtype=compact_dtype(array))
+        with self._lock:
+            self._remove(key)
+            self._dtypes[key] = array.dtype
+            self._memory[key] = stored
+            self.nbytes += stored.nbytes
+            while self.nbytes > self.budget_bytes and self._memory:
+                self._evict()
+
+    def get(self, key: Hashable) -> np.ndarray:
+        """
+        The array stored under key, read-only, raising KeyError if there is
+        none.
+        """
+        with self._lock:
+            dtype = self._dtypes[key]
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                array = self._memory[key].astype(dtype, copy=False)
+            elif self.nbytes + self._spilled[key][1] <= self.budget_bytes:
+                array = self._promote(key)
+            else:
+                array = np.load(self._spilled[key][0], mmap_mode="r")
+        array = array.view()
+        array.flags.writeable = False
+        return array
+
+    def _promote(self, key: Hashable) -> np.ndarray:
+        """Move a spilled array back into memory, returning it in its own dtype."""
+        fpath, _ = self._spilled.pop(key)
+        array = np.load(fpath)
+        stored = np.ascontiguousarray(array, dtype=compact_dtype(array))
+        self._memory[key] = stored
+        self.nbytes += stored.nbytes
+        _remove_file(fpath)
+        return array
+
+    def _evict(self) -> None:
+        key, stored = self._memory.popitem(last=False)
+        self.nbytes -= stored.nbytes
+        self._spill_count += 1
+        fpath = self._scratch_path() / f"{self._spill_count}.npy"
+        # In its own dtype, so it is mapped on get without a conversion
+        np.save(fpath, stored.astype(self._dtypes[key], copy=False))
+        self._spilled[key] = (fpath, stored.nbytes)
+
+    def _remove(self, key: Hashable) -> None:
+        self._dtypes.pop(key, None)
+        stored = self._memory.pop(key, None)
+        if stored is not None:
+            self.nbytes -= stored.nbytes
+        spilled = self._spilled.pop(key, None)
+        if spilled is not None:
+            _remove_file(spilled[0])
+
+    def discard(self, key: Hashable) -> None:
+        """Remove an array from memory and disk, if present."""
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._dtypes):
+                self._remove(key)
+
+
+def _remove_file(fpath: Path) -> None:
+    try:
+        os.remove(fpath)
+    except OSError:  # Still mapped on Windows, removed with the directory
+        pass
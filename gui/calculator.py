@@ -1,12 +1,35 @@
+from __future__ import annotations
 from abc import ABC, abstractmethod
 from enum import Enum
+from importlib.metadata import version, PackageNotFoundError
+import hashlib
+import json
 from pathlib import Path
+from typing import TYPE_CHECKING
 import numpy as np
-import pydicom
-from pydicom.dataset import FileDataset
-from .utils import read_json
-from mtf import get_labelled_rois, calculate_mtf, preprocess_dcm
-from mtf.dcmutils import MammoMTFImage
+from .utils import read_json, lazy_import
+from .pipeline import ImagePipeline
+from .vectorized import (
+    EdgeMTF,
+    bootstrap_mtfs,
+    calculate_mtfs,
+    percentile_interval,
+)
+from .metrics import LEVELS, crossing_frequencies, resample_curves
+from .instrument import recording, stage
+from .profiling import startup_profile
+from .roi import ROITracker, search_rois
+
+if TYPE_CHECKING:
+    from pydicom.dataset import FileDataset
+    from mtf.dcmutils import MammoMTFImage
+
+mtf = lazy_import("mtf")
+
+try:
+    CALCULATOR_VERSION = version("drmam")
+except PackageNotFoundError:  # Running from a source checkout
+    CALCULATOR_VERSION = "dev"
 
 
 class MTFCalculator(ABC):
@@ -48,9 +71,76 @@ def get_fuji_mode(dcm: FileDataset) -> str:
 class MammoTemplateCalc(MTFCalculator):
     """Calculator compatible with the mammo template"""
 
-    def __init__(self, params_path: Path) -> None:
+    def __init__(self, params_path: Path, vectorized: bool = False) -> None:
         self.sample_number = 104
+        self.params_path = params_path
         self.params_dict = read_json(params_path)
+        self.version = CALCULATOR_VERSION
+        # Calculate all edges of an image in one batched call rather than
+        # one mtf.calculate_mtf call per edge. Edges are sampled at multiples
+        # of cpp_step (cycles/pixel) and results at multiples of
+        # frequency_step (cycles/mm).
+        self.vectorized = vectorized
+        self.frequency_step = 0.05
+        self.cpp_step = 0.0025
+        # Record per-stage time and peak allocation with each result, under
+        # metadata["timings"]. Tracing memory slows the calculation down.
+        self.instrumented = False
+        self.trace_memory = True
+        # Reuse ROI positions between images from the same unit and geometry,
+        # searching only near where they were last found. Off when None.
+        self.roi_tracker: ROITracker = None
+        # Search for ROIs in the image downsampled by this factor first, then
+        # at full resolution only around them. 1 searches at full resolution.
+        self.pyramid_factor = 1
+        # Confidence bands and MTF50 intervals from this many bootstrap
+        # replicates of each edge, vectorized calculation only. Off when 0.
+        self.bootstrap_replicates = 0
+        self.confidence = 0.95
+
+    @property
+    def frequencies(self) -> np.ndarray:
+        """Frequencies of vectorized results, in cycles/mm."""
+        return np.arange(self.sample_number) * self.frequency_step
+
+    @property
+    def cpp_frequencies(self) -> np.ndarray:
+        """Frequencies sampled by the vectorized calculation, in cycles/pixel."""
+        return np.arange(0, 1 + self.cpp_step / 2, self.cpp_step)
+
+    def reload_params(self) -> None:
+        """Read the template parameters again, after they have been edited."""
+        self.params_dict = read_json(self.params_path)
+
+    def magnification(self, manufacturer: str, mode: str) -> float:
+        """Magnification factor of a manufacturer, as named in metadata, and mode."""
+        factors = self.params_dict[manufacturer]["magnification_factor"]
+        if mode not in factors:
+            raise ValueError(
+                f"No {mode} magnification factor for {manufacturer} in the "
+                "template parameters."
+            )
+        return factors[mode]
+
+    @property
+    def manufacturers(self) -> list[str]:
+        """Manufacturers with magnification factors in the template parameters."""
+        return [
+            manufacturer
+            for manufacturer, params in self.params_dict.items()
+            if isinstance(params, dict) and "magnification_factor" in params
+        ]
+
+    @property
+    def params_key(self) -> str:
+        """
+        Hash of the parameters that affect results in cycles/pixel. The
+        magnification factors, sample number and frequency step only affect
+        how those are turned into template results, so are left out.
+        """
+        params = {"cpp_step": self.cpp_step} if self.vectorized else {}
+        params_str = json.dumps(params, sort_keys=True)
+        return hashlib.sha1(params_str.encode()).hexdigest()
 
     def _get_metadata_from_preprocessed(
         self, preprocessed_img: MammoMTFImage
@@ -66,16 +156,16 @@ class MammoTemplateCalc(MTFCalculator):
         mode = preprocessed_img.acquisition
 
         if "hologic" in manufacturer_name:
-            mag_factor = self.params_dict["hologic"]["magnification_factor"][mode]
+            mag_factor = self.magnification("hologic", mode)
             metadata["manufacturer"] = "hologic"
         elif "siemens" in manufacturer_name:
-            mag_factor = self.params_dict["siemens"]["magnification_factor"][mode]
+            mag_factor = self.magnification("siemens", mode)
             metadata["manufacturer"] = "siemens"
         elif "ge" in manufacturer_name:
-            mag_factor = self.params_dict["ge"]["magnification_factor"][mode]
+            mag_factor = self.magnification("ge", mode)
             metadata["manufacturer"] = "ge"
         elif "fuji" in manufacturer_name:
-            mag_factor = self.params_dict["fuji"]["magnification_factor"][mode]
+            mag_factor = self.magnification("fuji", mode)
             metadata["manufacturer"] = "fuji"
         else:
             raise ValueError(f"Unsupported manufacturer {manufacturer_name}")
@@ -86,50 +176,313 @@ class MammoTemplateCalc(MTFCalculator):
         metadata["pixel_spacing"] = pixel_spacing
         metadata["magnification_factor"] = mag_factor
         metadata["orientation"] = orientation
+        metadata["focus_plane"] = preprocessed_img.focus_plane
 
         return metadata, sample_spacing
 
-    def _calculate_mtf_for_edges(
-        self, preprocessed_img: MammoMTFImage, sample_spacing: float
-    ) -> tuple[np.ndarray, dict]:
+    def warm_up(self) -> None:
         """
-        Calculate MTF for all edges in a preprocessed image.
-        Returns results array and metadata.
+        Import the mtf package and run it on a small synthetic edge, so numba
+        compilation is paid before the first real calculation.
         """
-        metadata, _ = self._get_metadata_from_preprocessed(preprocessed_img)
-        rois, rois_edge = get_labelled_rois(preprocessed_img.array)
-        results_array = np.empty((self.sample_number, 5))
-        results_array[:] = np.nan
+        with startup_profile.timed("compile", "calculate_mtf warm-up"):
+            rows, cols = 100, 100
+            y, x = np.mgrid[:rows, :cols]
+            edge_x = cols / 2 + np.tan(np.radians(3)) * y
+            edge_roi = np.where(x > edge_x, 100.0, 10.0)
+            edge_roi_canny = np.where(np.abs(x - np.round(edge_x)) < 0.5, 255, 0)
+            try:
+                mtf.calculate_mtf(
+                    edge_roi,
+                    0.1,
+                    edge_roi_canny.astype(np.uint8),
+                    edge_dir="vertical",
+                )
+            except Exception as e:
+                print(f"MTF warm-up failed:\n{e}")
 
+    def calculate_edge_mtfs(
+        self, rois: dict, rois_edge: dict, sample_spacing: float
+    ) -> dict:
+        """
+        Calculate MTF for each labelled edge ROI.
+        Returns a dictionary of MTF containers keyed by edge position.
+        """
+        if self.vectorized:
+            return self._calculate_edge_mtfs_batched(
+                [(rois, rois_edge, sample_spacing)]
+            )[0]
+        edge_mtfs = {}
         for edge_position in rois:
             edge_dir = EdgeDirection[edge_position].value
             edge_roi = rois[edge_position]
             edge_roi_canny = rois_edge[edge_position]
             try:
-                mtf_container = calculate_mtf(
-                    edge_roi,
-                    sample_spacing,
-                    edge_roi_canny,
-                    edge_dir=edge_dir,
-                )
-                f, mtf_vals = mtf_container.f, mtf_container.mtf
-                results_array[:, ColumnIndex[edge_position].value] = mtf_vals[
-                    : self.sample_number
-                ]
-                results_array[:, 0] = f[: self.sample_number]
+                with stage("edge mtf", edge_position):
+                    edge_mtfs[edge_position] = mtf.calculate_mtf(
+                        edge_roi,
+                        sample_spacing,
+                        edge_roi_canny,
+                        edge_dir=edge_dir,
+                    )
             except Exception as e:
                 print(f"Exception found when processing {edge_position} edge:\n{e}")
+        return edge_mtfs
+
+    def _calculate_edge_mtfs_batched(
+        self, images: list[tuple[dict, dict, float]]
+    ) -> list[dict]:
+        """
+        Calculate MTF for the labelled edge ROIs of many images in one batched
+        call. Takes (rois, rois_edge, sample_spacing) for each image and returns
+        a dictionary of MTF containers per image, as calculate_edge_mtfs does.
+        """
+        keys, rois, canny_maps, edge_dirs, spacings = [], [], [], [], []
+        for image_index, (image_rois, image_edges, sample_spacing) in enumerate(images):
+            for edge_position in image_rois:
+                keys.append((image_index, edge_position))
+                rois.append(image_rois[edge_position])
+                canny_maps.append(image_edges[edge_position])
+                edge_dirs.append(EdgeDirection[edge_position].value)
+                spacings.append(sample_spacing)
+        edge_mtfs = [{} for _ in images]
+        if not keys:
+            return edge_mtfs
+        # With unit spacing, frequencies are taken as cycles/pixel.
+        mtfs = calculate_mtfs(
+            rois, canny_maps, edge_dirs, np.ones(len(keys)), self.cpp_frequencies
+        )
+        bands = [{}] * len(keys)
+        if self.bootstrap_replicates:
+            bands = self._bootstrap_bands(rois, canny_maps, edge_dirs)
+        for (image_index, edge_position), mtf_vals, sample_spacing, band in zip(
+            keys, mtfs, spacings, bands
+        ):
+            if np.isnan(mtf_vals).all():
+                print(f"No edge found in {edge_position} edge ROI.")
+                continue
+            if band:
+                band["mtf50_interval"] = band["mtf50_interval"] / sample_spacing
+            edge_mtfs[image_index][edge_position] = EdgeMTF(
+                self.cpp_frequencies / sample_spacing, mtf_vals, **band
+            )
+        return edge_mtfs
+
+    def _bootstrap_bands(
+        self, rois: list[np.ndarray], canny_maps: list[np.ndarray], edge_dirs: list
+    ) -> list[dict]:
+        """
+        Confidence band of each ROI's MTF on the cycles/pixel grid, and the
+        confidence interval of its MTF50 in cycles/pixel, from
+        bootstrap_replicates replicates calculated together.
+        """
+        with stage("bootstrap"):
+            replicates = bootstrap_mtfs(
+                rois,
+                canny_maps,
+                edge_dirs,
+                np.ones(len(rois)),
+                self.cpp_frequencies,
+                self.bootstrap_replicates,
+            )
+            lower, upper = percentile_interval(replicates, self.confidence)
+            # Frequency on axis 1, as crossing_frequencies expects.
+            mtf50 = crossing_frequencies(
+                replicates.transpose(0, 2, 1), self.cpp_frequencies, LEVELS["mtf50"]
+            )
+            mtf50_lower, mtf50_upper = percentile_interval(mtf50, self.confidence)
+        return [
+            {
+                "lower": lower[index],
+                "upper": upper[index],
+                "mtf50_interval": np.array([mtf50_lower[index], mtf50_upper[index]]),
+            }
+            for index in range(len(rois))
+        ]
+
+    def cpp_from_edges(
+        self, edge_mtfs: dict, sample_spacing: float, field: str = "mtf"
+    ) -> np.ndarray:
+        """
+        Per-edge MTF containers as one (n_samples x 5) array, frequency then
+        left, right, top and bottom MTF, with frequency in cycles/pixel. Edges
+        are cut to the samples of the shortest, the frequency is the last
+        edge's. The MTF of an edge does not depend on the sample spacing
+        given to the calculation, which only scales its frequencies. field
+        selects another attribute of the containers, such as "lower".
+        """
+        n_samples = min((len(edge.f) for edge in edge_mtfs.values()), default=0)
+        cpp = np.full((n_samples, 5), np.nan)
+        for edge_position, mtf_container in edge_mtfs.items():
+            f, mtf_vals = mtf_container.f, getattr(mtf_container, field)
+            cpp[:, ColumnIndex[edge_position].value] = mtf_vals[:n_samples]
+            cpp[:, 0] = np.asarray(f[:n_samples]) * sample_spacing
+        return cpp
+
+    def results_from_cpp(
+        self,
+        cpp: np.ndarray,
+        pixel_spacings: np.ndarray,
+        magnifications: np.ndarray,
+    ) -> np.ndarray:
+        """
+        Template results (n_images x sample_number x 5), frequency in
+        cycles/mm, from results in cycles/pixel (n_images x n_samples x 5)
+        and the pixel spacing and magnification factor of each image. Results
+        are the first sample_number samples, or for vectorized results are
+        resampled at multiples of frequency_step. NaN where there are fewer
+        samples.
+        """
+        per_mm = np.array(cpp, dtype=float)
+        scale = np.asarray(magnifications, float) / np.asarray(pixel_spacings, float)
+        per_mm[:, :, 0] *= scale[:, None]
+        results = np.full((len(per_mm), self.sample_number, 5), np.nan)
+        if self.vectorized:
+            results[:, :, 0] = self.frequencies
+            if per_mm.shape[1]:
+                results[:, :, 1:] = resample_curves(per_mm, self.frequencies)
+            return results
+        n_samples = min(self.sample_number, per_mm.shape[1])
+        results[:, :n_samples] = per_mm[:, :n_samples]
+        return results
+
+    def results_from_edges(
+        self, edge_mtfs: dict, metadata: dict
+    ) -> tuple[np.ndarray, dict]:
+        """
+        Arrange per-edge MTF containers into the template results array.
+        The results in cycles/pixel are added to the metadata returned, under
+        "cpp_results", so the results can be derived again for new parameters.
+        Bootstrapped edges also add their confidence bands, see bands_from_edges.
+        """
+        cpp = self.cpp_from_edges(edge_mtfs, metadata["sample_spacing"])
+        results_array = self.results_from_cpp(
+            cpp[None], [metadata["pixel_spacing"]], [metadata["magnification_factor"]]
+        )[0]
+        metadata = dict(metadata, cpp_results=cpp)
+        if edge_mtfs and all(
+            getattr(edge, "lower", None) is not None for edge in edge_mtfs.values()
+        ):
+            metadata.update(self.bands_from_edges(edge_mtfs, metadata))
         return results_array, metadata
 
+    def bands_from_edges(self, edge_mtfs: dict, metadata: dict) -> dict:
+        """
+        Confidence bands of bootstrapped edges in the layout of the template
+        results, under "mtf_lower" and "mtf_upper", and the MTF50 interval
+        (cycles/mm) of each edge under "mtf50_intervals", shape (4 x 2) in
+        left, right, top, bottom order and NaN for edges not found.
+        """
+        bands = {}
+        for key, field in (("mtf_lower", "lower"), ("mtf_upper", "upper")):
+            cpp = self.cpp_from_edges(edge_mtfs, metadata["sample_spacing"], field)
+            bands[key] = self.results_from_cpp(
+                cpp[None],
+                [metadata["pixel_spacing"]],
+                [metadata["magnification_factor"]],
+            )[0]
+        intervals = np.full((len(ColumnIndex), 2), np.nan)
+        for edge_position, mtf_container in edge_mtfs.items():
+            intervals[ColumnIndex[edge_position].value - 1] = (
+                mtf_container.mtf50_interval
+            )
+        bands["mtf50_intervals"] = intervals
+        return bands
+
+    def label_rois(self, array: np.ndarray, tracking_key=None) -> tuple[dict, dict]:
+        """
+        ROIs and canny edge maps of the edge object in a preprocessed array.
+        With an ROI tracker, images sharing a tracking key are searched near
+        the ROIs last found. Other searches are coarse to fine when
+        pyramid_factor is above 1.
+        """
+        tracker = self.roi_tracker
+        if tracker is not None:
+            labelled = tracker.find(array, tracking_key)
+            if labelled is not None:
+                return labelled
+        rois, canny = search_rois(array, self.pyramid_factor)
+        if tracker is not None:
+            tracker.remember(array, tracking_key, rois)
+        return rois, canny
+
+    def _calculate_mtf_for_edges(
+        self, preprocessed_img: MammoMTFImage, sample_spacing: float
+    ) -> tuple[np.ndarray, dict]:
+        """
+        Calculate MTF for all edges in a preprocessed image.
+        Returns results array and metadata.
+        """
+        metadata, _ = self._get_metadata_from_preprocessed(preprocessed_img)
+        rois, rois_edge = self.label_rois(preprocessed_img.array)
+        edge_mtfs = self.calculate_edge_mtfs(rois, rois_edge, sample_spacing)
+        return self.results_from_edges(edge_mtfs, metadata)
+
     def calculate_mtf(self, dicom_path) -> tuple[np.ndarray, dict]:
         """
         Calculate MTF from a DICOM file.
         """
-        dcm = pydicom.dcmread(dicom_path)
-        preprocessed_img = preprocess_dcm(dcm)
-        return self._calculate_mtf_for_edges(
-            preprocessed_img, preprocessed_img.pixel_spacing
-        )
+        return self.calculate_mtf_from_pipeline(ImagePipeline(dicom_path, self))
+
+    def calculate_mtf_from_pipeline(
+        self, pipeline: ImagePipeline
+    ) -> tuple[np.ndarray, dict]:
+        """
+        Calculate MTF using the stages already computed by an image pipeline.
+        """
+        if pipeline.calculator is None:
+            pipeline.calculator = self
+        if not self.instrumented:
+            return pipeline.mtf
+        with recording(pipeline.name, self.trace_memory) as timings:
+            results_array, metadata = pipeline.mtf
+        return results_array, dict(metadata, timings=timings)
+
+    def calculate_mtf_batched(
+        self, preprocessed_imgs: list[MammoMTFImage]
+    ) -> list[tuple[np.ndarray, dict]]:
+        """
+        Calculate MTF for many preprocessed images, with the edges of all of
+        them computed in a single vectorized call.
+        """
+        metadatas, images = [], []
+        for preprocessed_img in preprocessed_imgs:
+            metadata, sample_spacing = self._get_metadata_from_preprocessed(
+                preprocessed_img
+            )
+            rois, rois_edge = self.label_rois(preprocessed_img.array)
+            metadatas.append(metadata)
+            images.append((rois, rois_edge, sample_spacing))
+        return self._results_batched(images, metadatas)
+
+    def calculate_mtf_from_pipelines(
+        self, pipelines: list[ImagePipeline]
+    ) -> list[tuple[np.ndarray, dict]]:
+        """
+        Calculate MTF using the stages already computed by many image
+        pipelines, with the edges of all of them computed in a single
+        vectorized call.
+        """
+        metadatas, images = [], []
+        for pipeline in pipelines:
+            if pipeline.calculator is None:
+                pipeline.calculator = self
+            metadata = pipeline.metadata
+            metadatas.append(metadata)
+            images.append(
+                (pipeline.rois, pipeline.canny_maps, metadata["sample_spacing"])
+            )
+        return self._results_batched(images, metadatas)
+
+    def _results_batched(
+        self, images: list[tuple[dict, dict, float]], metadatas: list[dict]
+    ) -> list[tuple[np.ndarray, dict]]:
+        return [
+            self.results_from_edges(edge_mtfs, metadata)
+            for edge_mtfs, metadata in zip(
+                self._calculate_edge_mtfs_batched(images), metadatas
+            )
+        ]
 
     def calculate_mtf_from_preprocessed(
         self, preprocessed_img: MammoMTFImage
@@ -0,0 +1,456 @@
+import argparse
+import json
+import os
+import sys
+import time
+from pathlib import Path
+import numpy as np
+from .batch import calculate_batch, calculate_sweep
+from .calculator import MammoTemplateCalc
+from .ingest import iter_dicom_paths
+from .export import make_exporter
+from .frames import FrameReader
+from .metrics import summarize, write_summary_csv
+from .instrument import summarize_timings
+from .roi import ROITracker
+from .store import ResultsStore, DEFAULT_RESULTS_PATH
+from .watch import WatchService, make_source
+from .scp import StorageSCP, send_datasets
+from .writers import WRITERS
+
+# Headless entry point. Nothing here may import gui.view, tkinterdnd2 or
+# xlwings, so it runs on servers without a display or Excel.
+
+DEFAULT_PARAMS_PATH = Path(__file__).parent.parent / "template_parameters.json"
+
+EXIT_OK = 0
+EXIT_SOME_FAILED = 1
+EXIT_ALL_FAILED = 2
+EXIT_NO_INPUT = 3
+
+
+def run_batch(args: argparse.Namespace) -> int:
+    fpaths = list(iter_dicom_paths(args.paths))
+    if not fpaths:
+        print("No input files found.", file=sys.stderr)
+        return EXIT_NO_INPUT
+
+    calculator = MammoTemplateCalc(
+        args.params, vectorized=args.vectorized or args.bootstrap > 0
+    )
+    calculator.bootstrap_replicates = args.bootstrap
+    calculator.instrumented = args.timings is not None
+    if args.track_rois:
+        calculator.roi_tracker = ROITracker()
+    calculator.pyramid_factor = args.pyramid
+    out_format = args.format or Path(args.output).suffix.lstrip(".").lower()
+    writer = WRITERS[out_format](args.output, bands=args.bootstrap > 0)
+    exporter = None
+    if args.export is not None:
+        exporter = make_exporter(args.export, args.params, args.template)
+    export_rows = []
+    timings = []
+    failed = 0
+    try:
+        for result in calculate_batch(calculator, fpaths, args.workers):
+            writer.write(result)
+            timings += result.metadata.get("timings", [])
+            if result.ok:
+                print(f"OK     {result.fpath}")
+                export_rows.append(
+                    (
+                        Path(result.fpath).name,
+                        result.metadata["manufacturer"],
+                        result.metadata["mode"],
+                        result.metadata["orientation"],
+                        result.results_array,
+                    )
+                )
+            else:
+                failed += 1
+                print(f"FAILED {result.fpath}: {result.error}")
+    finally:
+        writer.close()
+    if exporter is not None:
+        for file_name, reason in exporter.write_batch(export_rows):
+            print(f"Not exported {file_name}: {reason}", file=sys.stderr)
+    if args.timings is not None:
+        dump = {
+            "summary": summarize_timings(timings),
+            "timings": [timing.as_dict() for timing in timings],
+        }
+        Path(args.timings).write_text(json.dumps(dump, indent=2))
+    if args.summary is not None and export_rows:
+        details = [row[:4] for row in export_rows]
+        mtf_data = np.stack([row[4] for row in export_rows])
+        write_summary_csv(summarize(details, mtf_data), args.summary)
+
+    print(f"{len(fpaths) - failed}/{len(fpaths)} files processed.", file=sys.stderr)
+    if failed == 0:
+        return EXIT_OK
+    return EXIT_ALL_FAILED if failed == len(fpaths) else EXIT_SOME_FAILED
+
+
+def parse_slab(value: str) -> slice:
+    """Slices as "start:stop", either end optional, or a single slice index."""
+    try:
+        if ":" not in value:
+            return slice(int(value), int(value) + 1)
+        start, stop = value.split(":", 1)
+        return slice(int(start) if start else None, int(stop) if stop else None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid slab {value!r}, use start:stop.")
+
+
+def run_sweep(args: argparse.Namespace) -> int:
+    calculator = MammoTemplateCalc(args.params)
+    slices = None
+    if args.slab is not None:
+        slices = range(FrameReader(args.path).n_frames)[args.slab]
+    out_format = args.format or Path(args.output).suffix.lstrip(".").lower()
+    writer = WRITERS[out_format](args.output)
+    total = failed = 0
+    try:
+        for result in calculate_sweep(calculator, args.path, slices):
+            writer.write(result)
+            total += 1
+            if not result.ok:
+                failed += 1
+                print(f"FAILED {result.fpath}: {result.error}")
+    finally:
+        writer.close()
+
+    print(f"{total - failed}/{total} slices processed.", file=sys.stderr)
+    if total == 0:
+        return EXIT_NO_INPUT
+    if failed == 0:
+        return EXIT_OK
+    return EXIT_ALL_FAILED if failed == total else EXIT_SOME_FAILED
+
+
+def run_watch(args: argparse.Namespace) -> int:
+    calculator = MammoTemplateCalc(args.params)
+    if args.track_rois:
+        calculator.roi_tracker = ROITracker()
+    store = ResultsStore(args.store, calculator.version, calculator.params_key)
+    source = make_source(args.directories, args.poll, args.interval)
+    service = WatchService(calculator, store, source, args.workers, args.settle)
+    print(f"Watching {', '.join(map(str, args.directories))}, Ctrl+C to stop.")
+    service.run()
+    print(
+        f"{service.processed} files processed, {service.failed} failed.",
+        file=sys.stderr,
+    )
+    return EXIT_OK
+
+
+def run_scp(args: argparse.Namespace) -> int:
+    calculator = MammoTemplateCalc(args.params)
+    if args.track_rois:
+        calculator.roi_tracker = ROITracker()
+    writer = WRITERS[args.format or Path(args.output).suffix.lstrip(".").lower()](
+        args.output
+    )
+    scp = StorageSCP(
+        calculator,
+        ae_title=args.ae_title,
+        address=args.address,
+        port=args.port,
+        workers=args.workers,
+        queue_size=args.queue_size,
+    )
+    scp.start()
+    print(f"{args.ae_title} listening on {args.address}:{args.port}, Ctrl+C to stop.")
+    try:
+        while True:
+            for result in scp.drain():
+                writer.write(result)
+                if result.ok:
+                    print(f"OK     {result.fpath}")
+                else:
+                    print(f"FAILED {result.fpath}: {result.error}")
+            time.sleep(0.2)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        scp.stop()
+        writer.close()
+    print(
+        f"{scp.received} images received, {scp.refused} refused while busy.",
+        file=sys.stderr,
+    )
+    return EXIT_OK
+
+
+def run_send(args: argparse.Namespace) -> int:
+    fpaths = list(iter_dicom_paths(args.paths))
+    if not fpaths:
+        print("No input files found.", file=sys.stderr)
+        return EXIT_NO_INPUT
+    statuses = send_datasets(fpaths, args.address, args.port, args.ae_title)
+    failed = 0
+    for fpath, status in zip(fpaths, statuses):
+        print(f"0x{status:04X} {fpath}" if status >= 0 else f"NO RESPONSE {fpath}")
+        failed += status != 0
+    if failed == 0:
+        return EXIT_OK
+    return EXIT_ALL_FAILED if failed == len(fpaths) else EXIT_SOME_FAILED
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="drmam", description="Digital Radiography MTF Analysis Module"
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    batch = subparsers.add_parser(
+        "batch",
+        help="Calculate MTF for files and directories without the GUI.",
+        description=(
+            "Calculate MTF for every file given and every DICOM file found in "
+            "the directories given. Exits with 0 if all files were processed, "
+            f"{EXIT_SOME_FAILED} if some failed, {EXIT_ALL_FAILED} if all "
+            f"failed and {EXIT_NO_INPUT} if no files were found."
+        ),
+    )
+    batch.add_argument("paths", nargs="+", help="DICOM files or directories.")
+    batch.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Output file, format taken from the extension unless --format is set.",
+    )
+    batch.add_argument("-f", "--format", choices=sorted(WRITERS))
+    batch.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=os.cpu_count() or 1,
+        help="Number of worker processes (default: number of CPUs).",
+    )
+    batch.add_argument(
+        "--export",
+        help=(
+            "Also export results in one bulk write to .xlsx (template layout), "
+            ".csv or .parquet."
+        ),
+    )
+    batch.add_argument(
+        "--template",
+        help="Existing template workbook to fill when exporting to .xlsx.",
+    )
+    batch.add_argument(
+        "--params",
+        type=Path,
+        default=DEFAULT_PARAMS_PATH,
+        help="Template parameters JSON file.",
+    )
+    batch.add_argument(
+        "--summary",
+        help=(
+            "Also write MTF50, MTF20 and MTF10 per image, with means and "
+            "standard deviations per manufacturer and mode, to this CSV file."
+        ),
+    )
+    batch.add_argument(
+        "--timings",
+        help=(
+            "Record wall time and peak allocation of every stage, for each "
+            "image and edge, and write them to this JSON file."
+        ),
+    )
+    batch.add_argument(
+        "--vectorized",
+        action="store_true",
+        help="Calculate all edges of an image in one vectorized call.",
+    )
+    batch.add_argument(
+        "--track-rois",
+        action="store_true",
+        help=(
+            "Search for the edge object near where it was last found in "
+            "images from the same unit, mode and orientation."
+        ),
+    )
+    batch.add_argument(
+        "--pyramid",
+        type=int,
+        default=1,
+        metavar="FACTOR",
+        help=(
+            "Search for ROIs in the image downsampled by FACTOR first, then at "
+            "full resolution only around them (default: 1, full resolution)."
+        ),
+    )
+    batch.add_argument(
+        "--bootstrap",
+        type=int,
+        default=0,
+        metavar="REPLICATES",
+        help=(
+            "Report 95%% confidence bands and MTF50 intervals from this many "
+            "bootstrap replicates of each edge, for example 500. Implies "
+            "--vectorized."
+        ),
+    )
+    batch.set_defaults(func=run_batch)
+
+    watch = subparsers.add_parser(
+        "watch",
+        help="Calculate MTF for files as they arrive in watched directories.",
+        description=(
+            "Watch directories for new DICOM files and calculate MTF for each "
+            "once it has been fully written, saving results to the results "
+            "store. Files already in the store, or that failed before, are "
+            "skipped. Runs until interrupted."
+        ),
+    )
+    watch.add_argument("directories", nargs="+", type=Path)
+    watch.add_argument(
+        "--store",
+        type=Path,
+        default=DEFAULT_RESULTS_PATH,
+        help=f"Results store (default: {DEFAULT_RESULTS_PATH}).",
+    )
+    watch.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=2,
+        help="Number of worker processes (default: 2).",
+    )
+    watch.add_argument(
+        "--settle",
+        type=float,
+        default=2.0,
+        help="Seconds a file must be unchanged before it is read (default: 2).",
+    )
+    watch.add_argument(
+        "--poll",
+        action="store_true",
+        help="Rescan the directories rather than use filesystem notifications.",
+    )
+    watch.add_argument(
+        "--interval",
+        type=float,
+        default=2.0,
+        help="Seconds between rescans when polling (default: 2).",
+    )
+    watch.add_argument(
+        "--params",
+        type=Path,
+        default=DEFAULT_PARAMS_PATH,
+        help="Template parameters JSON file.",
+    )
+    watch.add_argument(
+        "--track-rois",
+        action="store_true",
+        help=(
+            "Search for the edge object near where it was last found in "
+            "images from the same unit, mode and orientation."
+        ),
+    )
+    watch.set_defaults(func=run_watch)
+
+    scp = subparsers.add_parser(
+        "scp",
+        help="Receive images over DICOM C-STORE and calculate MTF on arrival.",
+        description=(
+            "Run a DICOM storage SCP. Received images are calculated in memory "
+            "and results streamed to the output file. When the queue of "
+            "received images is full, C-STOREs are refused with status 0xA700 "
+            "so senders retry later. Runs until interrupted."
+        ),
+    )
+    scp.add_argument("-o", "--output", required=True, help="Output file.")
+    scp.add_argument("-f", "--format", choices=sorted(WRITERS))
+    scp.add_argument("--ae-title", default="DRMAM")
+    scp.add_argument(
+        "--address",
+        default="127.0.0.1",
+        help="Address to listen on, 0.0.0.0 for all interfaces.",
+    )
+    scp.add_argument("--port", type=int, default=11112)
+    scp.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        default=2,
+        help="Number of worker processes (default: 2).",
+    )
+    scp.add_argument(
+        "--queue-size",
+        type=int,
+        default=16,
+        help="Received images held while workers are busy (default: 16).",
+    )
+    scp.add_argument(
+        "--params",
+        type=Path,
+        default=DEFAULT_PARAMS_PATH,
+        help="Template parameters JSON file.",
+    )
+    scp.add_argument(
+        "--track-rois",
+        action="store_true",
+        help=(
+            "Search for the edge object near where it was last found in "
+            "images from the same unit, mode and orientation."
+        ),
+    )
+    scp.set_defaults(func=run_scp)
+
+    send = subparsers.add_parser(
+        "send",
+        help="Send files to a storage SCP, for testing the scp command.",
+    )
+    send.add_argument("paths", nargs="+", help="DICOM files or directories.")
+    send.add_argument("--ae-title", default="DRMAM", help="Called AE title.")
+    send.add_argument("--address", default="127.0.0.1")
+    send.add_argument("--port", type=int, default=11112)
+    send.set_defaults(func=run_send)
+
+    sweep = subparsers.add_parser(
+        "sweep",
+        help="Calculate MTF for each slice of a tomosynthesis volume.",
+        description=(
+            "Calculate MTF for every reconstructed slice of a multi-frame "
+            "volume, or a slab of slices, reading one slice at a time. Each "
+            "output record is labelled <file>[<slice>]."
+        ),
+    )
+    sweep.add_argument("path", help="Multi-frame DICOM file.")
+    sweep.add_argument(
+        "-o",
+        "--output",
+        required=True,
+        help="Output file, format taken from the extension unless --format is set.",
+    )
+    sweep.add_argument("-f", "--format", choices=sorted(WRITERS))
+    sweep.add_argument(
+        "--slab",
+        type=parse_slab,
+        help="Slices to process as start:stop (stop exclusive), default all.",
+    )
+    sweep.add_argument(
+        "--params",
+        type=Path,
+        default=DEFAULT_PARAMS_PATH,
+        help="Template parameters JSON file.",
+    )
+    sweep.set_defaults(func=run_sweep)
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "format", "") is None:
+        suffix = Path(args.output).suffix.lstrip(".").lower()
+        if suffix not in WRITERS:
+            parser.error(f"Cannot infer output format from {args.output!r}.")
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
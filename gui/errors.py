@@ -16,3 +16,7 @@ class TemplateWriteError(Exception):
 
 class ActiveCellError(Exception):
     pass
+
+
+class UnsupportedFileError(Exception):
+    pass
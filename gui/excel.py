@@ -1,7 +1,12 @@
+from __future__ import annotations
 from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable
+import queue
 import re
-import xlwings as xw
+import threading
 import numpy as np
 from .errors import (
     ExcelNotFoundError,
@@ -11,7 +16,10 @@ from .errors import (
     ActiveCellError,
 )
 from .calculator import ColumnIndex
-from .utils import read_json
+from .instrument import stage
+from .utils import read_json, lazy_import
+
+xw = lazy_import("xlwings")
 
 
 def excelkey2ind(excelkey: str) -> tuple[int, int]:
@@ -42,17 +50,106 @@ class ExcelHandler(ABC):
         pass
 
 
+class WorkbookWatcher:
+    """
+    Polls the open workbooks on a background thread and queues the list only
+    when it changes. The poll interval doubles while nothing changes, up to
+    max_interval, and drops back to min_interval after a change or wake().
+    A list of None means Excel could not be found.
+    """
+
+    def __init__(
+        self,
+        list_books: Callable[[], list[str]],
+        min_interval: float = 1.0,
+        max_interval: float = 16.0,
+    ) -> None:
+        self.list_books = list_books
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.latest: list[str] | None = None
+        self.changes: queue.Queue[list[str] | None] = queue.Queue()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _poll(self, previous: tuple | None) -> tuple | None:
+        try:
+            books = tuple(self.list_books())
+        except ExcelNotFoundError:
+            books = None
+        if books != previous:
+            self.latest = None if books is None else list(books)
+            self.changes.put(self.latest)
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        return books
+
+    def _run(self) -> None:
+        try:  # COM has to be initialised on each thread that uses it
+            import pythoncom
+
+            pythoncom.CoInitialize()
+        except ImportError:
+            pass
+        previous = ()
+        while not self._stop.is_set():
+            previous = self._poll(previous)
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    def wake(self) -> None:
+        """Poll again now, for when a change is expected."""
+        self.interval = self.min_interval
+        self._wake.set()
+
+    def get_change(self) -> tuple[bool, list[str] | None]:
+        """Return (changed, books) with the most recent change since last call."""
+        changed, books = False, None
+        while True:
+            try:
+                books = self.changes.get_nowait()
+                changed = True
+            except queue.Empty:
+                return changed, books
+
+
 class XwingsHandler(ExcelHandler):
     def __init__(self, params_path: Path, write_mode="template") -> None:
+        self.params_path = params_path
         self.params_dict = read_json(params_path)
         self.write_mode = write_mode
         self.active_sheet = None
         self.active_cell = None
         self.active_cell_gen = None
-        try:
-            self.selected_book = xw.books.active.name
-        except xw.XlwingsError:
-            self.selected_book = "-"
+        self._selected_book = None
+
+    def reload_params(self) -> None:
+        """Read the template parameters again, after they have been edited."""
+        self.params_dict = read_json(self.params_path)
+
+    @property
+    def selected_book(self) -> str:
+        # Looked up on first use, as importing xlwings and querying Excel is slow.
+        if self._selected_book is None:
+            try:
+                self._selected_book = xw.books.active.name
+            except xw.XlwingsError:
+                self._selected_book = "-"
+        return self._selected_book
+
+    @selected_book.setter
+    def selected_book(self, value: str) -> None:
+        self._selected_book = value
 
     @property
     def book_names(self) -> list[str]:
@@ -91,14 +188,8 @@ class XwingsHandler(ExcelHandler):
             col_write += increment
 
     def write_active(self, file_name: str, mode: str, mtf_data: np.ndarray) -> None:
-        header_rows = np.array(
-            [
-                [file_name, mode, "", "", ""],
-                ["f", "left", "right", "top", "bottom"],
-            ]
-        )
         write_sheet = xw.books[self.selected_book].sheets[self.active_sheet]
-        write_data = np.concatenate((header_rows, mtf_data))
+        write_data = active_cell_array(file_name, mode, mtf_data)
         write_cell = next(self.active_cell_gen)
         try:
             write_values(write_sheet, write_data, write_cell)
@@ -111,10 +202,6 @@ class XwingsHandler(ExcelHandler):
         self, manufacturer: str, mode: str, orientation: str, mtf_data: np.ndarray
     ) -> None:
         """Substitution not implemented."""
-        orientation2edgeloc = {
-            "left": ["right", "top"],
-            "right": ["left", "bottom"],
-        }
         book_name = self.selected_book
         sheet_name = self.params_dict["sheet_name"]
         try:
@@ -122,16 +209,7 @@ class XwingsHandler(ExcelHandler):
         except Exception as e:
             raise TemplateWriteError(e)
         cell_key = self.params_dict["modes"][mode]
-        edge_locations_write = orientation2edgeloc[orientation]
-        edge_indices = [
-            ColumnIndex[edge_loc].value for edge_loc in edge_locations_write
-        ]
-        array_list = []
-        for edge_index in edge_indices:
-            array = np.array([mtf_data[:, 0], mtf_data[:, edge_index]]).T
-            array_list.append(array)
-
-        formatted_data = np.concatenate(array_list, axis=1)
+        formatted_data = template_array(orientation, mtf_data)
         write_values(xwsheet, formatted_data, cell_key)
 
     def write_data(
@@ -160,6 +238,194 @@ class XwingsHandler(ExcelHandler):
             print(e)
             self.set_active_cell()
 
+    def _plan_batch(
+        self, rows: list[tuple[str, str, str, str, np.ndarray]]
+    ) -> tuple[list[WriteBlock], list[tuple[str, str]]]:
+        """Work out where each row goes, in the current write mode."""
+        blocks, failures = [], []
+        for file_name, manufacturer, mode, orientation, mtf_data in rows:
+            try:
+                if self.write_mode == "template":
+                    block = WriteBlock(
+                        file_name,
+                        self.params_dict["sheet_name"],
+                        excelkey2ind(self.params_dict["modes"][mode]),
+                        template_array(orientation, mtf_data),
+                    )
+                else:
+                    block = WriteBlock(
+                        file_name,
+                        self.active_sheet,
+                        next(self.active_cell_gen),
+                        active_cell_array(file_name, mode, mtf_data),
+                    )
+            except (KeyError, TypeError) as e:
+                failures.append((file_name, f"No write location for {file_name}: {e}"))
+            else:
+                blocks.append(block)
+        return blocks, failures
+
+    def write_batch(
+        self, rows: list[tuple[str, str, str, str, np.ndarray]]
+    ) -> list[tuple[str, str]]:
+        """
+        Write many rows of (file_name, manufacturer, mode, orientation,
+        mtf_data) with as few COM calls as possible. Each sheet's target region
+        is read once for the overwrite check, and adjacent blocks are merged
+        into a single assignment, with screen updating and recalculation
+        suspended throughout. Returns (file_name, reason) for rows not written.
+        """
+        try:
+            if self.write_mode != "template" and self.active_cell_gen is None:
+                self.set_active_cell()
+            with stage("plan write"):
+                blocks, failures = self._plan_batch(rows)
+            try:
+                xwbook = xw.books[self.selected_book]
+            except KeyError as e:
+                raise TemplateWriteError(f"Workbook not open: {e}")
+            with suspend_updates(xwbook.app), stage("com write"):
+                for sheet_name in dict.fromkeys(block.sheet for block in blocks):
+                    sheet_blocks = [
+                        block for block in blocks if block.sheet == sheet_name
+                    ]
+                    try:
+                        sheet = xwbook.sheets[sheet_name]
+                    except Exception as e:
+                        raise TemplateWriteError(e)
+                    failures += write_blocks(sheet, sheet_blocks)
+        except (xw.XlwingsError, TemplateWriteError, ActiveCellError) as e:
+            print(e)
+            raise ExcelWriteError
+        return failures
+
+
+@dataclass
+class WriteBlock:
+    """A 2D array destined for a sheet, with top-left (row, column) index."""
+
+    file_name: str
+    sheet: str
+    top_left: tuple[int, int]
+    array: np.ndarray
+
+    @property
+    def bottom_right(self) -> tuple[int, int]:
+        return (
+            self.top_left[0] + self.array.shape[0] - 1,
+            self.top_left[1] + self.array.shape[1] - 1,
+        )
+
+
+def template_array(orientation: str, mtf_data: np.ndarray) -> np.ndarray:
+    """Frequency and MTF column pairs for the two edges the template expects."""
+    orientation2edgeloc = {
+        "left": ["right", "top"],
+        "right": ["left", "bottom"],
+    }
+    edge_locations_write = orientation2edgeloc[orientation]
+    edge_indices = [ColumnIndex[edge_loc].value for edge_loc in edge_locations_write]
+    array_list = []
+    for edge_index in edge_indices:
+        array = np.array([mtf_data[:, 0], mtf_data[:, edge_index]]).T
+        array_list.append(array)
+    return np.concatenate(array_list, axis=1)
+
+
+def active_cell_array(file_name: str, mode: str, mtf_data: np.ndarray) -> np.ndarray:
+    """All MTF columns under a file name and column headings."""
+    header_rows = np.array(
+        [
+            [file_name, mode, "", "", ""],
+            ["f", "left", "right", "top", "bottom"],
+        ]
+    )
+    return np.concatenate((header_rows, mtf_data))
+
+
+@contextmanager
+def suspend_updates(app: xw.App):
+    """Turn off screen updating and automatic recalculation while writing."""
+    screen_updating, calculation = app.screen_updating, app.calculation
+    app.screen_updating = False
+    app.calculation = "manual"
+    try:
+        yield
+    finally:
+        app.calculation = calculation
+        app.screen_updating = screen_updating
+
+
+def merge_blocks(blocks: list[WriteBlock]) -> list[WriteBlock]:
+    """
+    Merge blocks that sit side by side with the same rows into one block, so
+    they are written in one assignment. Gaps are never filled, so cells
+    between blocks (such as template formulas) are left untouched.
+    """
+    merged = []
+    for block in sorted(blocks, key=lambda block: (block.top_left, block.file_name)):
+        previous = merged[-1] if merged else None
+        if (
+            previous is not None
+            and previous.top_left[0] == block.top_left[0]
+            and previous.array.shape[0] == block.array.shape[0]
+            and previous.bottom_right[1] + 1 == block.top_left[1]
+        ):
+            merged[-1] = WriteBlock(
+                previous.file_name,
+                previous.sheet,
+                previous.top_left,
+                np.concatenate(
+                    (previous.array.astype(object), block.array.astype(object)),
+                    axis=1,
+                ),
+            )
+        else:
+            merged.append(block)
+    return merged
+
+
+def write_blocks(sheet: xw.Sheet, blocks: list[WriteBlock]) -> list[tuple[str, str]]:
+    """
+    Write blocks to a sheet after checking them all against a single read of
+    their bounding range. Blocks over existing values, or over a block earlier
+    in the batch, are skipped. Returns (file_name, reason) for skipped blocks.
+    """
+    if not blocks:
+        return []
+    top = min(block.top_left[0] for block in blocks)
+    left = min(block.top_left[1] for block in blocks)
+    bottom = max(block.bottom_right[0] for block in blocks)
+    right = max(block.bottom_right[1] for block in blocks)
+    current_values = np.array(
+        sheet.range((top, left), (bottom, right)).options(ndim=2).value, dtype=object
+    )
+    occupied = np.frompyfunc(bool, 1, 1)(current_values).astype(bool)
+
+    accepted, failures = [], []
+    for block in blocks:
+        (row0, col0), (row1, col1) = block.top_left, block.bottom_right
+        region = (
+            slice(row0 - top, row1 - top + 1),
+            slice(col0 - left, col1 - left + 1),
+        )
+        if occupied[region].any():
+            failures.append(
+                (
+                    block.file_name,
+                    f"Values detected in region with {block.top_left} as the "
+                    + "top-left index. The bottom right (row, column) index is "
+                    + f"{block.bottom_right}.",
+                )
+            )
+            continue
+        occupied[region] = True
+        accepted.append(block)
+
+    for block in merge_blocks(accepted):
+        sheet.range(block.top_left, block.bottom_right).value = block.array
+    return failures
+
 
 def write_values(
     sheet: xw.Sheet, array: np.ndarray, cell_key: str | tuple[int, int]
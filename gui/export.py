@@ -0,0 +1,223 @@
+from __future__ import annotations
+import csv
+from abc import abstractmethod
+from pathlib import Path
+import numpy as np
+from .excel import ExcelHandler, excelkey2ind, template_array, active_cell_array
+from .errors import ExcelWriteError
+from .utils import read_json
+
+# In-process exporters with the same write_data/write_batch interface as
+# XwingsHandler, for writing results without a running Excel instance.
+
+MTF_COLUMNS = ("frequency", "left", "right", "top", "bottom")
+
+
+class FileExporter(ExcelHandler):
+    """
+    Base for exporters that write to a file rather than an open workbook.
+    The output file stands in for the selected workbook.
+    """
+
+    def __init__(self, out_path: str | Path) -> None:
+        self.out_path = Path(out_path)
+        self.selected_book = self.out_path.name
+        self.write_mode = "template"
+
+    @property
+    def book_names(self) -> list[str]:
+        return [self.selected_book]
+
+    def reload_params(self) -> None:
+        """Exporters without a template have no parameters to read again."""
+        pass
+
+    def write_data(
+        self,
+        file_name: str,
+        manufacturer: str,
+        mode: str,
+        orientation: str,
+        mtf_data: np.ndarray,
+    ) -> None:
+        failures = self.write_batch(
+            [(file_name, manufacturer, mode, orientation, mtf_data)]
+        )
+        if failures:
+            print(failures[0][1])
+            raise ExcelWriteError
+
+    @abstractmethod
+    def write_batch(
+        self, rows: list[tuple[str, str, str, str, np.ndarray]]
+    ) -> list[tuple[str, str]]:
+        pass
+
+
+class XlsxExporter(FileExporter):
+    """
+    Writes an .xlsx file with openpyxl. In template mode results go to the
+    cells given by sheet_name and modes in template_parameters.json,
+    optionally in a copy of an existing template workbook. In active cell mode
+    results are laid out side by side from start_cell.
+    """
+
+    def __init__(
+        self,
+        params_path: Path,
+        out_path: str | Path,
+        template_path: str | Path = None,
+        write_mode: str = "template",
+        start_cell: str = "A1",
+    ) -> None:
+        try:
+            import openpyxl
+        except ImportError:
+            raise ImportError("Writing .xlsx files requires openpyxl.")
+        super().__init__(out_path)
+        self.params_path = params_path
+        self.params_dict = read_json(params_path)
+        self.write_mode = write_mode
+        if template_path is not None:
+            self.workbook = openpyxl.load_workbook(template_path)
+        elif self.out_path.exists():
+            self.workbook = openpyxl.load_workbook(self.out_path)
+        else:
+            self.workbook = openpyxl.Workbook()
+            self.workbook.active.title = self.params_dict["sheet_name"]
+        self.next_cell = excelkey2ind(start_cell)
+
+    def reload_params(self) -> None:
+        """Read the template parameters again, after they have been edited."""
+        self.params_dict = read_json(self.params_path)
+
+    def _sheet(self, sheet_name: str):
+        if sheet_name not in self.workbook.sheetnames:
+            return self.workbook.create_sheet(sheet_name)
+        return self.workbook[sheet_name]
+
+    def _write_block(
+        self, sheet, top_left: tuple[int, int], array: np.ndarray
+    ) -> str | None:
+        """Write an array unless it would overwrite values, returning why not."""
+        top, left = top_left
+        bottom, right = top + array.shape[0] - 1, left + array.shape[1] - 1
+        for row in sheet.iter_rows(
+            min_row=top, max_row=bottom, min_col=left, max_col=right
+        ):
+            if any(cell.value for cell in row):
+                return (
+                    f"Values detected in region with {top_left} as the top-left "
+                    + "index. The bottom right (row, column) index is "
+                    + f"{bottom, right}."
+                )
+        for i, row_values in enumerate(array.tolist()):
+            for j, value in enumerate(row_values):
+                if isinstance(value, float) and np.isnan(value):
+                    value = None
+                sheet.cell(row=top + i, column=left + j, value=value)
+        return None
+
+    def write_batch(
+        self, rows: list[tuple[str, str, str, str, np.ndarray]]
+    ) -> list[tuple[str, str]]:
+        failures = []
+        for file_name, manufacturer, mode, orientation, mtf_data in rows:
+            try:
+                if self.write_mode == "template":
+                    sheet = self._sheet(self.params_dict["sheet_name"])
+                    top_left = excelkey2ind(self.params_dict["modes"][mode])
+                    array = template_array(orientation, mtf_data)
+                else:
+                    sheet = self.workbook.active
+                    top_left = self.next_cell
+                    array = active_cell_array(file_name, mode, mtf_data).astype(object)
+                    array[2:] = mtf_data
+                    self.next_cell = (top_left[0], top_left[1] + array.shape[1])
+            except KeyError as e:
+                failures.append((file_name, f"No write location for {file_name}: {e}"))
+                continue
+            reason = self._write_block(sheet, top_left, array)
+            if reason is not None:
+                failures.append((file_name, reason))
+        self.workbook.save(self.out_path)
+        return failures
+
+
+class CSVExporter(FileExporter):
+    """Appends results to a long format CSV, one line per frequency sample."""
+
+    def write_batch(
+        self, rows: list[tuple[str, str, str, str, np.ndarray]]
+    ) -> list[tuple[str, str]]:
+        write_header = not self.out_path.exists()
+        with open(self.out_path, "a", newline="") as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(
+                    ("file", "manufacturer", "mode", "orientation") + MTF_COLUMNS
+                )
+            for file_name, manufacturer, mode, orientation, mtf_data in rows:
+                details = (file_name, manufacturer, mode, orientation)
+                writer.writerows(details + tuple(row) for row in mtf_data.tolist())
+        return []
+
+
+class ParquetExporter(FileExporter):
+    """
+    Columnar Parquet file with one row per image. Each MTF column is stored as
+    a fixed size list, built from the stacked results array in one step.
+    """
+
+    def __init__(self, out_path: str | Path) -> None:
+        try:
+            import pyarrow
+        except ImportError:
+            raise ImportError("Writing Parquet files requires pyarrow.")
+        super().__init__(out_path)
+        self.tables = []
+
+    def write_batch(
+        self, rows: list[tuple[str, str, str, str, np.ndarray]]
+    ) -> list[tuple[str, str]]:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if not rows:
+            return []
+        details = list(zip(*(row[:4] for row in rows)))
+        mtf_data = np.stack([row[4] for row in rows])
+        n_samples = mtf_data.shape[1]
+        columns = {
+            name: pa.array(values, pa.string())
+            for name, values in zip(
+                ("file", "manufacturer", "mode", "orientation"), details
+            )
+        }
+        for index, name in enumerate(MTF_COLUMNS):
+            flat_values = pa.array(np.ascontiguousarray(mtf_data[:, :, index]).ravel())
+            columns[name] = pa.FixedSizeListArray.from_arrays(flat_values, n_samples)
+        self.tables.append(pa.table(columns))
+        # Parquet files cannot be appended to, so everything written so far is
+        # written again. Export a session in one batch to avoid this.
+        pq.write_table(pa.concat_tables(self.tables), self.out_path)
+        return []
+
+
+EXPORT_SUFFIXES = (".xlsx", ".csv", ".parquet")
+
+
+def make_exporter(
+    out_path: str | Path, params_path: Path, template_path: str | Path = None
+) -> FileExporter:
+    """Choose an exporter from the output file extension."""
+    suffix = Path(out_path).suffix.lower()
+    if suffix == ".xlsx":
+        return XlsxExporter(params_path, out_path, template_path)
+    if suffix == ".csv":
+        return CSVExporter(out_path)
+    if suffix == ".parquet":
+        return ParquetExporter(out_path)
+    raise ValueError(
+        f"Unsupported export format {suffix}, use one of {EXPORT_SUFFIXES}"
+    )
@@ -0,0 +1,126 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterator
+import numpy as np
+from .utils import lazy_import
+
+if TYPE_CHECKING:
+    from pydicom.dataset import Dataset
+
+pydicom = lazy_import("pydicom")
+
+NATIVE_SYNTAXES = {
+    "1.2.840.10008.1.2",
+    "1.2.840.10008.1.2.1",
+}
+
+
+class FrameReader:
+    """
+    Lazy access to the frames of a DICOM file. Uncompressed pixel data is
+    memory-mapped, so indexing a frame reads only that frame from disk, and
+    only the rows actually used of a strided view. Compressed frames are
+    decoded one at a time.
+    """
+
+    def __init__(self, fpath: str | Path, header: Dataset = None) -> None:
+        self.fpath = str(fpath)
+        if header is None:
+            header = pydicom.dcmread(self.fpath, stop_before_pixels=True)
+        self.header = header
+        self.n_frames = int(header.get("NumberOfFrames", 1) or 1)
+        self.shape = (int(header.Rows), int(header.Columns))
+        self.transfer_syntax = str(header.file_meta.TransferSyntaxUID)
+        self._memmap = None
+        if self.transfer_syntax in NATIVE_SYNTAXES:
+            self._memmap = self._map_native()
+
+    def _map_native(self) -> np.memmap:
+        ds = pydicom.dcmread(self.fpath, defer_size=1024)
+        try:
+            pixel_element = ds.get_item("PixelData", keep_deferred=True)
+        except TypeError:  # pydicom < 3 always keeps deferred elements raw
+            pixel_element = ds.get_item("PixelData")
+        kind = "i" if self.header.PixelRepresentation else "u"
+        dtype = np.dtype(f"<{kind}{self.header.BitsAllocated // 8}")
+        return np.memmap(
+            self.fpath,
+            dtype=dtype,
+            mode="r",
+            offset=pixel_element.value_tell,
+            shape=(self.n_frames,) + self.shape,
+        )
+
+    def __len__(self) -> int:
+        return self.n_frames
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        if not -self.n_frames <= index < self.n_frames:
+            raise IndexError(f"Frame {index} out of range for {self.n_frames} frames")
+        index %= self.n_frames
+        if self._memmap is not None:
+            return self._memmap[index]
+        try:
+            from pydicom.pixels import pixel_array  # pydicom >= 3
+        except ImportError:
+            pixels = pydicom.dcmread(self.fpath).pixel_array
+            return pixels[index] if self.n_frames > 1 else pixels
+        return pixel_array(self.fpath, index=index)
+
+    def iter_frames(self, indices=None) -> Iterator[tuple[int, np.ndarray]]:
+        """Yield (index, frame) pairs, holding a single frame at a time."""
+        indices = range(self.n_frames) if indices is None else indices
+        for index in indices:
+            yield index, self[index]
+
+
+def pixel_spacing(header: Dataset) -> float:
+    """Pixel spacing in mm, from the top level or the functional groups."""
+    for keyword in ("ImagerPixelSpacing", "PixelSpacing"):
+        if keyword in header:
+            return float(header[keyword].value[0])
+    shared = header.get("SharedFunctionalGroupsSequence")
+    if shared and "PixelMeasuresSequence" in shared[0]:
+        return float(shared[0].PixelMeasuresSequence[0].PixelSpacing[0])
+    raise KeyError("Pixel spacing not found in header.")
+
+
+@dataclass
+class SliceImage:
+    """
+    A single reconstructed slice, with the attributes of MammoMTFImage that
+    the calculator uses.
+    """
+
+    array: np.ndarray
+    pixel_spacing: float
+    manufacturer: str
+    acquisition: str
+    orientation: str
+    focus_plane: int
+
+
+def slice_image(
+    header: Dataset, frame: np.ndarray, index: int, acquisition: str
+) -> SliceImage:
+    """
+    Prepare one slice for ROI detection: rescale to the 0-255 range of
+    preprocessed images and invert MONOCHROME1 data. Orientation comes from
+    the image laterality. acquisition names the mode of the volume, as in
+    template_parameters.json.
+    """
+    array = frame.astype(np.float32)
+    low, high = float(array.min()), float(array.max())
+    array = (array - low) * (255 / max(high - low, 1e-6))
+    if header.get("PhotometricInterpretation") == "MONOCHROME1":
+        array = 255 - array
+    laterality = str(header.get("ImageLaterality", header.get("Laterality", "")))
+    return SliceImage(
+        array=array,
+        pixel_spacing=pixel_spacing(header),
+        manufacturer=str(header.get("Manufacturer", "")).lower(),
+        acquisition=acquisition,
+        orientation="right" if laterality.upper() == "R" else "left",
+        focus_plane=index,
+    )
@@ -0,0 +1,219 @@
+from __future__ import annotations
+import itertools
+import os
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable, Iterator
+from .calculator import get_hologic_mode
+from .errors import UnsupportedFileError
+from .utils import lazy_import
+
+if TYPE_CHECKING:
+    from pydicom.dataset import Dataset
+
+pydicom = lazy_import("pydicom")
+
+# Only these elements are parsed, so a scan never touches pixel data.
+HEADER_TAGS = [
+    "SOPInstanceUID",
+    "Manufacturer",
+    "ImageType",
+    "PaddleDescription",
+    "EstimatedRadiographicMagnificationFactor",
+    "Rows",
+    "Columns",
+    "NumberOfFrames",
+]
+
+# get_hologic_mode names mapped to the magnification_factor keys used in
+# template_parameters.json.
+HOLOGIC_MODES = {"contact": "conventional", "mag": "mag", "tomo_recon_top": "tomo"}
+
+
+@dataclass
+class HeaderInfo:
+    fpath: str
+    sop_instance_uid: str
+    manufacturer: str
+    mode: str
+    rows: int
+    columns: int
+    frames: int
+    transfer_syntax: str
+
+    @property
+    def cost(self) -> int:
+        """Pixels to decode, a proxy for the time the image takes to process."""
+        return self.rows * self.columns * self.frames
+
+
+def header_mode(header: Dataset, manufacturer: str) -> str:
+    """
+    Acquisition mode from the header, named as in template_parameters.json.
+    manufacturer may be a key of the template parameters or the header's name.
+    """
+    if "hologic" in manufacturer.lower():
+        try:
+            return HOLOGIC_MODES[get_hologic_mode(header)]
+        except KeyError:
+            pass  # Header elements missing, fall back to the generic rules
+    image_type = [str(value).upper() for value in header.get("ImageType", [])]
+    if "TOMOSYNTHESIS" in image_type or "VOLUME" in image_type:
+        return "tomo"
+    paddle = str(header.get("PaddleDescription", "")).upper()
+    magnification = float(header.get("EstimatedRadiographicMagnificationFactor", 1))
+    if "MAG" in paddle or magnification > 1.3:
+        return "mag"
+    return "conventional"
+
+
+def scan_header(fpath: str | Path, manufacturers: Iterable[str]) -> HeaderInfo:
+    """
+    Read the header of a file, without its pixel data, and check it is an image
+    from one of the supported manufacturers.
+    """
+    fpath = str(fpath)
+    try:
+        header = pydicom.dcmread(
+            fpath, stop_before_pixels=True, specific_tags=HEADER_TAGS
+        )
+    except (pydicom.errors.InvalidDicomError, OSError) as e:
+        raise UnsupportedFileError(f"Not a readable DICOM file: {e}")
+    if "Rows" not in header or "Columns" not in header:
+        raise UnsupportedFileError("No image in DICOM file.")
+
+    manufacturer_name = str(header.get("Manufacturer", "")).lower()
+    for manufacturer in manufacturers:
+        if manufacturer in manufacturer_name:
+            break
+    else:
+        raise UnsupportedFileError(
+            f"Unsupported manufacturer {manufacturer_name or 'unknown'}."
+        )
+    return HeaderInfo(
+        fpath=fpath,
+        sop_instance_uid=str(header.get("SOPInstanceUID", "")),
+        manufacturer=manufacturer,
+        mode=header_mode(header, manufacturer),
+        rows=int(header.Rows),
+        columns=int(header.Columns),
+        frames=int(header.get("NumberOfFrames", 1) or 1),
+        transfer_syntax=str(header.file_meta.get("TransferSyntaxUID", "")),
+    )
+
+
+def scan_headers(
+    fpaths: Iterable[str], manufacturers: Iterable[str], workers: int = 8
+) -> tuple[list[HeaderInfo], list[tuple[str, str]]]:
+    """
+    Scan many headers using a thread pool. Returns the accepted headers, in
+    input order, and (path, reason) pairs for rejected files.
+    """
+    manufacturers = list(manufacturers)
+
+    def scan(fpath: str) -> HeaderInfo | tuple[str, str]:
+        try:
+            return scan_header(fpath, manufacturers)
+        except UnsupportedFileError as e:
+            return (str(fpath), str(e))
+
+    headers, rejected = [], []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for scanned in executor.map(scan, fpaths):
+            if isinstance(scanned, HeaderInfo):
+                headers.append(scanned)
+            else:
+                rejected.append(scanned)
+    return headers, rejected
+
+
+def iter_dicomdir(dicomdir_path: str | Path) -> Iterator[str]:
+    """Yield the instance files referenced by a DICOMDIR index."""
+    dicomdir_path = Path(dicomdir_path)
+    dicomdir = pydicom.dcmread(dicomdir_path)
+    for record in dicomdir.get("DirectoryRecordSequence", []):
+        file_id = record.get("ReferencedFileID")
+        if file_id is None:
+            continue  # Patient, study and series records
+        if isinstance(file_id, str):
+            file_id = [file_id]
+        yield str(dicomdir_path.parent.joinpath(*file_id))
+
+
+def iter_dicom_paths(paths: Iterable[str | Path]) -> Iterator[str]:
+    """
+    Lazily expand dropped paths into DICOM files. Files are yielded as is,
+    DICOMDIR files are replaced by the instances they reference and
+    directories are walked, using a DICOMDIR at the top of any subtree in
+    place of walking it.
+    """
+    for path in map(Path, paths):
+        if path.name.upper() == "DICOMDIR" and path.is_file():
+            yield from iter_dicomdir(path)
+        elif path.is_dir():
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                if "DICOMDIR" in filenames:
+                    dirnames.clear()
+                    yield from iter_dicomdir(Path(dirpath) / "DICOMDIR")
+                    continue
+                for filename in sorted(filenames):
+                    fpath = os.path.join(dirpath, filename)
+                    if pydicom.misc.is_dicom(fpath):
+                        yield fpath
+        else:
+            yield str(path)
+
+
+def scan_batches(
+    fpaths: Iterable[str], manufacturers: Iterable[str], batch_size: int = 200
+) -> Iterator[tuple[list[HeaderInfo], list[tuple[str, str]]]]:
+    """
+    Scan headers batch_size files at a time as fpaths is consumed, so results
+    are available while a directory walk is still in progress.
+    """
+    manufacturers = list(manufacturers)
+    fpaths = iter(fpaths)
+    while batch := list(itertools.islice(fpaths, batch_size)):
+        yield scan_headers(batch, manufacturers)
+
+
+class BackgroundIngest:
+    """
+    Runs scan_batches on a worker thread. Scanned batches are queued for the
+    caller to insert from the thread that owns the database connection.
+    """
+
+    def __init__(
+        self,
+        batches: Iterator[tuple[list[HeaderInfo], list[tuple[str, str]]]],
+    ) -> None:
+        self.batches = batches
+        self.queue = queue.Queue()
+        self.finished = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self) -> None:
+        try:
+            for batch in self.batches:
+                self.queue.put(batch)
+        finally:
+            self.finished = True
+
+    def start(self) -> None:
+        self.thread.start()
+
+    @property
+    def done(self) -> bool:
+        return self.finished and self.queue.empty()
+
+    def drain(self) -> list[tuple[list[HeaderInfo], list[tuple[str, str]]]]:
+        drained = []
+        while True:
+            try:
+                drained.append(self.queue.get_nowait())
+            except queue.Empty:
+                return drained
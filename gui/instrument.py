@@ -0,0 +1,141 @@
+from __future__ import annotations
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+
+# Per-stage wall time and peak allocation of a calculation. Stages are marked
+# with `with stage("decompress"):` throughout the pipeline. Outside of a
+# recording() block stage() returns a shared no-op context, so instrumented
+# code costs one context variable lookup when instrumentation is off.
+
+_NULL_CONTEXT = nullcontext()
+_active_recorder: ContextVar[StageRecorder | None] = ContextVar(
+    "active_recorder", default=None
+)
+
+
+@dataclass
+class StageTiming:
+    image: str
+    stage: str
+    edge: str
+    seconds: float
+    peak_bytes: int  # Peak allocation above the start of the stage, 0 untraced
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+class StageRecorder:
+    """
+    Collects StageTimings for one image. Stages may nest, as pipeline stages
+    compute the stages they depend on. Times are exclusive of nested stages,
+    so the stage times of an image add up to its total.
+    """
+
+    def __init__(self, image: str, trace_memory: bool) -> None:
+        self.image = image
+        self.trace_memory = trace_memory
+        self.timings: list[StageTiming] = []
+        self._stack: list[list] = []  # [start, nested seconds, baseline, peak]
+
+    def _traced_peak(self) -> int:
+        return tracemalloc.get_traced_memory()[1] if self.trace_memory else 0
+
+    @contextmanager
+    def stage(self, name: str, edge: str = ""):
+        if self._stack and self.trace_memory:
+            parent = self._stack[-1]
+            parent[3] = max(parent[3], self._traced_peak())
+        baseline = 0
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+        frame = [time.perf_counter(), 0.0, baseline, baseline]
+        self._stack.append(frame)
+        try:
+            yield
+        finally:
+            self._stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            peak = max(frame[3], self._traced_peak())
+            self.timings.append(
+                StageTiming(
+                    self.image,
+                    name,
+                    edge,
+                    elapsed - frame[1],
+                    max(peak - frame[2], 0),
+                )
+            )
+            if self._stack:
+                parent = self._stack[-1]
+                parent[1] += elapsed
+                parent[3] = max(parent[3], peak)
+                if self.trace_memory:
+                    tracemalloc.reset_peak()
+
+
+def stage(name: str, edge: str = ""):
+    """Context manager timing a stage of the calculation being recorded."""
+    recorder = _active_recorder.get()
+    if recorder is None:
+        return _NULL_CONTEXT
+    return recorder.stage(name, edge)
+
+
+@contextmanager
+def recording(image: str, trace_memory: bool = True):
+    """
+    Record the stages run inside the block, for the image named. Yields the
+    list the StageTimings are appended to. Memory is traced with tracemalloc,
+    which slows allocation heavy code, so can be turned off separately.
+    """
+    recorder = StageRecorder(image, trace_memory)
+    started_tracing = trace_memory and not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    token = _active_recorder.set(recorder)
+    try:
+        yield recorder.timings
+    finally:
+        _active_recorder.reset(token)
+        if started_tracing:
+            tracemalloc.stop()
+
+
+def summarize_timings(timings: list[StageTiming]) -> list[dict]:
+    """Count, total, mean and max seconds and max peak bytes per stage."""
+    stages: dict[str, dict] = {}
+    for timing in timings:
+        summary = stages.setdefault(
+            timing.stage,
+            {"stage": timing.stage, "count": 0, "total_s": 0.0, "max_s": 0.0},
+        )
+        summary["count"] += 1
+        summary["total_s"] += timing.seconds
+        summary["max_s"] = max(summary["max_s"], timing.seconds)
+        summary["max_peak_bytes"] = max(
+            summary.get("max_peak_bytes", 0), timing.peak_bytes
+        )
+    for summary in stages.values():
+        summary["mean_s"] = summary["total_s"] / summary["count"]
+    return sorted(stages.values(), key=lambda summary: -summary["total_s"])
+
+
+def format_summary(summaries: list[dict]) -> str:
+    """Table of stage summaries, slowest stage first."""
+    lines = [
+        f"{'Stage':<20}{'Count':>7}{'Total s':>10}{'Mean ms':>10}"
+        f"{'Max ms':>10}{'Peak MB':>10}"
+    ]
+    for summary in summaries:
+        lines.append(
+            f"{summary['stage']:<20}{summary['count']:>7}"
+            f"{summary['total_s']:>10.2f}{summary['mean_s'] * 1e3:>10.1f}"
+            f"{summary['max_s'] * 1e3:>10.1f}"
+            f"{summary['max_peak_bytes'] / 2**20:>10.1f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,213 @@
+from __future__ import annotations
+import csv
+from dataclasses import dataclass, field
+from pathlib import Path
+import numpy as np
+
+# Summary metrics over many stored MTF curves. Curves are resampled onto one
+# frequency grid, after which every metric is an array operation over the
+# stacked (n_images, n_frequencies, n_edges) data.
+
+EDGES = ("left", "right", "top", "bottom")
+DETAIL_FIELDS = ("name", "manufacturer", "mode", "orientation")
+LEVELS = {"mtf50": 0.5, "mtf20": 0.2, "mtf10": 0.1}
+
+
+def frequency_grid(mtf_data: np.ndarray, step: float = 0.05) -> np.ndarray:
+    """Grid from zero to the highest frequency of any curve."""
+    f_max = np.nanmax(mtf_data[:, :, 0]) if mtf_data.size else 0.0
+    if np.isnan(f_max):
+        f_max = 0.0
+    return np.arange(0, f_max + step / 2, step)
+
+
+def resample_curves(mtf_data: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolate results arrays of shape (n_images, n_samples, 5) onto
+    grid. Returns shape (n_images, len(grid), 4), one column per edge, NaN
+    outside the frequency range of each curve.
+    """
+    n_images, n_samples = mtf_data.shape[:2]
+    f = mtf_data[:, :, 0]
+    finite = np.isfinite(f)
+    f_max = f[finite].max() if finite.any() else 0.0
+    # Offsetting each curve by a multiple of a span larger than any frequency
+    # lets one searchsorted call locate the grid in every curve. Missing
+    # frequencies are placed after the curve's samples.
+    span = 2 * (f_max + grid.max(initial=0) + 1)
+    offsets = np.arange(n_images)[:, None] * span
+    f_sorted = np.where(finite, f, span / 2)
+    position = np.searchsorted(
+        (f_sorted + offsets).ravel(), (grid[None, :] + offsets).ravel(), side="right"
+    ).reshape(n_images, len(grid))
+    position -= np.arange(n_images)[:, None] * n_samples
+    lower = np.clip(position - 1, 0, n_samples - 2)
+    f_lower = np.take_along_axis(f_sorted, lower, axis=1)
+    f_upper = np.take_along_axis(f_sorted, lower + 1, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        weight = (grid[None, :] - f_lower) / (f_upper - f_lower)
+    in_range = (
+        (position >= 1)
+        & (weight >= 0)
+        & (weight <= 1)
+        & np.take_along_axis(finite, lower + 1, axis=1)
+    )
+    values = mtf_data[:, :, 1:]
+    v_lower = np.take_along_axis(values, lower[:, :, None], axis=1)
+    v_upper = np.take_along_axis(values, lower[:, :, None] + 1, axis=1)
+    curves = v_lower + weight[:, :, None] * (v_upper - v_lower)
+    curves[~in_range] = np.nan
+    return curves
+
+
+def crossing_frequencies(
+    curves: np.ndarray, grid: np.ndarray, level: float
+) -> np.ndarray:
+    """
+    Frequency at which each curve first falls below level, interpolated
+    between grid points. curves has frequency as axis 1, any other axes are
+    kept. NaN where a curve never falls below level.
+    """
+    below = curves < level
+    first = np.argmax(below, axis=1)
+    found = below.any(axis=1) & (first > 0)
+    first = np.clip(first, 1, len(grid) - 1)
+    m_upper = np.take_along_axis(curves, first[:, None], axis=1)[:, 0]
+    m_lower = np.take_along_axis(curves, first[:, None] - 1, axis=1)[:, 0]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        fraction = (m_lower - level) / (m_lower - m_upper)
+    frequencies = grid[first - 1] + fraction * (grid[first] - grid[first - 1])
+    return np.where(found, frequencies, np.nan)
+
+
+def group_statistics(
+    values: np.ndarray, labels: list[tuple]
+) -> tuple[list[tuple], np.ndarray, np.ndarray, np.ndarray]:
+    """
+    NaN-aware mean and standard deviation of values (n_images, ...) within
+    each group of labels, as one matrix product per statistic. Returns the
+    group labels, the number of images in each group, and the means and
+    standard deviations with shape (n_groups, ...).
+    """
+    keys, first, inverse = np.unique(
+        [" | ".join(label) for label in labels], return_index=True, return_inverse=True
+    )
+    membership = np.zeros((len(keys), len(labels)))
+    membership[inverse, np.arange(len(labels))] = 1
+    flat = values.reshape(len(labels), -1)
+    present = ~np.isnan(flat)
+    filled = np.where(present, flat, 0.0)
+    counts = membership @ present
+    with np.errstate(invalid="ignore", divide="ignore"):
+        means = (membership @ filled) / counts
+        variances = (membership @ filled**2 - counts * means**2) / (counts - 1)
+    stds = np.sqrt(np.clip(variances, 0, None))
+    shape = (len(keys),) + values.shape[1:]
+    return (
+        [labels[index] for index in first],
+        membership.sum(axis=1).astype(int),
+        means.reshape(shape),
+        stds.reshape(shape),
+    )
+
+
+def nanmean_edges(curves: np.ndarray) -> np.ndarray:
+    """Mean over the last axis ignoring NaN, NaN where every value is."""
+    present = ~np.isnan(curves)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(present, curves, 0.0).sum(axis=-1) / present.sum(axis=-1)
+
+
+@dataclass
+class MTFSummary:
+    """
+    Metrics for every image and for every group of repeat exposures.
+    Per-image metrics have shape (n_images, 5): one value per edge and the
+    mean of the edges. Group metrics are the mean and standard deviation of
+    those across the images in each group.
+    """
+
+    details: list[tuple[str, str, str, str]]
+    grid: np.ndarray
+    curves: np.ndarray
+    edge_mean: np.ndarray
+    metrics: dict[str, np.ndarray]
+    group_by: tuple[str, ...]
+    groups: list[tuple] = field(default_factory=list)
+    group_means: dict[str, np.ndarray] = field(default_factory=dict)
+    group_stds: dict[str, np.ndarray] = field(default_factory=dict)
+    group_sizes: np.ndarray = None
+
+
+def summarize(
+    details: list[tuple[str, str, str, str]],
+    mtf_data: np.ndarray,
+    grid: np.ndarray = None,
+    group_by: tuple[str, ...] = ("manufacturer", "mode"),
+) -> MTFSummary:
+    """
+    Summarize (name, manufacturer, mode, orientation) details and results
+    arrays of shape (n_images, n_samples, 5), as from
+    Model.get_processed_array. Images sharing the group_by fields are treated
+    as repeat exposures.
+    """
+    if grid is None:
+        grid = frequency_grid(mtf_data)
+    curves = resample_curves(mtf_data, grid)
+    edge_mean = nanmean_edges(curves)
+    # Edges and their mean share a column axis, so each level is one pass.
+    with_mean = np.concatenate([curves, edge_mean[:, :, None]], axis=2)
+    metrics = {
+        name: crossing_frequencies(with_mean, grid, level)
+        for name, level in LEVELS.items()
+    }
+    summary = MTFSummary(details, grid, curves, edge_mean, metrics, group_by)
+    if not details:
+        return summary
+
+    field_index = [DETAIL_FIELDS.index(name) for name in group_by]
+    labels = [tuple(str(detail[i]) for i in field_index) for detail in details]
+    # Metrics and mean curves are grouped together in one pass.
+    stacked = np.concatenate([metrics[name] for name in LEVELS] + [edge_mean], axis=1)
+    groups, sizes, means, stds = group_statistics(stacked, labels)
+    widths = {name: len(EDGES) + 1 for name in LEVELS} | {"edge_mean": len(grid)}
+    bounds = np.cumsum([0] + list(widths.values()))
+    for name, start, stop in zip(widths, bounds[:-1], bounds[1:]):
+        summary.group_means[name] = means[:, start:stop]
+        summary.group_stds[name] = stds[:, start:stop]
+    summary.groups = groups
+    summary.group_sizes = sizes
+    return summary
+
+
+def write_summary_csv(summary: MTFSummary, out_path: str | Path) -> None:
+    """
+    Write the per-image metrics, then the group means and standard
+    deviations, as one CSV table. Group rows have "group" as their name.
+    """
+    columns = [f"{name}_{edge}" for name in LEVELS for edge in EDGES + ("edge_mean",)]
+    with open(out_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(DETAIL_FIELDS + ("statistic", "n") + tuple(columns))
+        for index, detail in enumerate(summary.details):
+            values = np.concatenate([summary.metrics[name][index] for name in LEVELS])
+            writer.writerow(tuple(detail) + ("value", 1) + _csv_values(values))
+        for index, group in enumerate(summary.groups):
+            fields = dict(zip(summary.group_by, group))
+            detail = ("group",) + tuple(
+                fields.get(name, "") for name in DETAIL_FIELDS[1:]
+            )
+            for statistic, table in (
+                ("mean", summary.group_means),
+                ("std", summary.group_stds),
+            ):
+                values = np.concatenate([table[name][index] for name in LEVELS])
+                writer.writerow(
+                    detail
+                    + (statistic, summary.group_sizes[index])
+                    + _csv_values(values)
+                )
+
+
+def _csv_values(values: np.ndarray) -> tuple:
+    return tuple("" if np.isnan(value) else round(float(value), 6) for value in values)
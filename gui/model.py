@@ -1,13 +1,39 @@
 import sqlite3
-from typing import Protocol
-from dataclasses import dataclass, field
+import struct
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Protocol, Iterable, Iterator
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 import numpy as np
 from PIL import Image
-import pydicom
-from mtf import preprocess_dcm
-from .sql_queries import CREATE_TABLE, INSERT_ROWS, DELETE_ALL, UPDATE_MTF_VALUES
+from .sql_queries import (
+    CREATE_TABLE,
+    INSERT_ROWS,
+    DELETE_ALL,
+    UPDATE_MTF_VALUES,
+    MARK_FAILED,
+    SELECT_PROCESSED_ARRAYS,
+    SELECT_UNPROCESSED,
+    SELECT_CPP_RESULTS,
+    UPDATE_DERIVED_RESULTS,
+    CREATE_TIMINGS_TABLE,
+    INSERT_TIMING,
+    SELECT_TIMINGS,
+    SELECT_TIMING_SUMMARY,
+    DELETE_TIMINGS_BY_NAME,
+    DELETE_ALL_TIMINGS,
+)
 from .errors import ExcelWriteError
+from .batch import BatchResult, WorkerPool, calculate_batch
+from .pipeline import ImagePipeline
+from .store import ResultsStore
+from .cache import ArrayCache, DEFAULT_BUDGET_BYTES
+from .preview import make_thumbnail
+from .ingest import HeaderInfo, iter_dicom_paths, scan_batches
+from .metrics import MTFSummary, summarize
+from .instrument import StageTiming, recording, stage
 
 
 @dataclass
@@ -17,12 +43,20 @@ class MTFEdge:
     manufacturer: str = None
     mode: str = None
     orientation: str = None
-    frequency: str = None
-    left: str = None
-    right: str = None
-    top: str = None
-    bottom: str = None
+    frequency: bytes = None
+    left: bytes = None
+    right: bytes = None
+    top: bytes = None
+    bottom: bytes = None
     processed: int = 0
+    sop_instance_uid: str = None
+    rows: int = None
+    columns: int = None
+    frames: int = None
+    transfer_syntax: str = None
+    pixel_spacing: float = None
+    magnification_factor: float = None
+    cpp_results: bytes = None
 
     @property
     def name(self) -> str:
@@ -41,12 +75,22 @@ class MTFEdge:
             self.top,
             self.bottom,
             self.processed,
+            self.sop_instance_uid,
+            self.rows,
+            self.columns,
+            self.frames,
+            self.transfer_syntax,
+            self.pixel_spacing,
+            self.magnification_factor,
+            self.cpp_results,
         )
 
 
 class MTFCalculator(Protocol):
     def calculate_mtf(self, dicom_path) -> tuple[np.ndarray, dict]: ...
 
+    def warm_up(self) -> None: ...
+
 
 class ExcelHandler(Protocol):
     selected_book: str
@@ -63,133 +107,382 @@ class ExcelHandler(Protocol):
         mtf_data: np.ndarray,
     ) -> None: ...
 
+    def write_batch(
+        self, rows: list[tuple[str, str, str, str, np.ndarray]]
+    ) -> list[tuple[str, str]]: ...
+
+    def reload_params(self) -> None: ...
+
+
+# Binary MTF column layout: schema version, dtype character, sample count,
+# then the raw little-endian samples.
+MTF_BLOB_VERSION = 1
+MTF_BLOB_HEADER = struct.Struct("<BcI")
+
+
+def mtfcol2blob(data_column: np.ndarray, dtype=np.float64) -> bytes:
+    """Convert numpy array to a typed binary blob."""
+    data_column = np.ascontiguousarray(
+        data_column, dtype=np.dtype(dtype).newbyteorder("<")
+    )
+    header = MTF_BLOB_HEADER.pack(
+        MTF_BLOB_VERSION, data_column.dtype.char.encode(), data_column.size
+    )
+    return header + data_column.tobytes()
+
+
+def _blob_header(data_blob: bytes) -> tuple[np.dtype, int]:
+    version, dtype_char, length = MTF_BLOB_HEADER.unpack_from(data_blob)
+    if version != MTF_BLOB_VERSION:
+        raise ValueError(f"Unsupported MTF blob version {version}")
+    return np.dtype(dtype_char.decode()).newbyteorder("<"), length
+
+
+def blob2mtfcol(data_blob: bytes) -> np.ndarray:
+    dtype, length = _blob_header(data_blob)
+    return np.frombuffer(
+        data_blob, dtype=dtype, count=length, offset=MTF_BLOB_HEADER.size
+    ).astype(float)
+
+
+def cpp2blob(cpp_results: np.ndarray) -> bytes:
+    """Results in cycles/pixel (n_samples x 5) as one blob."""
+    return mtfcol2blob(np.asarray(cpp_results).ravel())
+
 
-def mtfcol2str(data_column: np.array) -> str:
-    """Convert numpy array to comma separated string."""
-    return ",".join(data_column.astype(str))
+def blob2cpp(data_blob: bytes) -> np.ndarray:
+    return blob2mtfcol(data_blob).reshape(-1, 5)
 
 
-def str2mtfcol(data_str: str) -> np.array:
-    return np.array(data_str.split(","), dtype=float)
+def blobs2mtfarray(blob_rows: list[tuple[bytes, ...]]) -> np.ndarray:
+    """
+    Stack rows of (frequency, left, right, top, bottom) blobs into an array of
+    shape (n_rows, n_samples, 5). Rows sharing one dtype and length are decoded
+    from a single joined buffer.
+    """
+    if not blob_rows:
+        return np.empty((0, 0, 5))
+    headers = {_blob_header(blob) for row in blob_rows for blob in row}
+    if len(headers) == 1:
+        ((dtype, length),) = headers
+        payload = b"".join(
+            blob[MTF_BLOB_HEADER.size :] for row in blob_rows for blob in row
+        )
+        stacked = np.frombuffer(payload, dtype=dtype).reshape(len(blob_rows), 5, length)
+        return stacked.transpose(0, 2, 1).astype(float)
+    return np.stack(
+        [np.array([blob2mtfcol(blob) for blob in row]).T for row in blob_rows]
+    )
 
 
 class Model:
     def __init__(
-        self, mtf_calculator: MTFCalculator = None, excel_handler: ExcelHandler = None
+        self,
+        mtf_calculator: MTFCalculator = None,
+        excel_handler: ExcelHandler = None,
+        workers: int = 1,
+        results_store: ResultsStore = None,
+        cache_budget_bytes: int = DEFAULT_BUDGET_BYTES,
     ) -> None:
         self.connection = sqlite3.connect(":memory:")
         self.cursor = self.connection.cursor()
         self.cursor.execute(CREATE_TABLE)
+        self.cursor.execute(CREATE_TIMINGS_TABLE)
         self.excel = excel_handler
         self.mtf_calc = mtf_calculator
-        self.display_images = dict()
+        # Preprocessed images and thumbnails, least recently used spilled to
+        # disk beyond the budget. Thumbnails are keyed (fpath, "display").
+        # Everything per image is keyed by path, since files found in
+        # different series or directories often share a name.
+        self.image_cache = ArrayCache(cache_budget_bytes)
         self.display_image_details = dict()
-        self.preprocessed_images = {}  # Cache for preprocessed images
+        self.focus_planes: dict[str, int] = {}  # From calculated results
+        self.pipelines: dict[str, ImagePipeline] = {}  # Per-image stage cache
         self.display_image_size = (512, 512)
+        self.preview_executor = ThreadPoolExecutor(max_workers=2)
+        self.preview_futures: dict[str, Future] = {}  # Thumbnails being prefetched
+        self.workers = workers  # Worker processes used by calculate_all
+        self.worker_pool: WorkerPool = None  # Kept warm across batches
+        self.vectorized_batch_size = 16  # Images per vectorized calculation
+        self.ingest_batch_size = 200  # Files scanned per insert transaction
+        self.results_store = results_store  # Results cached across sessions
+
+    @property
+    def instrumented(self) -> bool:
+        """Whether stage timings are recorded, set on the calculator."""
+        return self.mtf_calc is not None and self.mtf_calc.instrumented
 
-    def add_edge_files(self, file_list: list[str]) -> None:
-        new_data_rows = [MTFEdge(fpath=fpath).astuple() for fpath in file_list]
+    @instrumented.setter
+    def instrumented(self, enabled: bool) -> None:
+        self.mtf_calc.instrumented = enabled
+
+    def add_edge_files(self, file_list: Iterable[str]) -> list[str]:
+        """
+        Add files, DICOMDIR indexes and directories to the database from their
+        headers alone, committing in batches as directories are walked.
+        Unsupported files and repeats of an image already added are skipped.
+        Returns the paths that were added.
+        """
+        added = []
+        for headers, rejected in self.scan_files(file_list):
+            added += self.insert_headers(headers, rejected)
+        return added
+
+    def scan_files(
+        self, file_list: Iterable[str]
+    ) -> Iterator[tuple[list[HeaderInfo], list[tuple[str, str]]]]:
+        """
+        Walk and scan the headers of dropped paths in batches. Does not touch
+        the database, so can be run on a worker thread.
+        """
+        manufacturers = self.mtf_calc.manufacturers if self.mtf_calc else []
+        return scan_batches(
+            iter_dicom_paths(file_list), manufacturers, self.ingest_batch_size
+        )
+
+    def insert_headers(
+        self, headers: list[HeaderInfo], rejected: list[tuple[str, str]]
+    ) -> list[str]:
+        """
+        Insert a batch of scanned headers in one transaction, skipping paths
+        already added. Returns the paths that were added.
+        """
+        fpaths = [header.fpath for header in headers]
+        known_paths = {
+            row[0]
+            for row in self.cursor.execute(
+                "select fpath from edges where fpath in "
+                f"({','.join('?' * len(fpaths))})",
+                fpaths,
+            )
+        }
+        # Files without a SOPInstanceUID have it stored as "", which says
+        # nothing about whether they are duplicates.
+        uids = [
+            header.sop_instance_uid for header in headers if header.sop_instance_uid
+        ]
+        known_uids = {
+            row[0]
+            for row in self.cursor.execute(
+                "select sop_instance_uid from edges where sop_instance_uid in "
+                f"({','.join('?' * len(uids))})",
+                uids,
+            )
+        }
+        rejected = list(rejected)
+        new_data_rows = []
+        for header in headers:
+            if header.fpath in known_paths:
+                rejected.append((header.fpath, "Already added."))
+                continue
+            known_paths.add(header.fpath)
+            if header.sop_instance_uid in known_uids:
+                rejected.append((header.fpath, "Duplicate SOPInstanceUID."))
+                continue
+            if header.sop_instance_uid:
+                known_uids.add(header.sop_instance_uid)
+            new_data_rows.append(
+                MTFEdge(
+                    fpath=header.fpath,
+                    manufacturer=header.manufacturer,
+                    mode=header.mode,
+                    sop_instance_uid=header.sop_instance_uid,
+                    rows=header.rows,
+                    columns=header.columns,
+                    frames=header.frames,
+                    transfer_syntax=header.transfer_syntax,
+                ).astuple()
+            )
+        for fpath, reason in rejected:
+            print(f"Skipped {fpath}: {reason}")
         self.cursor.executemany(INSERT_ROWS, new_data_rows)
         self.connection.commit()
+        added = [data_row[0] for data_row in new_data_rows]
+        if self.results_store is not None:
+            self.load_cached_results(added)
+        return added
+
+    def load_cached_results(self, file_list: list[str]) -> None:
+        """
+        Mark files already in the results store as processed. Their results
+        are derived again for the current magnification factors.
+        """
+        loaded = []
+        for fpath in file_list:
+            cached = self.results_store.lookup(fpath)
+            if cached is not None:
+                self.update_mtf_values(fpath, *cached)
+                loaded.append(fpath)
+        if loaded:
+            self.rederive_results(loaded)
+
+    def rederive_results(self, file_list: list[str] = None) -> int:
+        """
+        Derive the template results of processed files, all of them by
+        default, from their results in cycles/pixel and the calculator's
+        current parameters, in one batch. No image is read. Returns the
+        number of files updated.
+        """
+        query, args = SELECT_CPP_RESULTS, []
+        if file_list is not None:
+            query += f" AND fpath IN ({','.join('?' * len(file_list))})"
+            args = file_list
+        rows = self.cursor.execute(query, args).fetchall()
+        if not rows:
+            return 0
+        curves = [blob2cpp(row[4]) for row in rows]
+        cpp = np.full((len(curves), max(map(len, curves)), 5), np.nan)
+        for index, curve in enumerate(curves):
+            cpp[index, : len(curve)] = curve
+        magnifications = [
+            self.mtf_calc.magnification(manufacturer, mode)
+            for _, manufacturer, mode, _, _ in rows
+        ]
+        pixel_spacings = [row[3] for row in rows]
+        results = self.mtf_calc.results_from_cpp(cpp, pixel_spacings, magnifications)
+        self.cursor.executemany(
+            UPDATE_DERIVED_RESULTS,
+            [
+                (*(mtfcol2blob(column) for column in results_array.T), mag, row[0])
+                for row, results_array, mag in zip(rows, results, magnifications)
+            ],
+        )
+        self.connection.commit()
+        return len(rows)
+
+    def reload_params(self) -> int:
+        """
+        Read the template parameters again and derive every processed result
+        for them. Returns the number of results updated.
+        """
+        self.mtf_calc.reload_params()
+        if self.excel is not None:
+            self.excel.reload_params()
+        return self.rederive_results()
 
-    def get_edge_names(self) -> list[str]:
-        edge_names: list[str] = []
-        for data_row in self.cursor.execute("select fpath from edges"):
-            file_name = Path(data_row[0]).name
-            edge_names.append(file_name)
-        return edge_names
+    def get_edge_labels(self) -> list[tuple[str, str]]:
+        """
+        (fpath, label) of every edge, in insertion order. Labels are file
+        names, prefixed by the parent directory where files share a name.
+        """
+        fpaths = [row[0] for row in self.cursor.execute("select fpath from edges")]
+        name_counts = Counter(Path(fpath).name for fpath in fpaths)
+        labels = []
+        for fpath in fpaths:
+            path = Path(fpath)
+            if name_counts[path.name] > 1:
+                labels.append((fpath, f"{path.parent.name}/{path.name}"))
+            else:
+                labels.append((fpath, path.name))
+        return labels
 
-    def delete_edge(self, dcm_name: str) -> None:
+    def delete_edge(self, fpath: str) -> None:
         """
         Delete a single edge from the database.
         """
-        self.cursor.execute("delete from edges where name = ?", (dcm_name,))
+        self.cursor.execute("delete from edges where fpath = ?", (fpath,))
+        self.cursor.execute(DELETE_TIMINGS_BY_NAME, (fpath,))
         self.connection.commit()
         # Clear cached data for this image
-        if dcm_name in self.display_images:
-            del self.display_images[dcm_name]
-        if dcm_name in self.display_image_details:
-            del self.display_image_details[dcm_name]
-        if dcm_name in self.preprocessed_images:
-            del self.preprocessed_images[dcm_name]
+        self.image_cache.discard((fpath, "display"))
+        if fpath in self.display_image_details:
+            del self.display_image_details[fpath]
+        self.focus_planes.pop(fpath, None)
+        if fpath in self.pipelines:
+            self.image_cache.discard(self.pipelines.pop(fpath).cache_key)
+        if fpath in self.preview_futures:
+            self.preview_futures.pop(fpath).cancel()
 
     def delete_all(self) -> None:
         """
         Delete all edges from the database.
         """
         self.cursor.execute(DELETE_ALL)
+        self.cursor.execute(DELETE_ALL_TIMINGS)
         self.connection.commit()
         # Clear all cached data
-        self.display_images.clear()
+        self.image_cache.clear()
         self.display_image_details.clear()
-        self.preprocessed_images.clear()
+        self.focus_planes.clear()
+        self.pipelines.clear()
+        for future in self.preview_futures.values():
+            future.cancel()
+        self.preview_futures.clear()
+
+    def prefetch_previews(self, file_list: list[str]) -> None:
+        """Build thumbnails for newly added files in the background."""
+        for fpath in file_list:
+            cached = (fpath, "display") in self.image_cache
+            if cached or fpath in self.preview_futures:
+                continue
+            self.preview_futures[fpath] = self.preview_executor.submit(
+                make_thumbnail, fpath, self.display_image_size
+            )
 
-    def dicom_to_display_image(self, dcm_name: str) -> Image:
-        if dcm_name == "":
+    def dicom_to_display_image(self, fpath: str) -> Image:
+        if fpath == "":
             pixel_array = 256 * np.ones(self.display_image_size)
             im = Image.fromarray(pixel_array.astype(np.uint8))
+        elif (fpath, "display") in self.image_cache:
+            im = Image.fromarray(self.image_cache.get((fpath, "display")))
         else:
-            dcm_path = self.cursor.execute(
-                "select fpath from edges where name = ?", (dcm_name,)
-            ).fetchall()[0][0]
-            dcm_name = Path(dcm_path).name
-            if dcm_name in self.display_images.keys():
-                im = self.display_images[dcm_name]
+            # Wait for a prefetch in progress rather than decoding again
+            preview = self.preview_futures.pop(fpath, None)
+            if preview is not None and not preview.cancelled():
+                im, details = preview.result()
             else:
-                dcm = pydicom.dcmread(dcm_path)
-                mammo_image_preprocessed = preprocess_dcm(dcm)
-                # Cache the preprocessed image
-                self.preprocessed_images[dcm_name] = mammo_image_preprocessed
-                pixel_array = mammo_image_preprocessed.array
-                im = Image.fromarray(pixel_array.astype(np.uint8))
-                im.thumbnail(self.display_image_size)
-                self.display_images[dcm_name] = im
-                self.display_image_details[dcm_name] = {
-                    "acquisition": mammo_image_preprocessed.acquisition,
-                    "manufacturer": mammo_image_preprocessed.manufacturer,
-                    "pixel_spacing": mammo_image_preprocessed.pixel_spacing,
-                    "focus_plane": mammo_image_preprocessed.focus_plane,
-                }
+                im, details = make_thumbnail(fpath, self.display_image_size)
+            self.image_cache.put((fpath, "display"), np.asarray(im))
+            if fpath in self.focus_planes:
+                details["focus_plane"] = self.focus_planes[fpath]
+            self.display_image_details[fpath] = details
         return im
 
-    def calculate_mtf(self, dicom_path: str | Path) -> tuple[str, dict]:
+    def calculate_mtf(self, dicom_path: str | Path) -> tuple[bytes, dict]:
         """
         Calculate MTF for a single image.
-        Uses cached preprocessed image if available, otherwise processes the image.
-        Returns results in form of strings
-        """
-        dcm_name = Path(dicom_path).name
-        if dcm_name in self.preprocessed_images:
-            # Use cached preprocessed image
-            preprocessed_img = self.preprocessed_images[dcm_name]
-            results_array, metadata = self.mtf_calc.calculate_mtf_from_preprocessed(
-                preprocessed_img
-            )
-        else:
-            # Process image if not in cache
-            results_array, metadata = self.mtf_calc.calculate_mtf(dicom_path)
-            # Cache the preprocessed image for future use
-            dcm = pydicom.dcmread(dicom_path)
-            self.preprocessed_images[dcm_name] = preprocess_dcm(dcm)
-
-        frequency = mtfcol2str(results_array[:, 0])
-        left = mtfcol2str(results_array[:, 1])
-        right = mtfcol2str(results_array[:, 2])
-        top = mtfcol2str(results_array[:, 3])
-        bottom = mtfcol2str(results_array[:, 4])
+        Uses the image's pipeline, so stages already computed for display are
+        not repeated. Returns results in form of binary blobs
+        """
+        results_array, metadata = self._calculate_array(dicom_path)
+        frequency = mtfcol2blob(results_array[:, 0])
+        left = mtfcol2blob(results_array[:, 1])
+        right = mtfcol2blob(results_array[:, 2])
+        top = mtfcol2blob(results_array[:, 3])
+        bottom = mtfcol2blob(results_array[:, 4])
         return frequency, left, right, top, bottom, metadata
 
+    def get_pipeline(self, dicom_path: str | Path) -> ImagePipeline:
+        """
+        Return the pipeline for an image, creating it on first use so that each
+        file calculated in this process, with a single worker, is decoded once
+        per session. Worker processes decode each file they are sent.
+        """
+        fpath = str(dicom_path)
+        if fpath not in self.pipelines:
+            self.pipelines[fpath] = ImagePipeline(
+                fpath, self.mtf_calc, self.image_cache
+            )
+        return self.pipelines[fpath]
+
+    def _calculate_array(self, dicom_path: str | Path) -> tuple[np.ndarray, dict]:
+        pipeline = self.get_pipeline(dicom_path)
+        return self.mtf_calc.calculate_mtf_from_pipeline(pipeline)
+
     def update_mtf_values(
         self,
         fpath: str,
         manufacturer: str,
         mode: str,
         orientation: str,
-        frequency: str,
-        left: str,
-        right: str,
-        top: str,
-        bottom: str,
+        frequency: bytes,
+        left: bytes,
+        right: bytes,
+        top: bytes,
+        bottom: bytes,
+        pixel_spacing: float = None,
+        magnification_factor: float = None,
+        cpp_results: bytes = None,
     ) -> None:
         self.cursor.execute(
             UPDATE_MTF_VALUES,
@@ -202,42 +495,179 @@ class Model:
                 right,
                 top,
                 bottom,
+                pixel_spacing,
+                magnification_factor,
+                cpp_results,
                 fpath,
             ),
         )
         self.connection.commit()
 
     def get_unprocessed_paths(self) -> list[str]:
-        unprocessed_rows = self.cursor.execute(
-            "select fpath from edges where processed = 0"
-        )
+        unprocessed_rows = self.cursor.execute(SELECT_UNPROCESSED)
         unprocessed_paths = []
         for row in unprocessed_rows:
             unprocessed_paths.append(row[0])
         return unprocessed_paths
 
-    def calculate_all(self) -> None:
+    def mark_failed(self, fpath: str) -> None:
+        """Flag a file whose calculation failed so it is not retried."""
+        self.cursor.execute(MARK_FAILED, (fpath,))
+        self.connection.commit()
+
+    def save_result(self, result: BatchResult) -> None:
+        """Write a single calculation result into the edges table."""
+        if not result.ok:
+            print(f"Failed to calculate MTF for {result.fpath}:\n{result.error}")
+            self.mark_failed(result.fpath)
+            return
+        results_array, metadata = result.results_array, result.metadata
+        values = (
+            metadata["manufacturer"],
+            metadata["mode"],
+            metadata["orientation"],
+            mtfcol2blob(results_array[:, 0]),
+            mtfcol2blob(results_array[:, 1]),
+            mtfcol2blob(results_array[:, 2]),
+            mtfcol2blob(results_array[:, 3]),
+            mtfcol2blob(results_array[:, 4]),
+            metadata.get("pixel_spacing"),
+            metadata.get("magnification_factor"),
+            cpp2blob(metadata["cpp_results"]) if "cpp_results" in metadata else None,
+        )
+        self.update_mtf_values(result.fpath, *values)
+        if "focus_plane" in metadata:
+            self.focus_planes[result.fpath] = metadata["focus_plane"]
+            details = self.display_image_details.get(result.fpath)
+            if details is not None:
+                details["acquisition"] = metadata["mode"]
+                details["focus_plane"] = metadata["focus_plane"]
+        if self.results_store is not None:
+            self.results_store.save(result.fpath, *values)
+        if "timings" in metadata:
+            # Stored under the path, which unlike the name is unique.
+            self.save_timings(
+                [replace(timing, image=result.fpath) for timing in metadata["timings"]]
+            )
+
+    def save_timings(self, timings: list[StageTiming]) -> None:
+        self.cursor.executemany(
+            INSERT_TIMING,
+            [
+                (
+                    timing.image,
+                    timing.stage,
+                    timing.edge,
+                    timing.seconds,
+                    timing.peak_bytes,
+                )
+                for timing in timings
+            ],
+        )
+        self.connection.commit()
+
+    def get_timings(self) -> list[StageTiming]:
+        """Every stage timing recorded this session."""
+        return [StageTiming(*row) for row in self.cursor.execute(SELECT_TIMINGS)]
+
+    def get_timing_summary(self) -> list[dict]:
+        """Count, total, mean and max seconds and max peak bytes per stage."""
+        keys = ("stage", "count", "total_s", "mean_s", "max_s", "max_peak_bytes")
+        return [
+            dict(zip(keys, row))
+            for row in self.cursor.execute(SELECT_TIMING_SUMMARY).fetchall()
+        ]
+
+    def iter_results(
+        self, fpaths: list[str], workers: int = None
+    ) -> Iterator[BatchResult]:
+        """
+        Yield a BatchResult for each path as it finishes. A single worker runs
+        in this process and reuses the image pipelines, more than one
+        fans the paths out to a process pool, where each file is decoded again.
+        A vectorized calculator in this process calculates the edges of
+        vectorized_batch_size images at a time, unless timings are recorded,
+        which are per image.
+        """
+        workers = self.workers if workers is None else workers
+        if workers > 1:
+            pool = self.worker_pool
+            if pool is not None and pool.workers != workers:
+                pool = None
+            yield from calculate_batch(self.mtf_calc, fpaths, workers, pool)
+            return
+        if self.mtf_calc.vectorized and not self.instrumented:
+            for start in range(0, len(fpaths), self.vectorized_batch_size):
+                yield from self._iter_batched(
+                    fpaths[start : start + self.vectorized_batch_size]
+                )
+            return
+        yield from self._iter_each(fpaths)
+
+    def _iter_batched(self, fpaths: list[str]) -> Iterator[BatchResult]:
+        """
+        Results of the images in one vectorized calculation. Images failing
+        before their edges are calculated are yielded with their error first.
+        If the calculation itself fails, the images are calculated one by one
+        to find which failed.
+        """
+        pipelines = []
+        for fpath in fpaths:
+            pipeline = self.get_pipeline(fpath)
+            try:
+                # Stages run per image, so their errors are per image
+                pipeline.labelled_rois
+                pipeline.metadata
+            except Exception as e:
+                yield BatchResult(fpath, error=f"{type(e).__name__}: {e}")
+            else:
+                pipelines.append(pipeline)
+        try:
+            results = self.mtf_calc.calculate_mtf_from_pipelines(pipelines)
+        except Exception:
+            yield from self._iter_each([pipeline.fpath for pipeline in pipelines])
+            return
+        for pipeline, (results_array, metadata) in zip(pipelines, results):
+            yield BatchResult(pipeline.fpath, results_array, metadata)
+
+    def _iter_each(self, fpaths: list[str]) -> Iterator[BatchResult]:
+        for fpath in fpaths:
+            try:
+                results_array, metadata = self._calculate_array(fpath)
+            except Exception as e:
+                yield BatchResult(fpath, error=f"{type(e).__name__}: {e}")
+            else:
+                yield BatchResult(fpath, results_array, metadata)
+
+    def start_workers(self) -> None:
         """
-        Calculate MTF for all unprocessed image files
+        Start the worker processes and compile the calculation in each, while
+        the user is dropping files. A single worker warms up this process.
+        """
+        if self.workers > 1:
+            self.worker_pool = WorkerPool(self.mtf_calc, self.workers)
+            self.worker_pool.start()
+        else:
+            threading.Thread(target=self.mtf_calc.warm_up, daemon=True).start()
+
+    def shutdown_workers(self) -> None:
+        if self.worker_pool is not None:
+            self.worker_pool.shutdown()
+            self.worker_pool = None
+
+    def calculate_all(self, workers: int = None) -> list[BatchResult]:
+        """
+        Calculate MTF for all unprocessed image files. Results are written to
+        the database as each image finishes, failed images are flagged and
+        returned without stopping the rest of the batch.
         """
         unprocessed = self.get_unprocessed_paths()
-        for dcm_path in unprocessed:
-            frequency, left, right, top, bottom, metadata = self.calculate_mtf(dcm_path)
-            mode = metadata["mode"]
-            manufacturer = metadata["manufacturer"]
-            orientation = metadata["orientation"]
-            self.update_mtf_values(
-                dcm_path,
-                manufacturer,
-                mode,
-                orientation,
-                frequency,
-                left,
-                right,
-                top,
-                bottom,
-            )
-        pass
+        failed = []
+        for result in self.iter_results(unprocessed, workers):
+            self.save_result(result)
+            if not result.ok:
+                failed.append(result)
+        return failed
 
     def get_all_processed(self) -> list[MTFEdge]:
         """
@@ -249,25 +679,55 @@ class Model:
         processed_rows = [MTFEdge(*values) for values in processed_rows]
         return processed_rows
 
-    def write_all_processed(self) -> list[dict]:
+    def get_processed_array(
+        self,
+    ) -> tuple[list[tuple[str, str, str, str]], np.ndarray]:
+        """
+        Extract all processed entries from the database as one stacked array.
+        Returns a list of (name, manufacturer, mode, orientation) tuples and the
+        MTF data with shape (n_images, n_samples, 5).
+        """
+        processed_rows = self.cursor.execute(SELECT_PROCESSED_ARRAYS).fetchall()
+        row_details = [tuple(row[:4]) for row in processed_rows]
+        mtf_data = blobs2mtfarray([row[4:] for row in processed_rows])
+        return row_details, mtf_data
+
+    def summarize_processed(
+        self, group_by: tuple[str, ...] = ("manufacturer", "mode")
+    ) -> MTFSummary:
+        """
+        MTF50, MTF20 and MTF10 for every processed image, with means and
+        spreads over the images sharing the group_by fields.
+        """
+        return summarize(*self.get_processed_array(), group_by=group_by)
+
+    def write_all_processed(self) -> list[tuple[str, str]]:
         """
         Go through database, getting all processed edges and writing them all to
-        excel.
-        """
-        processed_rows = self.get_all_processed()
-
-        for row in processed_rows:
-            row.frequency = str2mtfcol(row.frequency)
-            row.left = str2mtfcol(row.left)
-            row.right = str2mtfcol(row.right)
-            row.top = str2mtfcol(row.top)
-            row.bottom = str2mtfcol(row.bottom)
-            mtf_data = np.array(
-                [row.frequency, row.left, row.right, row.top, row.bottom]
-            ).T
-            try:
-                self.excel.write_data(
-                    row.name, row.manufacturer, row.mode, row.orientation, mtf_data
-                )
-            except ExcelWriteError as e:
-                print(e)
+        excel in one batch. Returns (file name, reason) for rows not written.
+        """
+        if not self.instrumented:
+            return self._write_all_processed()
+        with recording("", self.mtf_calc.trace_memory) as timings:
+            with stage("write results"):
+                failures = self._write_all_processed()
+        self.save_timings(timings)
+        return failures
+
+    def _write_all_processed(self) -> list[tuple[str, str]]:
+        with stage("load results"):
+            row_details, mtf_data = self.get_processed_array()
+        rows = [
+            (name, manufacturer, mode, orientation, row_data)
+            for (name, manufacturer, mode, orientation), row_data in zip(
+                row_details, mtf_data
+            )
+        ]
+        try:
+            failures = self.excel.write_batch(rows)
+        except ExcelWriteError as e:
+            print(e)
+            return [(row[0], "Excel write failed.") for row in rows]
+        for file_name, reason in failures:
+            print(f"{file_name} not written: {reason}")
+        return failures
@@ -0,0 +1,154 @@
+from __future__ import annotations
+import copy
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING
+import numpy as np
+from .cache import ArrayCache
+from .frames import FrameReader
+from .instrument import stage
+from .roi import tracking_key
+from .utils import lazy_import
+
+if TYPE_CHECKING:
+    from pydicom.dataset import Dataset
+    from mtf.dcmutils import MammoMTFImage
+
+pydicom = lazy_import("pydicom")
+mtf = lazy_import("mtf")
+
+
+class ImagePipeline:
+    """
+    Staged processing of a single DICOM file. Each stage is computed on first
+    use and kept, so calculation and recalculation in one process share one
+    decode. Worker processes build pipelines of their own, and thumbnails are
+    read at reduced resolution without one. Given an ArrayCache, the
+    preprocessed array is held there instead, within the cache's memory
+    budget, and the decoded dataset is let go once it has been preprocessed.
+
+    header -> frames
+    header -> dataset -> pixels -> preprocessed -> rois/canny_maps
+        -> edge_mtfs -> mtf
+    """
+
+    def __init__(
+        self, fpath: str | Path, calculator=None, cache: ArrayCache = None
+    ) -> None:
+        self.fpath = str(fpath)
+        self.calculator = calculator
+        self.cache = cache
+
+    @classmethod
+    def from_dataset(cls, dataset: Dataset, name: str, calculator=None):
+        """
+        Pipeline for a dataset already in memory, such as one received over
+        the network. Stages start from the dataset, no file is read, so no
+        cache is used as the dataset could not be read again.
+        """
+        pipeline = cls(name, calculator)
+        pipeline.__dict__["dataset"] = dataset
+        return pipeline
+
+    @property
+    def name(self) -> str:
+        return Path(self.fpath).name
+
+    @cached_property
+    def header(self) -> Dataset:
+        """DICOM header only, reused from the full dataset if already read."""
+        if "dataset" in self.__dict__:
+            return self.dataset
+        with stage("read header"):
+            return pydicom.dcmread(self.fpath, stop_before_pixels=True)
+
+    @cached_property
+    def dataset(self) -> Dataset:
+        with stage("read file"):
+            return pydicom.dcmread(self.fpath)
+
+    @cached_property
+    def frames(self) -> FrameReader:
+        """Per-frame access that reads only the frames indexed."""
+        return FrameReader(self.fpath, self.header)
+
+    @cached_property
+    def pixels(self) -> np.ndarray:
+        """Decoded pixel data. pydicom keeps this on the dataset for reuse."""
+        dataset = self.dataset
+        with stage("decompress"):
+            return dataset.pixel_array
+
+    @property
+    def cache_key(self) -> tuple[str, str]:
+        """Key of the preprocessed array in the cache."""
+        return (self.fpath, "preprocessed")
+
+    @cached_property
+    def _preprocessed(self) -> MammoMTFImage:
+        """The preprocessed image, without its array when that is cached."""
+        self.pixels  # Decoded first, so decompression is timed on its own
+        with stage("preprocess"):
+            image = mtf.preprocess_dcm(self.dataset)
+        if self.cache is not None:
+            self.cache.put(self.cache_key, image.array)
+            image = copy.copy(image)
+            image.array = None
+            dataset = self.__dict__.pop("dataset")
+            del self.__dict__["pixels"]
+            if self.__dict__.get("header") is dataset:
+                del self.__dict__["header"]
+        return image
+
+    @property
+    def preprocessed(self) -> MammoMTFImage:
+        if self.cache is None:
+            return self._preprocessed
+        if self.cache_key not in self.cache:  # Discarded, preprocess again
+            self.__dict__.pop("_preprocessed", None)
+        image = copy.copy(self._preprocessed)
+        image.array = self.cache.get(self.cache_key)
+        return image
+
+    @cached_property
+    def labelled_rois(self) -> tuple[dict, dict]:
+        preprocessed = self.preprocessed
+        with stage("roi labelling"):
+            calculator = self.calculator
+            if calculator is None:
+                return mtf.get_labelled_rois(preprocessed.array)
+            key = None
+            if calculator.roi_tracker is not None:
+                key = tracking_key(self.header, self._preprocessed)
+            return calculator.label_rois(preprocessed.array, key)
+
+    @property
+    def rois(self) -> dict[str, np.ndarray]:
+        return self.labelled_rois[0]
+
+    @property
+    def canny_maps(self) -> dict[str, np.ndarray]:
+        return self.labelled_rois[1]
+
+    @cached_property
+    def metadata(self) -> dict:
+        # Header fields only, so a cached array is not loaded for them
+        metadata, _ = self.calculator._get_metadata_from_preprocessed(
+            self._preprocessed
+        )
+        return metadata
+
+    @cached_property
+    def edge_mtfs(self) -> dict:
+        """Per-edge MTF containers, holding the ESF, LSF and MTF of each ROI."""
+        return self.calculator.calculate_edge_mtfs(
+            self.rois, self.canny_maps, self.metadata["sample_spacing"]
+        )
+
+    @cached_property
+    def mtf(self) -> tuple[np.ndarray, dict]:
+        """
+        MTF results array (sample_number x 5) and metadata, including the
+        results in cycles/pixel.
+        """
+        return self.calculator.results_from_edges(self.edge_mtfs, self.metadata)
@@ -1,14 +1,19 @@
 from __future__ import annotations
 import re
-from typing import Protocol
+from typing import Protocol, Callable
 from .model import Model
-from .errors import ExcelNotFoundError, ActiveCellError
+from .batch import BackgroundCalculation
+from .ingest import BackgroundIngest
+from .excel import WorkbookWatcher
+from .errors import ActiveCellError
+from .profiling import startup_profile
+from .instrument import format_summary
 
 
 class View(Protocol):
     def init_ui(self, presenter: Presenter) -> None: ...
 
-    def update_image_list(self, image_list: list[str]) -> None: ...
+    def update_image_list(self, image_list: list[tuple[str, str]]) -> None: ...
 
     def init_workbook_list(self, active: str, options: list[str]) -> None: ...
 
@@ -33,13 +38,23 @@ class View(Protocol):
 
     def set_active_cell_text(self, value: str) -> None: ...
 
+    def on_calculation_start(self, total: int) -> None: ...
+
+    def update_progress(
+        self, completed: int, total: int, throughput: float, eta: float | None
+    ) -> None: ...
+
+    def on_calculation_end(self, cancelled: bool) -> None: ...
+
+    def show_timings(self, summary: str) -> None: ...
+
     def mainloop(self) -> None: ...
 
 
 def split_event_string(event_string: str) -> list[str]:
     """
-    Converts event string containing the paths of files dropped into the frame
-    to a list of file paths.
+    Converts event string containing the paths of files and directories dropped
+    into the frame to a list of paths.
     """
     # Paths with spaces are bounded by { }
     bounded = re.compile(r"\{[^}^{]*\}")
@@ -56,6 +71,12 @@ class Presenter:
     def __init__(self, model: Model, view: View) -> None:
         self.model = model
         self.view = view
+        self.calculation: BackgroundCalculation = None
+        self.workbook_watcher: WorkbookWatcher = None
+        self.progress_interval = 100  # ms between checks on a running batch
+        # ms between checks for a change found by the workbook watcher, which
+        # lists the open workbooks at most once a second.
+        self.workbook_interval = 500
 
     def run(self, version_file=None) -> None:
         self.view.init_ui(self)
@@ -64,31 +85,48 @@ class Presenter:
         self.view.mainloop()
 
     def update_image_list(self) -> None:
-        image_names = self.model.get_edge_names()
-        self.view.update_image_list(image_names)
+        self.view.update_image_list(self.model.get_edge_labels())
 
     def init_workbook_list(self) -> None:
-        selected = self.model.excel.selected_book
-        try:
-            book_names = self.model.excel.book_names
-        except ExcelNotFoundError:
-            book_names = []
-        self.view.init_workbook_list(selected, book_names)
-        self.view.after(2000, self.update_workbook_list)
+        # Excel is queried once the window is up, since importing xlwings and
+        # talking to Excel is slow.
+        self.view.init_workbook_list("-", [])
+        self.view.after(200, self.select_active_workbook)
+
+    def select_active_workbook(self) -> None:
+        self.view.set_workbook_selection(self.model.excel.selected_book)
+        # Open workbooks are listed on a background thread, the view is only
+        # updated when they change.
+        self.workbook_watcher = WorkbookWatcher(lambda: self.model.excel.book_names)
+        self.workbook_watcher.start()
+        self.update_workbook_list()
 
     def update_workbook_list(self) -> None:
-        try:
-            book_names = self.model.excel.book_names
-            self.view.update_workbook_list(book_names)
-        except ExcelNotFoundError:
+        changed, book_names = self.workbook_watcher.get_change()
+        if changed and book_names is None:
             self.view.update_workbook_list([])
             self.view.set_workbook_selection("-")
-        self.view.after(2000, self.update_workbook_list)
+        elif changed:
+            self.view.update_workbook_list(book_names)
+        self.view.after(self.workbook_interval, self.update_workbook_list)
 
     def handle_files_dropped(self, event=None) -> None:
         dropped_list = split_event_string(event.data)
-        self.model.add_edge_files(dropped_list)
-        self.update_image_list()
+        # Directories are walked on a worker thread, the image list fills in
+        # as each batch of headers is scanned.
+        ingest = BackgroundIngest(self.model.scan_files(dropped_list))
+        ingest.start()
+        self.poll_ingest(ingest)
+
+    def poll_ingest(self, ingest: BackgroundIngest) -> None:
+        batches = ingest.drain()
+        for headers, rejected in batches:
+            added = self.model.insert_headers(headers, rejected)
+            self.model.prefetch_previews(added)
+        if batches:
+            self.update_image_list()
+        if not ingest.done:
+            self.view.after(self.progress_interval, self.poll_ingest, ingest)
 
     def handle_delete(self, event=None) -> None:
         self.model.delete_edge(self.view.selected_image)
@@ -100,16 +138,78 @@ class Presenter:
 
     def handle_workbook_selected(self, *args) -> None:
         self.model.excel.selected_book = self.view.selected_workbook
-
-    def handle_calculate(self) -> None:
-        self.model.calculate_all()
+        if self.workbook_watcher is not None:
+            self.workbook_watcher.wake()
+
+    def handle_calculate(self, on_complete: Callable[[], None] = None) -> None:
+        """
+        Calculate all unprocessed images on a worker thread. Results are saved
+        from the Tk thread as they arrive, then on_complete is called if the
+        batch was not cancelled.
+        """
+        if self.calculation is not None:
+            return
+        unprocessed = self.model.get_unprocessed_paths()
+        if not unprocessed:
+            if on_complete is not None:
+                on_complete()
+            return
+        self.calculation = BackgroundCalculation(
+            self.model.iter_results(unprocessed), len(unprocessed)
+        )
+        self.calculation.start()
+        self.view.on_calculation_start(len(unprocessed))
+        self.view.after(self.progress_interval, self.poll_calculation, on_complete)
+
+    def poll_calculation(self, on_complete: Callable[[], None] = None) -> None:
+        calculation = self.calculation
+        for result in calculation.drain():
+            self.model.save_result(result)
+            startup_profile.mark("first result")
+        self.view.update_progress(
+            calculation.completed,
+            calculation.total,
+            calculation.throughput,
+            calculation.eta,
+        )
+        if not calculation.done:
+            self.view.after(self.progress_interval, self.poll_calculation, on_complete)
+            return
+        self.calculation = None
+        self.view.on_calculation_end(calculation.cancelled)
+        if on_complete is not None and not calculation.cancelled:
+            on_complete()
+
+    def handle_cancel(self) -> None:
+        if self.calculation is not None:
+            self.calculation.cancel()
 
     def handle_write(self) -> None:
         self.model.write_all_processed()
 
     def handle_calculate_write(self) -> None:
-        self.handle_calculate()
-        self.handle_write()
+        self.handle_calculate(on_complete=self.handle_write)
+
+    def handle_show_timings(self) -> None:
+        if not self.model.instrumented:
+            summary = "Stage timings are not recorded.\nStart with --instrument."
+        elif not (timings := self.model.get_timing_summary()):
+            summary = "No stage timings recorded yet."
+        else:
+            summary = format_summary(timings)
+        self.view.show_timings(summary)
+
+    def handle_reload_params(self) -> None:
+        """
+        Apply edits to the template parameters, such as the magnification
+        factors, to every result calculated so far, without recalculating.
+        """
+        try:
+            updated = self.model.reload_params()
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Could not reload template parameters: {e}")
+            return
+        print(f"Template parameters reloaded, {updated} results updated.")
 
     def handle_write_mode(self) -> None:
         write_mode = self.view.selected_write_mode
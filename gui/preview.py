@@ -0,0 +1,74 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import TYPE_CHECKING
+import numpy as np
+from PIL import Image
+from .frames import FrameReader
+from .ingest import header_mode
+from .utils import lazy_import
+
+if TYPE_CHECKING:
+    from pydicom.dataset import Dataset
+
+pydicom = lazy_import("pydicom")
+
+
+def _stride(header: Dataset, size: tuple[int, int]) -> int:
+    """Sampling step giving at least the requested thumbnail size."""
+    return max(1, min(header.Rows // size[0], header.Columns // size[1]))
+
+
+def _frame_index(header: Dataset) -> int:
+    """Preview the middle frame of multi-frame images such as tomo volumes."""
+    return int(header.get("NumberOfFrames", 1) or 1) // 2
+
+
+def _read_frame(fpath: str, header: Dataset, stride: int) -> np.ndarray:
+    """
+    Read every stride-th row and column of the previewed frame. Uncompressed
+    frames are memory-mapped, so only the pages holding sampled rows are read
+    from disk. Other transfer syntaxes decode the single frame in full.
+    """
+    frame = FrameReader(fpath, header)[_frame_index(header)]
+    return np.array(frame[::stride, ::stride])
+
+
+def read_preview_pixels(
+    fpath: str | Path, header: Dataset, size: tuple[int, int]
+) -> np.ndarray:
+    """
+    Read a reduced resolution copy of the pixel data, at least size in each
+    dimension where the image allows. Uncompressed data is strided through a
+    memory map, compressed transfer syntaxes decode a single frame in full.
+    """
+    return _read_frame(str(fpath), header, _stride(header, size))
+
+
+def preview_details(header: Dataset) -> dict:
+    """
+    Image details for display, from the header alone. The focus plane is only
+    known once the image has been preprocessed, so is left for the caller.
+    """
+    manufacturer = str(header.get("Manufacturer", "")).lower()
+    pixel_spacing = header.get("ImagerPixelSpacing", header.get("PixelSpacing"))
+    return {
+        "acquisition": header_mode(header, manufacturer),
+        "manufacturer": manufacturer,
+        "pixel_spacing": float(pixel_spacing[0]) if pixel_spacing else "",
+        "focus_plane": "",
+    }
+
+
+def make_thumbnail(
+    fpath: str | Path, size: tuple[int, int]
+) -> tuple[Image.Image, dict]:
+    """Build a display thumbnail and its details without a full decode."""
+    header = pydicom.dcmread(fpath, stop_before_pixels=True)
+    pixels = read_preview_pixels(fpath, header, size).astype(float)
+    low, high = np.percentile(pixels, (1, 99))
+    scaled = np.clip((pixels - low) / max(high - low, 1e-6), 0, 1) * 255
+    if header.get("PhotometricInterpretation") == "MONOCHROME1":
+        scaled = 255 - scaled
+    im = Image.fromarray(scaled.astype(np.uint8))
+    im.thumbnail(size)
+    return im, preview_details(header)
@@ -0,0 +1,46 @@
+import time
+from contextlib import contextmanager
+
+
+class StartupProfiler:
+    """
+    Records how long startup takes, broken down by milestone, module import and
+    numba compilation. Recording is always on since it is only a handful of
+    timestamps, the report is printed when main.py is run with
+    --profile-startup.
+    """
+
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.enabled = False
+        self.milestones: dict[str, float] = {}
+        self.events: list[tuple[str, str, float]] = []
+
+    def mark(self, label: str) -> None:
+        """Record the first time a milestone is reached."""
+        self.milestones.setdefault(label, time.perf_counter() - self.start)
+
+    def record(self, category: str, label: str, seconds: float) -> None:
+        self.events.append((category, label, seconds))
+
+    @contextmanager
+    def timed(self, category: str, label: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(category, label, time.perf_counter() - start)
+
+    def report(self) -> str:
+        lines = ["Startup profile (seconds)", "Milestones since launch:"]
+        for label, seconds in self.milestones.items():
+            lines.append(f"  {label:<40}{seconds:8.3f}")
+        for category in dict.fromkeys(event[0] for event in self.events):
+            lines.append(f"{category.capitalize()}:")
+            for event_category, label, seconds in self.events:
+                if event_category == category:
+                    lines.append(f"  {label:<40}{seconds:8.3f}")
+        return "\n".join(lines)
+
+
+startup_profile = StartupProfiler()
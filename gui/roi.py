@@ -0,0 +1,293 @@
+from __future__ import annotations
+import warnings
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Hashable, Iterable
+import numpy as np
+from .instrument import stage
+from .utils import lazy_import
+
+if TYPE_CHECKING:
+    from pydicom.dataset import Dataset
+    from mtf.dcmutils import MammoMTFImage
+
+mtf = lazy_import("mtf")
+
+# mtf.get_labelled_rois searches the whole image at full resolution. Two ways
+# of narrowing the search to a window around the edge object live here:
+# coarse to fine search of a downsampled image, and reuse of the ROI
+# positions found in earlier exposures from the same unit, mode and paddle.
+
+
+@dataclass(frozen=True)
+class Box:
+    """Half-open pixel bounds of a region of an image."""
+
+    top: int
+    left: int
+    bottom: int
+    right: int
+
+    @property
+    def slices(self) -> tuple[slice, slice]:
+        return slice(self.top, self.bottom), slice(self.left, self.right)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.bottom - self.top, self.right - self.left
+
+    def grow(self, fraction: float, shape: tuple[int, int]) -> Box:
+        """Grown on every side by a fraction of its size, clipped to shape."""
+        rows, cols = self.shape
+        return Box(
+            max(self.top - int(fraction * rows), 0),
+            max(self.left - int(fraction * cols), 0),
+            min(self.bottom + int(fraction * rows), shape[0]),
+            min(self.right + int(fraction * cols), shape[1]),
+        )
+
+    def scale(self, factor: int) -> Box:
+        return Box(
+            self.top * factor,
+            self.left * factor,
+            self.bottom * factor,
+            self.right * factor,
+        )
+
+    @property
+    def centre(self) -> tuple[float, float]:
+        return (self.top + self.bottom) / 2, (self.left + self.right) / 2
+
+    def contains(self, row: float, col: float) -> bool:
+        return self.top <= row <= self.bottom and self.left <= col <= self.right
+
+    def offset(self, other: Box) -> int:
+        """Largest distance between the corresponding sides of two boxes."""
+        return max(
+            abs(self.top - other.top),
+            abs(self.left - other.left),
+            abs(self.bottom - other.bottom),
+            abs(self.right - other.right),
+        )
+
+    @staticmethod
+    def union(boxes: Iterable[Box]) -> Box:
+        boxes = list(boxes)
+        return Box(
+            min(box.top for box in boxes),
+            min(box.left for box in boxes),
+            max(box.bottom for box in boxes),
+            max(box.right for box in boxes),
+        )
+
+
+def roi_box(image: np.ndarray, roi: np.ndarray) -> Box | None:
+    """
+    Where an ROI taken from the image lies within it. A slice of the image is
+    found from the offset of its memory, a copy by matching its pixels. None
+    if the ROI is not a plain slice of the image or a copy of one.
+    """
+    if roi.ndim != 2 or image.ndim != 2:
+        return None
+    if (
+        roi.strides != image.strides
+        or not image.flags.c_contiguous
+        or not np.may_share_memory(image, roi)
+    ):
+        return _match_box(image, roi)
+    offset = roi.__array_interface__["data"][0] - image.__array_interface__["data"][0]
+    row, remainder = divmod(offset, image.strides[0])
+    col = remainder // image.strides[1]
+    box = Box(row, col, row + roi.shape[0], col + roi.shape[1])
+    if box.top < 0 or box.bottom > image.shape[0] or box.right > image.shape[1]:
+        return None
+    return box
+
+
+def _match_box(image: np.ndarray, roi: np.ndarray) -> Box | None:
+    """
+    Where a copy of part of the image lies, if it lies in one place only.
+    Candidate positions are narrowed one ROI pixel at a time, then checked.
+    """
+    rows, cols = roi.shape
+    if roi.size == 0 or rows > image.shape[0] or cols > image.shape[1]:
+        return None
+    corners = image[: image.shape[0] - rows + 1, : image.shape[1] - cols + 1]
+    top, left = np.nonzero(corners == roi[0, 0])
+    for (row, col), value in np.ndenumerate(roi):
+        if len(top) <= 1:
+            break
+        keep = image[top + row, left + col] == value
+        top, left = top[keep], left[keep]
+    if len(top) != 1:
+        return None
+    box = Box(int(top[0]), int(left[0]), int(top[0]) + rows, int(left[0]) + cols)
+    return box if np.array_equal(image[box.slices], roi) else None
+
+
+def roi_boxes(image: np.ndarray, rois: dict[str, np.ndarray]) -> dict[str, Box]:
+    """
+    Boxes of every ROI, or an empty dict if any cannot be located. Warns
+    then, as ROI searches cannot be narrowed without them.
+    """
+    boxes = {}
+    for edge, roi in rois.items():
+        box = roi_box(image, roi)
+        if box is None:
+            warnings.warn(
+                f"The {edge} ROI could not be located in the image, so the ROI "
+                "search is not narrowed.",
+                RuntimeWarning,
+            )
+            return {}
+        boxes[edge] = box
+    return boxes
+
+
+def tracking_key(header: Dataset, preprocessed: MammoMTFImage) -> Hashable | None:
+    """Unit, mode, orientation and image size, None without a serial number."""
+    serial = header.get("DeviceSerialNumber")
+    if not serial:
+        return None
+    return (
+        str(serial),
+        preprocessed.acquisition,
+        preprocessed.orientation,
+        header.get("Rows"),
+        header.get("Columns"),
+    )
+
+
+def downsample(array: np.ndarray, factor: int) -> np.ndarray:
+    """Mean of each factor x factor block, dropping partial blocks at the edges."""
+    rows, cols = array.shape[0] // factor, array.shape[1] // factor
+    blocks = array[: rows * factor, : cols * factor].reshape(rows, factor, cols, factor)
+    return blocks.mean(axis=(1, 3))
+
+
+def label_window(
+    array: np.ndarray, window: Box
+) -> tuple[dict, dict, dict[str, Box]] | None:
+    """
+    Label the ROIs within a window of the image at full resolution. Returns
+    the ROIs, canny maps and ROI boxes in image coordinates, or None if
+    labelling fails or the ROIs cannot be located.
+    """
+    try:
+        rois, canny = mtf.get_labelled_rois(array[window.slices])
+    except Exception:
+        return None
+    boxes = roi_boxes(array, rois)
+    if not boxes:
+        return None
+    return rois, canny, boxes
+
+
+def pyramid_label(array: np.ndarray, factor: int, margin: float = 0.5) -> tuple | None:
+    """
+    Coarse to fine labelling. ROIs are found in the image downsampled by
+    factor, then labelled again at full resolution within their union, grown
+    on each side by margin times its size. The fine ROIs must be the coarse
+    edges, each centred within its coarse ROI scaled back up. Returns None
+    otherwise.
+    """
+    with stage("coarse roi search"):
+        coarse = downsample(array, factor)
+        try:
+            coarse_rois, _ = mtf.get_labelled_rois(coarse)
+        except Exception:
+            return None
+        coarse_boxes = roi_boxes(coarse, coarse_rois)
+    if not coarse_boxes:
+        return None
+    scaled = {edge: box.scale(factor) for edge, box in coarse_boxes.items()}
+    window = Box.union(scaled.values()).grow(margin, array.shape)
+    labelled = label_window(array, window)
+    if labelled is None:
+        return None
+    rois, canny, boxes = labelled
+    if boxes.keys() != scaled.keys():
+        return None
+    if not all(scaled[edge].contains(*boxes[edge].centre) for edge in boxes):
+        return None
+    return rois, canny
+
+
+def search_rois(array: np.ndarray, pyramid_factor: int = 1) -> tuple[dict, dict]:
+    """
+    ROIs and canny maps of the edge object, searched for over the whole image.
+    With pyramid_factor above 1 the search is coarse to fine, falling back to
+    the full resolution search if that fails.
+    """
+    if pyramid_factor > 1:
+        labelled = pyramid_label(array, pyramid_factor)
+        if labelled is not None:
+            return labelled
+    return mtf.get_labelled_rois(array)
+
+
+# Trackers are pickled into every task sent to a worker process. Each worker
+# unpickles them to its own long-lived tracker, so it keeps learning from the
+# images it is sent rather than starting afresh with every one.
+_process_trackers: dict[tuple[float, int], ROITracker] = {}
+
+
+def _process_tracker(
+    margin: float, tolerance: int, boxes: dict[Hashable, dict[str, Box]]
+) -> ROITracker:
+    tracker = _process_trackers.setdefault(
+        (margin, tolerance), ROITracker(margin, tolerance)
+    )
+    for key, edge_boxes in boxes.items():
+        tracker.boxes.setdefault(key, edge_boxes)
+    return tracker
+
+
+class ROITracker:
+    """
+    Remembers where ROIs were last found for each tracking key. An image
+    with a known key is labelled within the union of those ROIs, grown on
+    each side by margin times its size, leaving background around the edge
+    object for its segmentation. The result is accepted if the same edges
+    are found with no side of any ROI moved by more than tolerance pixels,
+    and becomes the new reference. Otherwise, or for a new key, the caller
+    searches the whole image and remembers what it found.
+    """
+
+    def __init__(self, margin: float = 0.5, tolerance: int = 32) -> None:
+        self.margin = margin
+        self.tolerance = tolerance
+        self.boxes: dict[Hashable, dict[str, Box]] = {}
+        self.tracked = 0  # Images labelled within a window
+        self.searched = 0  # Images labelled over the whole field
+
+    def __reduce__(self):
+        return _process_tracker, (self.margin, self.tolerance, self.boxes)
+
+    def find(self, array: np.ndarray, key: Hashable) -> tuple[dict, dict] | None:
+        """ROIs and canny maps found near the last ROIs for key, or None."""
+        reference = self.boxes.get(key)
+        if reference is None:
+            return None
+        window = Box.union(reference.values()).grow(self.margin, array.shape)
+        labelled = label_window(array, window)
+        if labelled is None:
+            return None
+        rois, canny, boxes = labelled
+        if boxes.keys() != reference.keys():
+            return None
+        if any(boxes[edge].offset(reference[edge]) > self.tolerance for edge in boxes):
+            return None
+        self.boxes[key] = boxes
+        self.tracked += 1
+        return rois, canny
+
+    def remember(self, array: np.ndarray, key: Hashable, rois: dict) -> None:
+        """Keep the ROIs found by a whole image search as the reference for key."""
+        self.searched += 1
+        if key is None:
+            return
+        boxes = roi_boxes(array, rois)
+        if boxes:
+            self.boxes[key] = boxes
+        else:
+            self.boxes.pop(key, None)
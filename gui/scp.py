@@ -0,0 +1,190 @@
+from __future__ import annotations
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from pathlib import Path
+from typing import TYPE_CHECKING, Iterable
+from .batch import BatchResult
+from .pipeline import ImagePipeline
+
+if TYPE_CHECKING:
+    from pydicom.dataset import Dataset
+
+# Storage SCP that calculates MTF for images as they are received, without
+# writing them to disk. Requires pynetdicom: pip install .[scp]
+
+STATUS_SUCCESS = 0x0000
+STATUS_OUT_OF_RESOURCES = 0xA700  # Queue full, the sender should retry later
+STATUS_CANNOT_UNDERSTAND = 0xC000
+
+
+def _calculate_dataset(calculator, dataset: Dataset, name: str):
+    """Runs in a worker process, so must be importable at module level."""
+    return calculator.calculate_mtf_from_pipeline(
+        ImagePipeline.from_dataset(dataset, name, calculator)
+    )
+
+
+def dataset_name(dataset: Dataset) -> str:
+    """Name for a received image, standing in for its file name."""
+    return f"{dataset.get('SOPInstanceUID', 'unknown')}.dcm"
+
+
+class StorageSCP:
+    """
+    DICOM C-STORE receiver. Each association is served on its own thread by
+    pynetdicom. Received datasets are queued, up to queue_size, and handed to
+    a pool of worker processes. When the queue is full further C-STOREs are
+    refused with status 0xA700 (out of resources), which senders retry later.
+    Results are collected with drain() from the caller's thread.
+    """
+
+    def __init__(
+        self,
+        calculator,
+        ae_title: str = "DRMAM",
+        address: str = "127.0.0.1",
+        port: int = 11112,
+        workers: int = 2,
+        queue_size: int = 16,
+        max_associations: int = 8,
+    ) -> None:
+        self.calculator = calculator
+        self.ae_title = ae_title
+        self.address = address
+        self.port = port
+        self.workers = workers
+        self.max_associations = max_associations
+        self.pending: queue.Queue[tuple[Dataset, str] | None] = queue.Queue(
+            maxsize=queue_size
+        )
+        self.results: queue.Queue[BatchResult] = queue.Queue()
+        # Held while a dataset is being calculated, so the pending queue only
+        # drains as fast as the workers finish.
+        self.slots = threading.Semaphore(workers)
+        self.executor: ProcessPoolExecutor = None
+        self.server = None
+        self.dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self.received = 0
+        self.refused = 0
+
+    def _handle_store(self, event) -> int:
+        try:
+            dataset = event.dataset
+            dataset.file_meta = event.file_meta
+        except Exception as e:
+            print(f"Could not decode received dataset: {e}")
+            return STATUS_CANNOT_UNDERSTAND
+        try:
+            self.pending.put_nowait((dataset, dataset_name(dataset)))
+        except queue.Full:
+            self.refused += 1
+            return STATUS_OUT_OF_RESOURCES
+        self.received += 1
+        return STATUS_SUCCESS
+
+    def _dispatch(self) -> None:
+        while True:
+            self.slots.acquire()
+            item = self.pending.get()
+            if item is None:
+                return
+            dataset, name = item
+            future = self.executor.submit(
+                _calculate_dataset, self.calculator, dataset, name
+            )
+            future.add_done_callback(
+                lambda future, name=name: self._on_done(future, name)
+            )
+
+    def _on_done(self, future: Future, name: str) -> None:
+        try:
+            results_array, metadata = future.result()
+        except Exception as e:
+            result = BatchResult(name, error=f"{type(e).__name__}: {e}")
+        else:
+            result = BatchResult(name, results_array, metadata)
+        self.results.put(result)
+        self.slots.release()
+
+    def start(self) -> None:
+        """Start listening, returning straight away."""
+        from pynetdicom import AE, ALL_TRANSFER_SYNTAXES, evt
+        from pynetdicom import AllStoragePresentationContexts
+        from pynetdicom.sop_class import Verification
+
+        ae = AE(ae_title=self.ae_title)
+        ae.maximum_associations = self.max_associations
+        for context in AllStoragePresentationContexts:
+            ae.add_supported_context(context.abstract_syntax, ALL_TRANSFER_SYNTAXES)
+        ae.add_supported_context(Verification)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.dispatcher.start()
+        self.server = ae.start_server(
+            (self.address, self.port),
+            block=False,
+            evt_handlers=[(evt.EVT_C_STORE, self._handle_store)],
+        )
+
+    def drain(self) -> list[BatchResult]:
+        """Return the results finished since the last call."""
+        drained = []
+        while True:
+            try:
+                drained.append(self.results.get_nowait())
+            except queue.Empty:
+                return drained
+
+    def stop(self) -> None:
+        """Stop accepting associations and cancel calculations not started."""
+        if self.server is not None:
+            self.server.shutdown()
+        # The dispatcher may be waiting on a slot or on the queue.
+        self.slots.release()
+        while True:
+            try:
+                self.pending.get_nowait()
+            except queue.Empty:
+                break
+        self.pending.put(None)
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+def send_datasets(
+    datasets: Iterable[Dataset | str | Path],
+    address: str = "127.0.0.1",
+    port: int = 11112,
+    ae_title: str = "DRMAM",
+) -> list[int]:
+    """
+    Minimal storage SCU, standing in for a modality when testing the SCP on
+    localhost. Sends datasets or files over one association and returns the
+    C-STORE status of each, or -1 where no response was received.
+    """
+    from pydicom import dcmread
+    from pynetdicom import AE
+    from pynetdicom.presentation import build_context
+
+    datasets = [
+        dataset if hasattr(dataset, "SOPClassUID") else dcmread(dataset)
+        for dataset in datasets
+    ]
+    ae = AE()
+    contexts = {
+        (str(dataset.SOPClassUID), str(dataset.file_meta.TransferSyntaxUID))
+        for dataset in datasets
+    }
+    for abstract_syntax, transfer_syntax in contexts:
+        ae.requested_contexts.append(build_context(abstract_syntax, transfer_syntax))
+    association = ae.associate(address, port, ae_title=ae_title)
+    if not association.is_established:
+        raise ConnectionError(f"Association with {ae_title}@{address}:{port} failed.")
+    statuses = []
+    try:
+        for dataset in datasets:
+            status = association.send_c_store(dataset)
+            statuses.append(int(status.Status) if status else -1)
+    finally:
+        association.release()
+    return statuses
@@ -4,18 +4,28 @@ CREATE_TABLE = """ CREATE TABLE edges (
     manufacturer text,
     mode text,
     orientation text,
-    frequency text,
-    left text,
-    right text,
-    top text,
-    bottom text,
+    frequency blob,
+    left blob,
+    right blob,
+    top blob,
+    bottom blob,
     processed integer,
+    sop_instance_uid text,
+    rows integer,
+    columns integer,
+    frames integer,
+    transfer_syntax text,
+    pixel_spacing real,
+    magnification_factor real,
+    cpp_results blob,
     PRIMARY KEY (fpath, name)
 ); """
 
 INSERT_ROWS = """ INSERT INTO edges
-    (fpath, name, manufacturer, mode, orientation, frequency, left, right, top, bottom, processed)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?); """
+    (fpath, name, manufacturer, mode, orientation, frequency, left, right, top,
+    bottom, processed, sop_instance_uid, rows, columns, frames, transfer_syntax,
+    pixel_spacing, magnification_factor, cpp_results)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?); """
 
 DELETE_ALL = """DELETE FROM edges;"""
 
@@ -28,7 +38,121 @@ UPDATE_MTF_VALUES = """ UPDATE edges SET
     right = ?,
     top = ?,
     bottom = ?,
+    pixel_spacing = ?,
+    magnification_factor = ?,
+    cpp_results = ?,
     processed = 1
     WHERE fpath = ?;"""
 
+# Results in cycles/pixel, from which the template results are derived again
+# when the magnification factors or sample number change.
+SELECT_CPP_RESULTS = """ SELECT fpath, manufacturer, mode, pixel_spacing, cpp_results
+    FROM edges WHERE processed = 1 AND cpp_results IS NOT NULL"""
+
+UPDATE_DERIVED_RESULTS = """ UPDATE edges SET
+    frequency = ?,
+    left = ?,
+    right = ?,
+    top = ?,
+    bottom = ?,
+    magnification_factor = ?
+    WHERE fpath = ?;"""
+
+MARK_FAILED = """ UPDATE edges SET processed = -1 WHERE fpath = ?;"""
+
+# Largest images first, so long jobs are not left until the end of a batch.
+SELECT_UNPROCESSED = """ SELECT fpath FROM edges WHERE processed = 0
+    ORDER BY rows * columns * frames DESC; """
+
 SELECT_PROCESSED = """SELECT * FROM edges WHERE processed = 1"""
+
+SELECT_PROCESSED_ARRAYS = """ SELECT name, manufacturer, mode, orientation,
+    frequency, left, right, top, bottom FROM edges WHERE processed = 1; """
+
+# Stage timings recorded when instrumentation is on, named by image path.
+# Stages of a batch write are not tied to one image and have an empty name.
+CREATE_TIMINGS_TABLE = """ CREATE TABLE timings (
+    name text,
+    stage text,
+    edge text,
+    seconds real,
+    peak_bytes integer
+); """
+
+INSERT_TIMING = """ INSERT INTO timings (name, stage, edge, seconds, peak_bytes)
+    VALUES (?, ?, ?, ?, ?); """
+
+SELECT_TIMINGS = """ SELECT name, stage, edge, seconds, peak_bytes FROM timings; """
+
+SELECT_TIMING_SUMMARY = """ SELECT stage, COUNT(*), SUM(seconds), AVG(seconds),
+    MAX(seconds), MAX(peak_bytes) FROM timings
+    GROUP BY stage ORDER BY SUM(seconds) DESC; """
+
+DELETE_TIMINGS_BY_NAME = """ DELETE FROM timings WHERE name = ?; """
+
+DELETE_ALL_TIMINGS = """ DELETE FROM timings; """
+
+# Bump when the results table layout or the MTF blob format changes, older
+# stores are then rebuilt rather than misread.
+RESULTS_SCHEMA_VERSION = 3
+
+DROP_RESULTS_TABLE = """ DROP TABLE IF EXISTS results; """
+
+CREATE_RESULTS_TABLE = """ CREATE TABLE IF NOT EXISTS results (
+    key text,
+    calc_version text,
+    params_key text,
+    fpath text,
+    size integer,
+    mtime real,
+    manufacturer text,
+    mode text,
+    orientation text,
+    frequency blob,
+    left blob,
+    right blob,
+    top blob,
+    bottom blob,
+    pixel_spacing real,
+    magnification_factor real,
+    cpp_results blob,
+    PRIMARY KEY (key, calc_version, params_key)
+); """
+
+CREATE_RESULTS_INDEX = """ CREATE INDEX IF NOT EXISTS results_fpath
+    ON results (fpath); """
+
+INSERT_RESULT = """ INSERT OR REPLACE INTO results
+    (key, calc_version, params_key, fpath, size, mtime, manufacturer, mode,
+    orientation, frequency, left, right, top, bottom, pixel_spacing,
+    magnification_factor, cpp_results)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?); """
+
+SELECT_RESULT_BY_PATH = """ SELECT size, mtime, manufacturer, mode, orientation,
+    frequency, left, right, top, bottom, pixel_spacing, magnification_factor,
+    cpp_results FROM results
+    WHERE fpath = ? AND calc_version = ? AND params_key = ?; """
+
+SELECT_RESULT_BY_KEY = """ SELECT fpath, size, mtime, manufacturer, mode, orientation,
+    frequency, left, right, top, bottom, pixel_spacing, magnification_factor,
+    cpp_results FROM results
+    WHERE key = ? AND calc_version = ? AND params_key = ?; """
+
+DELETE_RESULTS_BY_PATH = """ DELETE FROM results WHERE fpath = ?; """
+
+# Files the calculation failed on, so services do not retry them until they
+# change or the calculator is updated.
+CREATE_FAILURES_TABLE = """ CREATE TABLE IF NOT EXISTS failures (
+    fpath text,
+    calc_version text,
+    size integer,
+    mtime real,
+    error text,
+    PRIMARY KEY (fpath, calc_version)
+); """
+
+INSERT_FAILURE = """ INSERT OR REPLACE INTO failures
+    (fpath, calc_version, size, mtime, error) VALUES (?, ?, ?, ?, ?); """
+
+SELECT_FAILURE = """ SELECT size, mtime FROM failures
+    WHERE fpath = ? AND calc_version = ?; """
@@ -0,0 +1,171 @@
+import hashlib
+import os
+import sqlite3
+from pathlib import Path
+from .sql_queries import (
+    RESULTS_SCHEMA_VERSION,
+    DROP_RESULTS_TABLE,
+    CREATE_RESULTS_TABLE,
+    CREATE_RESULTS_INDEX,
+    INSERT_RESULT,
+    SELECT_RESULT_BY_PATH,
+    SELECT_RESULT_BY_KEY,
+    DELETE_RESULTS_BY_PATH,
+    CREATE_FAILURES_TABLE,
+    INSERT_FAILURE,
+    SELECT_FAILURE,
+)
+from .utils import lazy_import
+
+pydicom = lazy_import("pydicom")
+
+DEFAULT_RESULTS_PATH = Path.home() / ".drmam" / "results.sqlite"
+
+
+def content_key(fpath: str | Path) -> str:
+    """
+    Identify an image by its SOPInstanceUID, read from the header only.
+    Files without one fall back to a hash of the file contents.
+    """
+    try:
+        header = pydicom.dcmread(
+            fpath, stop_before_pixels=True, specific_tags=["SOPInstanceUID"]
+        )
+        uid = header.get("SOPInstanceUID")
+        if uid:
+            return f"uid:{uid}"
+    except (pydicom.errors.InvalidDicomError, OSError):
+        pass
+    digest = hashlib.sha1()
+    with open(fpath, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return f"sha1:{digest.hexdigest()}"
+
+
+class ResultsStore:
+    """
+    On-disk cache of MTF results that persists across sessions.
+
+    Entries are keyed by image content, calculator version and the calculator's
+    parameters. An entry is dropped when the file it was calculated from
+    changes size or modification time. Results are kept in cycles/pixel as
+    well, so entries stay valid when the magnification factors change.
+    """
+
+    def __init__(self, db_path: str | Path, calc_version: str, params_key: str) -> None:
+        db_path = Path(db_path)
+        db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = sqlite3.connect(db_path)
+        self.cursor = self.connection.cursor()
+        (schema_version,) = self.cursor.execute("PRAGMA user_version").fetchone()
+        if schema_version != RESULTS_SCHEMA_VERSION:
+            self.cursor.execute(DROP_RESULTS_TABLE)
+            self.cursor.execute(f"PRAGMA user_version = {RESULTS_SCHEMA_VERSION}")
+        self.cursor.execute(CREATE_RESULTS_TABLE)
+        self.cursor.execute(CREATE_RESULTS_INDEX)
+        self.cursor.execute(CREATE_FAILURES_TABLE)
+        self.connection.commit()
+        self.calc_version = calc_version
+        self.params_key = params_key
+
+    def lookup(self, fpath: str | Path) -> tuple | None:
+        """
+        Return the cached (manufacturer, mode, orientation, frequency, left,
+        right, top, bottom, pixel_spacing, magnification_factor, cpp_results)
+        values for a file, or None on a miss.
+        """
+        fpath = str(fpath)
+        try:
+            stat = os.stat(fpath)
+        except OSError:
+            return None
+        # Fast path, the same file seen before: no need to read the header.
+        row = self.cursor.execute(
+            SELECT_RESULT_BY_PATH, (fpath, self.calc_version, self.params_key)
+        ).fetchone()
+        if row is not None:
+            size, mtime, *values = row
+            if size == stat.st_size and mtime == stat.st_mtime:
+                return tuple(values)
+            self.invalidate(fpath)
+            return None
+
+        row = self.cursor.execute(
+            SELECT_RESULT_BY_KEY,
+            (content_key(fpath), self.calc_version, self.params_key),
+        ).fetchone()
+        if row is None:
+            return None
+        cached_fpath, size, mtime, *values = row
+        if cached_fpath == fpath and (size, mtime) != (stat.st_size, stat.st_mtime):
+            self.invalidate(fpath)
+            return None
+        return tuple(values)
+
+    def save(
+        self,
+        fpath: str | Path,
+        manufacturer: str,
+        mode: str,
+        orientation: str,
+        frequency: bytes,
+        left: bytes,
+        right: bytes,
+        top: bytes,
+        bottom: bytes,
+        pixel_spacing: float = None,
+        magnification_factor: float = None,
+        cpp_results: bytes = None,
+    ) -> None:
+        fpath = str(fpath)
+        stat = os.stat(fpath)
+        self.cursor.execute(
+            INSERT_RESULT,
+            (
+                content_key(fpath),
+                self.calc_version,
+                self.params_key,
+                fpath,
+                stat.st_size,
+                stat.st_mtime,
+                manufacturer,
+                mode,
+                orientation,
+                frequency,
+                left,
+                right,
+                top,
+                bottom,
+                pixel_spacing,
+                magnification_factor,
+                cpp_results,
+            ),
+        )
+        self.connection.commit()
+
+    def save_failure(self, fpath: str | Path, error: str) -> None:
+        """Remember that the calculation failed on this version of a file."""
+        fpath = str(fpath)
+        stat = os.stat(fpath)
+        self.cursor.execute(
+            INSERT_FAILURE,
+            (fpath, self.calc_version, stat.st_size, stat.st_mtime, error),
+        )
+        self.connection.commit()
+
+    def has_failed(self, fpath: str | Path) -> bool:
+        """True if the calculation failed on the file as it is now."""
+        fpath = str(fpath)
+        row = self.cursor.execute(SELECT_FAILURE, (fpath, self.calc_version)).fetchone()
+        if row is None:
+            return False
+        try:
+            stat = os.stat(fpath)
+        except OSError:
+            return False
+        return tuple(row) == (stat.st_size, stat.st_mtime)
+
+    def invalidate(self, fpath: str | Path) -> None:
+        self.cursor.execute(DELETE_RESULTS_BY_PATH, (str(fpath),))
+        self.connection.commit()
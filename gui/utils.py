@@ -1,7 +1,40 @@
+import importlib
 import json
+import time
 from pathlib import Path
+from types import ModuleType
+from .profiling import startup_profile
 
 
 def read_json(fpath: str | Path) -> dict:
     with open(fpath, "r") as f:
         return json.load(f)
+
+
+class LazyModule(ModuleType):
+    """Module stand-in that imports the real module on first attribute access."""
+
+    def __init__(self, name: str) -> None:
+        super().__init__(name)
+        self.__dict__["_module"] = None
+
+    def _load(self) -> ModuleType:
+        if self._module is None:
+            start = time.perf_counter()
+            module = importlib.import_module(self.__name__)
+            startup_profile.record("import", self.__name__, time.perf_counter() - start)
+            self.__dict__["_module"] = module
+        return self._module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+
+_lazy_modules: dict[str, LazyModule] = {}
+
+
+def lazy_import(name: str) -> LazyModule:
+    """Defer importing a heavy module until it is first used."""
+    if name not in _lazy_modules:
+        _lazy_modules[name] = LazyModule(name)
+    return _lazy_modules[name]
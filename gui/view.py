@@ -27,6 +27,12 @@ class Presenter(Protocol):
 
     def handle_calculate_write(self) -> None: ...
 
+    def handle_cancel(self) -> None: ...
+
+    def handle_show_timings(self) -> None: ...
+
+    def handle_reload_params(self) -> None: ...
+
     def handle_write_mode(self) -> None: ...
 
     def handle_template_select(self) -> None: ...
@@ -65,6 +71,7 @@ class MTFCalculator(cTkdnd):
             self.image_list_frame, text="DICOM images to process:"
         ).pack()
         self.image_list = tk.Listbox(self.image_list_frame, height=10, width=30)
+        self.image_paths: list[str] = []  # Path of each entry in image_list
         self.image_list.bind("<<ListboxSelect>>", presenter.handle_image_select)
         self.image_list.bind("<FocusOut>", self.on_focus_out)
         self.image_list.pack()
@@ -194,14 +201,39 @@ class MTFCalculator(cTkdnd):
             command=presenter.handle_calculate_write,
         )
         self.calculate_write_button.pack()
+        self.progress_bar = ctk.CTkProgressBar(self.calc_button_frame)
+        self.progress_bar.set(0)
+        self.progress_bar.pack(pady=(10, 0))
+        self.progress_text = ctk.CTkLabel(self.calc_button_frame, text="")
+        self.progress_text.pack()
+        self.cancel_button = ctk.CTkButton(
+            self.calc_button_frame,
+            text="Cancel",
+            state=tk.DISABLED,
+            command=presenter.handle_cancel,
+        )
+        self.cancel_button.pack()
+        self.timings_button = ctk.CTkButton(
+            self.calc_button_frame,
+            text="Stage timings",
+            command=presenter.handle_show_timings,
+        )
+        self.timings_button.pack(pady=(10, 0))
+        self.reload_params_button = ctk.CTkButton(
+            self.calc_button_frame,
+            text="Reload parameters",
+            command=presenter.handle_reload_params,
+        )
+        self.reload_params_button.pack(pady=(10, 0))
         self.calc_button_frame.grid(row=1, column=0, padx=10)
 
     @property
     def selected_image(self) -> str:
-        try:
-            return self.image_list.get(self.image_list.curselection())
-        except tk.TclError:
+        """Path of the selected image, empty if none is selected."""
+        selection = self.image_list.curselection()
+        if not selection:
             return ""
+        return self.image_paths[selection[0]]
 
     @property
     def selected_workbook(self) -> str:
@@ -231,10 +263,53 @@ class MTFCalculator(cTkdnd):
         self.active_cell_value_text.configure(state=tk.DISABLED)
         self.active_cell_refresh.configure(state=tk.DISABLED)
 
-    def update_image_list(self, image_list: list[str]) -> None:
+    def on_calculation_start(self, total: int) -> None:
+        for button in (
+            self.calculate_button,
+            self.write_button,
+            self.calculate_write_button,
+        ):
+            button.configure(state=tk.DISABLED)
+        self.cancel_button.configure(state=tk.NORMAL)
+        self.update_progress(0, total, 0.0, None)
+
+    def update_progress(
+        self, completed: int, total: int, throughput: float, eta: float | None
+    ) -> None:
+        self.progress_bar.set(completed / total if total else 0)
+        eta_text = "--:--" if eta is None else f"{int(eta) // 60}:{int(eta) % 60:02d}"
+        self.progress_text.configure(
+            text=f"{completed}/{total} images, {throughput:.2f} img/s, ETA {eta_text}"
+        )
+
+    def on_calculation_end(self, cancelled: bool) -> None:
+        for button in (
+            self.calculate_button,
+            self.write_button,
+            self.calculate_write_button,
+        ):
+            button.configure(state=tk.NORMAL)
+        self.cancel_button.configure(state=tk.DISABLED)
+        if cancelled:
+            self.progress_text.configure(
+                text=self.progress_text.cget("text") + " (cancelled)"
+            )
+
+    def show_timings(self, summary: str) -> None:
+        window = ctk.CTkToplevel(self)
+        window.title(f"{TITLE} - Stage timings")
+        textbox = ctk.CTkTextbox(window, width=640, height=320, font=("Courier", 12))
+        textbox.insert("0.0", summary)
+        textbox.configure(state=tk.DISABLED)
+        textbox.pack(padx=10, pady=10, fill=tk.BOTH, expand=True)
+        window.after(100, window.focus)
+
+    def update_image_list(self, image_list: list[tuple[str, str]]) -> None:
+        """Show the label of each (fpath, label), selections give the fpath."""
         self.image_list.delete(0, tk.END)
-        for image in image_list:
-            self.image_list.insert(tk.END, image)
+        self.image_paths = [fpath for fpath, _ in image_list]
+        for _, label in image_list:
+            self.image_list.insert(tk.END, label)
         self.image_list.yview(tk.END)
 
     def init_workbook_list(self, active: str, options: list[str]) -> None:
@@ -251,7 +326,9 @@ class MTFCalculator(cTkdnd):
     def update_image_display(self, im: Image, image_details: dict) -> None:
         image_new = ctk.CTkImage(light_image=im, dark_image=im, size=(200, 200))
         self.image_display.configure(image=image_new)
-        self.image_display_details_name.configure(text=self.selected_image)
+        selection = self.image_list.curselection()
+        label = self.image_list.get(selection[0]) if selection else ""
+        self.image_display_details_name.configure(text=label)
         self.image_display_details_acquisition.configure(
             text=f"Acquisition type: {image_details['acquisition'].capitalize()}"
         )
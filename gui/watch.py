@@ -0,0 +1,338 @@
+from __future__ import annotations
+import os
+import queue
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Iterable, Protocol
+from .batch import BatchResult, _calculate_worker
+from .model import cpp2blob, mtfcol2blob
+from .store import ResultsStore
+from .utils import lazy_import
+
+pydicom = lazy_import("pydicom")
+
+# Files still being copied in are often given a temporary name first.
+PARTIAL_SUFFIXES = (".tmp", ".part", ".partial", ".filepart", ".crdownload")
+
+
+def is_candidate(fpath: str) -> bool:
+    name = os.path.basename(fpath)
+    return not name.startswith(".") and not name.lower().endswith(PARTIAL_SUFFIXES)
+
+
+def iter_files(directories: Iterable[str | Path]) -> Iterable[str]:
+    for directory in directories:
+        for dirpath, _, filenames in os.walk(directory):
+            for filename in filenames:
+                yield os.path.join(dirpath, filename)
+
+
+class EventSource(Protocol):
+    """Reports paths that may have been created or changed."""
+
+    def start(self) -> None: ...
+
+    def poll(self) -> list[str]: ...
+
+    def stop(self) -> None: ...
+
+
+class PollingSource:
+    """
+    Rescans the directories every interval seconds, reporting files that are
+    new or whose size or modification time changed since the last scan.
+    """
+
+    def __init__(self, directories: list[str | Path], interval: float = 2.0) -> None:
+        self.directories = directories
+        self.interval = interval
+        self.snapshot: dict[str, tuple[int, float]] = {}
+        self.next_scan = 0.0
+
+    def start(self) -> None:
+        self.next_scan = 0.0
+
+    def poll(self) -> list[str]:
+        now = time.monotonic()
+        if now < self.next_scan:
+            return []
+        self.next_scan = now + self.interval
+        changed, snapshot = [], {}
+        for fpath in iter_files(self.directories):
+            try:
+                stat = os.stat(fpath)
+            except OSError:
+                continue  # Removed during the scan
+            snapshot[fpath] = (stat.st_size, stat.st_mtime)
+            if self.snapshot.get(fpath) != snapshot[fpath]:
+                changed.append(fpath)
+        self.snapshot = snapshot
+        return changed
+
+    def stop(self) -> None:
+        pass
+
+
+class WatchdogSource:
+    """
+    Native filesystem notifications (inotify on Linux) through watchdog.
+    Files already in the directories are reported on start.
+    """
+
+    def __init__(self, directories: list[str | Path]) -> None:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        self.directories = directories
+        self.events: queue.Queue[str] = queue.Queue()
+        self.observer = Observer()
+        events = self.events
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event) -> None:
+                if event.is_directory:
+                    return
+                # Moves into the folder report the new name as dest_path.
+                events.put(getattr(event, "dest_path", "") or event.src_path)
+
+        for directory in directories:
+            self.observer.schedule(Handler(), str(directory), recursive=True)
+
+    def start(self) -> None:
+        self.observer.start()
+        for fpath in iter_files(self.directories):
+            self.events.put(fpath)
+
+    def poll(self) -> list[str]:
+        changed = []
+        while True:
+            try:
+                changed.append(self.events.get_nowait())
+            except queue.Empty:
+                return changed
+
+    def stop(self) -> None:
+        self.observer.stop()
+        self.observer.join()
+
+
+def make_source(
+    directories: list[str | Path], polling: bool = False, interval: float = 2.0
+) -> EventSource:
+    """Native notifications where watchdog is installed, polling otherwise."""
+    if not polling:
+        try:
+            return WatchdogSource(directories)
+        except (ImportError, OSError) as e:
+            print(f"Filesystem notifications unavailable, polling instead: {e}")
+    return PollingSource(directories, interval)
+
+
+class StabilityTracker:
+    """
+    Holds back files until their size and modification time have not changed
+    for settle seconds, so files still being written are not read.
+    """
+
+    def __init__(self, settle: float = 2.0) -> None:
+        self.settle = settle
+        self.pending: dict[str, tuple[tuple[int, float], float]] = {}
+
+    def __len__(self) -> int:
+        return len(self.pending)
+
+    def add(self, fpath: str) -> None:
+        self.pending.setdefault(fpath, ((-1, -1.0), time.monotonic()))
+
+    def ready(self) -> list[str]:
+        """Files unchanged for the settle time, removed from the pending set."""
+        now = time.monotonic()
+        ready = []
+        for fpath, (last_stat, since) in list(self.pending.items()):
+            try:
+                stat = os.stat(fpath)
+            except OSError:
+                del self.pending[fpath]  # Removed or renamed away
+                continue
+            current = (stat.st_size, stat.st_mtime)
+            if current != last_stat:
+                self.pending[fpath] = (current, now)
+            elif now - since >= self.settle:
+                del self.pending[fpath]
+                ready.append(fpath)
+        return ready
+
+
+def _result(fpath: str, future: Future) -> BatchResult:
+    """Result of a finished future, raising BrokenProcessPool if its worker died."""
+    try:
+        results_array, metadata = future.result()
+    except BrokenProcessPool:
+        raise
+    except Exception as e:
+        return BatchResult(fpath, error=f"{type(e).__name__}: {e}")
+    return BatchResult(fpath, results_array, metadata)
+
+
+class WatchService:
+    """
+    Calculates MTF for DICOM files as they appear in the watched directories,
+    appending results to a ResultsStore. Files with a stored result or a
+    stored failure are skipped, so nothing is processed twice, across restarts
+    as well. At most max_in_flight files are queued on the worker pool; the
+    rest wait in a backlog, so a burst of files does not hold up the loop.
+    A file is recorded as crashing a worker only if it does so when run alone.
+    """
+
+    def __init__(
+        self,
+        calculator,
+        store: ResultsStore,
+        source: EventSource,
+        workers: int = 2,
+        settle: float = 2.0,
+        tick: float = 0.5,
+    ) -> None:
+        self.calculator = calculator
+        self.store = store
+        self.source = source
+        self.workers = workers
+        self.max_in_flight = 2 * workers
+        self.tracker = StabilityTracker(settle)
+        self.tick = tick
+        self.backlog: deque[str] = deque()
+        self.queued: set[str] = set()  # In the backlog or in flight
+        self.in_flight: dict[Future, str] = {}
+        # Files in flight when a worker crashed, each run alone in turn.
+        self.suspects: deque[str] = deque()
+        self.isolated: tuple[Future, str, ProcessPoolExecutor] = None
+        self.executor: ProcessPoolExecutor = None
+        self.processed = 0
+        self.failed = 0
+
+    def _handled(self, fpath: str) -> bool:
+        return self.store.lookup(fpath) is not None or self.store.has_failed(fpath)
+
+    def _accept(self, fpath: str) -> None:
+        """Queue a settled file if it is a DICOM file not handled before."""
+        if fpath in self.queued or not pydicom.misc.is_dicom(fpath):
+            return
+        if self._handled(fpath):
+            return
+        self.queued.add(fpath)
+        self.backlog.append(fpath)
+
+    def _submit(self) -> None:
+        while self.backlog and len(self.in_flight) < self.max_in_flight:
+            fpath = self.backlog.popleft()
+            try:
+                future = self.executor.submit(_calculate_worker, self.calculator, fpath)
+            except BrokenProcessPool:
+                self.backlog.appendleft(fpath)
+                self._restart_pool()
+                continue
+            self.in_flight[future] = fpath
+
+    def _restart_pool(self) -> None:
+        """
+        A crashed worker breaks the pool and every future in it, so which
+        file crashed it is unknown. Files in flight become suspects, to be
+        run alone, and the other files carry on in a new pool.
+        """
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.suspects.extend(self.in_flight.values())
+        self.in_flight.clear()
+
+    def _isolate(self) -> None:
+        """Run the next suspect in a pool of its own, one suspect at a time."""
+        if self.isolated is not None or not self.suspects:
+            return
+        fpath = self.suspects.popleft()
+        pool = ProcessPoolExecutor(max_workers=1)
+        future = pool.submit(_calculate_worker, self.calculator, fpath)
+        self.isolated = (future, fpath, pool)
+
+    def _finish_isolated(self) -> None:
+        future, fpath, pool = self.isolated
+        self.isolated = None
+        pool.shutdown(wait=False)
+        try:
+            self._save(_result(fpath, future))
+        except BrokenProcessPool:
+            self._save(BatchResult(fpath, error="Worker process crashed."))
+
+    def _collect(self, timeout: float) -> None:
+        futures = list(self.in_flight)
+        if self.isolated is not None:
+            futures.append(self.isolated[0])
+        if not futures:
+            time.sleep(timeout)
+            return
+        done, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+        for future in done:
+            if self.isolated is not None and future is self.isolated[0]:
+                self._finish_isolated()
+                continue
+            fpath = self.in_flight.pop(future)
+            try:
+                result = _result(fpath, future)
+            except BrokenProcessPool:
+                self.in_flight[future] = fpath
+                self._restart_pool()
+                return
+            self._save(result)
+
+    def _save(self, result: BatchResult) -> None:
+        self.queued.discard(result.fpath)
+        try:
+            if result.ok:
+                metadata = result.metadata
+                self.store.save(
+                    result.fpath,
+                    metadata["manufacturer"],
+                    metadata["mode"],
+                    metadata["orientation"],
+                    *(mtfcol2blob(column) for column in result.results_array.T),
+                    metadata["pixel_spacing"],
+                    metadata["magnification_factor"],
+                    cpp2blob(metadata["cpp_results"]),
+                )
+                self.processed += 1
+                print(f"OK     {result.fpath}")
+            else:
+                self.store.save_failure(result.fpath, result.error)
+                self.failed += 1
+                print(f"FAILED {result.fpath}: {result.error}")
+        except OSError as e:  # File removed before the result was saved
+            print(f"Not saved {result.fpath}: {e}")
+
+    def step(self) -> None:
+        """One pass of the loop: take events, queue settled files, collect results."""
+        for fpath in self.source.poll():
+            if is_candidate(fpath):
+                self.tracker.add(fpath)
+        for fpath in self.tracker.ready():
+            self._accept(fpath)
+        self._submit()
+        self._isolate()
+        self._collect(self.tick)
+
+    def run(self, stop_after: float = None) -> None:
+        """Run until interrupted, or for stop_after seconds."""
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        self.source.start()
+        deadline = None if stop_after is None else time.monotonic() + stop_after
+        try:
+            while deadline is None or time.monotonic() < deadline:
+                self.step()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.source.stop()
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            if self.isolated is not None:
+                self.isolated[2].shutdown(wait=False, cancel_futures=True)
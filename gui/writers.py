@@ -0,0 +1,169 @@
+import csv
+import json
+import zipfile
+from itertools import chain
+from pathlib import Path
+from typing import Protocol
+import numpy as np
+from .batch import BatchResult
+
+COLUMNS = ("frequency", "left", "right", "top", "bottom")
+EDGES = COLUMNS[1:]
+BAND_COLUMNS = tuple(
+    f"{edge}_{bound}" for edge in EDGES for bound in ("lower", "upper")
+)
+MTF50_COLUMNS = tuple(f"mtf50_{column}" for column in BAND_COLUMNS)
+
+
+class ResultWriter(Protocol):
+    """
+    Receives one BatchResult at a time and writes it out straight away, so
+    partial output survives an interrupted run. Writers created with bands
+    also write the confidence bands and MTF50 intervals of bootstrapped
+    results, see MammoTemplateCalc.bands_from_edges.
+    """
+
+    def write(self, result: BatchResult) -> None: ...
+
+    def close(self) -> None: ...
+
+
+def _metadata_fields(result: BatchResult) -> dict:
+    return {
+        "file": result.fpath,
+        "status": "ok" if result.ok else "error",
+        "error": result.error or "",
+        "manufacturer": result.metadata.get("manufacturer", ""),
+        "mode": result.metadata.get("mode", ""),
+        "orientation": result.metadata.get("orientation", ""),
+    }
+
+
+def _band_columns(result: BatchResult) -> np.ndarray:
+    """
+    Lower and upper band of each edge interleaved, (n_samples x 8), in the
+    order of BAND_COLUMNS. NaN if the result was not bootstrapped.
+    """
+    n_samples = len(result.results_array)
+    if "mtf_lower" not in result.metadata:
+        return np.full((n_samples, len(BAND_COLUMNS)), np.nan)
+    bands = np.stack(
+        [result.metadata["mtf_lower"][:, 1:], result.metadata["mtf_upper"][:, 1:]],
+        axis=2,
+    )
+    return bands.reshape(n_samples, len(BAND_COLUMNS))
+
+
+def _mtf50_intervals(result: BatchResult) -> np.ndarray:
+    """MTF50 intervals in the order of MTF50_COLUMNS, NaN if not bootstrapped."""
+    intervals = result.metadata.get("mtf50_intervals")
+    if intervals is None:
+        return np.full(len(MTF50_COLUMNS), np.nan)
+    return np.ravel(intervals)
+
+
+class CSVResultWriter:
+    """
+    Long format CSV, one line per frequency sample of each image. With bands,
+    each line also has the band of each edge and, repeated on every line of
+    an image, its MTF50 intervals.
+    """
+
+    def __init__(self, out_path: str | Path, bands: bool = False) -> None:
+        self.file = open(out_path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.bands = bands
+        self.columns = COLUMNS + (BAND_COLUMNS + MTF50_COLUMNS if bands else ())
+        self.writer.writerow(
+            ("file", "status", "error", "manufacturer", "mode", "orientation")
+            + self.columns
+        )
+
+    def write(self, result: BatchResult) -> None:
+        fields = tuple(_metadata_fields(result).values())
+        if not result.ok:
+            self.writer.writerow(fields + ("",) * len(self.columns))
+        elif self.bands:
+            intervals = tuple(_mtf50_intervals(result))
+            self.writer.writerows(
+                fields + tuple(row) + tuple(band) + intervals
+                for row, band in zip(result.results_array, _band_columns(result))
+            )
+        else:
+            self.writer.writerows(fields + tuple(row) for row in result.results_array)
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JSONResultWriter:
+    """
+    JSON Lines, one object per image. NaN samples are written as null. With
+    bands, each object also has a list per band column and the MTF50
+    intervals as numbers.
+    """
+
+    def __init__(self, out_path: str | Path, bands: bool = False) -> None:
+        self.file = open(out_path, "w")
+        self.bands = bands
+
+    def write(self, result: BatchResult) -> None:
+        record = _metadata_fields(result)
+        if result.ok:
+            columns = zip(COLUMNS, result.results_array.T)
+            if self.bands:
+                columns = chain(columns, zip(BAND_COLUMNS, _band_columns(result).T))
+            for column, values in columns:
+                record[column] = [None if np.isnan(v) else float(v) for v in values]
+            if self.bands:
+                for column, value in zip(MTF50_COLUMNS, _mtf50_intervals(result)):
+                    record[column] = None if np.isnan(value) else float(value)
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class NPZResultWriter:
+    """
+    NumPy .npz archive loadable with np.load. Each image's results array is
+    streamed into the archive as it arrives, under the key "mtf_<index>".
+    The "files" and "status" arrays, written on close, index those keys.
+    With bands, "lower_<index>" and "upper_<index>" hold the bands in the
+    same layout and "mtf50_<index>" the (4 x 2) MTF50 intervals.
+    """
+
+    def __init__(self, out_path: str | Path, bands: bool = False) -> None:
+        self.archive = zipfile.ZipFile(out_path, "w", compression=zipfile.ZIP_STORED)
+        self.bands = bands
+        self.files = []
+        self.status = []
+
+    def _write_array(self, key: str, array: np.ndarray) -> None:
+        with self.archive.open(f"{key}.npy", "w", force_zip64=True) as f:
+            np.lib.format.write_array(f, np.asanyarray(array), allow_pickle=False)
+
+    def write(self, result: BatchResult) -> None:
+        if result.ok:
+            index = len(self.files)
+            self._write_array(f"mtf_{index}", result.results_array)
+            if self.bands and "mtf_lower" in result.metadata:
+                self._write_array(f"lower_{index}", result.metadata["mtf_lower"])
+                self._write_array(f"upper_{index}", result.metadata["mtf_upper"])
+                self._write_array(f"mtf50_{index}", result.metadata["mtf50_intervals"])
+        self.files.append(result.fpath)
+        self.status.append("ok" if result.ok else result.error)
+
+    def close(self) -> None:
+        self._write_array("files", np.array(self.files, dtype=str))
+        self._write_array("status", np.array(self.status, dtype=str))
+        self.archive.close()
+
+
+WRITERS = {
+    "csv": CSVResultWriter,
+    "json": JSONResultWriter,
+    "npz": NPZResultWriter,
+}
@@ -1,11 +1,18 @@
-from gui.calculator import MammoTemplateCalc
-from gui.model import Model
-from gui.presenter import Presenter
-from gui.view import MTFCalculator
-from gui.excel import XwingsHandler
-from pathlib import Path
+from gui.profiling import startup_profile
+import argparse
+import multiprocessing
 import os
 import sys
+from pathlib import Path
+
+with startup_profile.timed("import", "gui (tk, customtkinter, pillow)"):
+    from gui.calculator import MammoTemplateCalc
+    from gui.model import Model
+    from gui.presenter import Presenter
+    from gui.view import MTFCalculator
+    from gui.excel import XwingsHandler
+    from gui.store import ResultsStore, DEFAULT_RESULTS_PATH
+    from gui.roi import ROITracker
 
 if getattr(sys, "frozen", False):
     # If running in PyInstaller bundle
@@ -14,16 +21,74 @@ if getattr(sys, "frozen", False):
     os.add_dll_directory(dll_path)
 
 TEMPLATE_PATH = Path(__file__).parent / "template_parameters.json"
+# Compiled numba kernels are cached here, the default location next to the
+# sources is not writable in a PyInstaller bundle.
+os.environ.setdefault("NUMBA_CACHE_DIR", str(Path.home() / ".drmam" / "numba_cache"))
 
 
 def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--profile-startup",
+        action="store_true",
+        help="Print time to window and first result, by import and compile.",
+    )
+    parser.add_argument(
+        "--instrument",
+        action="store_true",
+        help="Record time and peak memory of each calculation and write stage.",
+    )
+    parser.add_argument(
+        "--cache-mb",
+        type=int,
+        default=2048,
+        help="Memory for decoded images, beyond which they are spilled to disk.",
+    )
+    parser.add_argument(
+        "--track-rois",
+        action="store_true",
+        help="Search for the edge object near where it was last found.",
+    )
+    parser.add_argument(
+        "--pyramid",
+        type=int,
+        default=1,
+        metavar="FACTOR",
+        help="Search for ROIs in the image downsampled by FACTOR first.",
+    )
+    args = parser.parse_args()
+    startup_profile.enabled = args.profile_startup
+
     excel_handler = XwingsHandler(TEMPLATE_PATH)
     calculator = MammoTemplateCalc(TEMPLATE_PATH)
-    model = Model(mtf_calculator=calculator, excel_handler=excel_handler)
+    if args.track_rois:
+        calculator.roi_tracker = ROITracker()
+    calculator.pyramid_factor = args.pyramid
+    results_store = ResultsStore(
+        DEFAULT_RESULTS_PATH, calculator.version, calculator.params_key
+    )
+    model = Model(
+        mtf_calculator=calculator,
+        excel_handler=excel_handler,
+        workers=os.cpu_count() or 1,
+        results_store=results_store,
+        cache_budget_bytes=args.cache_mb * 2**20,
+    )
+    model.instrumented = args.instrument
+    # Import mtf and compile its kernels while the user is dropping files.
+    model.start_workers()
     view = MTFCalculator()
+    view.after(0, startup_profile.mark, "window shown")
     presenter = Presenter(model, view)
-    presenter.run()
+    try:
+        presenter.run()
+    finally:
+        model.shutdown_workers()
+    if startup_profile.enabled:
+        print(startup_profile.report())
 
 
 if __name__ == "__main__":
+    # Needed for the calculation worker processes in a PyInstaller bundle
+    multiprocessing.freeze_support()
     main()
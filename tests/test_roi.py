@@ -0,0 +1,176 @@
+import pickle
+from types import SimpleNamespace
+import numpy as np
+import pytest
+from gui import roi
+from gui.roi import Box, ROITracker, pyramid_label, roi_box, roi_boxes
+
+# A stand-in for mtf.get_labelled_rois. Like the real one, it returns the ROIs
+# as slices of the image it is given, a strip across each side of the bright
+# rectangle in the image.
+
+
+def fake_labelled_rois(image: np.ndarray) -> tuple[dict, dict]:
+    rows = np.flatnonzero((image > 0.5).any(axis=1))
+    cols = np.flatnonzero((image > 0.5).any(axis=0))
+    if not rows.size:
+        raise ValueError("No edge object found.")
+    top, bottom, left, right = rows[0], rows[-1] + 1, cols[0], cols[-1] + 1
+    half = max((bottom - top) // 8, 2)
+    rois = {
+        "left": image[top + half : bottom - half, left - half : left + half],
+        "right": image[top + half : bottom - half, right - half : right + half],
+        "top": image[top - half : top + half, left + half : right - half],
+        "bottom": image[bottom - half : bottom + half, left + half : right - half],
+    }
+    canny = {
+        edge: np.zeros(edge_roi.shape, np.uint8) for edge, edge_roi in rois.items()
+    }
+    return rois, canny
+
+
+def copied_labelled_rois(image: np.ndarray) -> tuple[dict, dict]:
+    rois, canny = fake_labelled_rois(image)
+    return {edge: edge_roi.copy() for edge, edge_roi in rois.items()}, canny
+
+
+@pytest.fixture(
+    params=[fake_labelled_rois, copied_labelled_rois], ids=["views", "copies"]
+)
+def fake_mtf(monkeypatch, request):
+    calls = []
+
+    def get_labelled_rois(image):
+        calls.append(image.shape)
+        return request.param(image)
+
+    monkeypatch.setattr(
+        roi, "mtf", SimpleNamespace(get_labelled_rois=get_labelled_rois)
+    )
+    return calls
+
+
+def plate(top: int, left: int, shape=(600, 480), size=(160, 128)) -> np.ndarray:
+    # Noise makes every ROI unique, so copies can be located as well.
+    image = np.random.default_rng(0).normal(0, 0.01, shape)
+    image[top : top + size[0], left : left + size[1]] += 1.0
+    return image
+
+
+def test_roi_box_locates_slice():
+    image = np.zeros((50, 60))
+    assert roi_box(image, image[10:20, 5:25]) == Box(10, 5, 20, 25)
+
+
+def test_roi_box_locates_slice_of_window():
+    image = np.zeros((50, 60))
+    window = image[8:40, 4:50]
+    assert roi_box(image, window[2:12, 1:21]) == Box(10, 5, 20, 25)
+
+
+def test_roi_box_locates_copy():
+    image = np.random.default_rng(0).random((50, 60))
+    assert roi_box(image, image[10:20, 5:25].copy()) == Box(10, 5, 20, 25)
+
+
+def test_roi_box_none_for_copy_found_in_many_places():
+    image = np.zeros((50, 60))
+    assert roi_box(image, image[10:20, 5:25].copy()) is None
+
+
+def test_roi_box_none_for_strided_slice():
+    image = np.random.default_rng(0).random((50, 60))
+    assert roi_box(image, image[10:20:2, 5:25]) is None
+
+
+def test_roi_boxes_warns_when_roi_not_found():
+    image = np.random.default_rng(0).random((50, 60))
+    rois = {"left": image[10:20, 5:25], "right": image[10:20, 30:50] + 1}
+    with pytest.warns(RuntimeWarning, match="right ROI could not be located"):
+        assert roi_boxes(image, rois) == {}
+
+
+def test_pyramid_label_matches_full_search(fake_mtf):
+    image = plate(220, 176)
+    full_rois, _ = fake_labelled_rois(image)
+    labelled = pyramid_label(image, 4)
+    assert labelled is not None
+    rois, canny = labelled
+    assert roi_boxes(image, rois) == roi_boxes(image, full_rois)
+    assert canny.keys() == rois.keys()
+    # Coarse search of the downsampled image, then fine within a window.
+    assert fake_mtf[0] == (150, 120)
+    assert fake_mtf[1][0] < 600 and fake_mtf[1][1] < 480
+
+
+def test_pyramid_label_none_when_coarse_search_fails(fake_mtf):
+    assert pyramid_label(np.zeros((600, 480)), 4) is None
+
+
+def test_tracker_unknown_key(fake_mtf):
+    assert ROITracker().find(plate(220, 176), "unit") is None
+    assert not fake_mtf
+
+
+def test_tracker_finds_moved_object(fake_mtf):
+    tracker = ROITracker(tolerance=8)
+    reference = plate(220, 176)
+    tracker.remember(reference, "unit", fake_labelled_rois(reference)[0])
+
+    moved = plate(225, 170)
+    found = tracker.find(moved, "unit")
+    assert found is not None
+    rois, _ = found
+    assert roi_boxes(moved, rois) == roi_boxes(moved, fake_labelled_rois(moved)[0])
+    assert tracker.boxes["unit"] == roi_boxes(moved, rois)
+    assert (tracker.tracked, tracker.searched) == (1, 1)
+
+
+def test_tracker_rejects_object_moved_beyond_tolerance(fake_mtf):
+    tracker = ROITracker(tolerance=8)
+    reference = plate(220, 176)
+    tracker.remember(reference, "unit", fake_labelled_rois(reference)[0])
+    boxes = tracker.boxes["unit"]
+
+    assert tracker.find(plate(240, 176), "unit") is None
+    assert tracker.boxes["unit"] == boxes
+    assert tracker.tracked == 0
+
+
+def test_tracker_forgets_rois_it_cannot_locate():
+    tracker = ROITracker()
+    image = plate(220, 176)
+    tracker.remember(image, "unit", fake_labelled_rois(image)[0])
+    elsewhere = {
+        edge: edge_roi + 1 for edge, edge_roi in fake_labelled_rois(image)[0].items()
+    }
+    with pytest.warns(RuntimeWarning):
+        tracker.remember(image, "unit", elsewhere)
+    assert "unit" not in tracker.boxes
+
+
+def test_tracker_unpickles_to_one_tracker_per_process():
+    tracker = ROITracker(margin=0.25, tolerance=4)
+    image = plate(220, 176)
+    tracker.remember(image, "unit", fake_labelled_rois(image)[0])
+    first, second = pickle.loads(pickle.dumps(tracker)), pickle.loads(
+        pickle.dumps(tracker)
+    )
+    assert first is second
+    assert first.boxes["unit"] == tracker.boxes["unit"]
+
+
+def test_labelled_rois_are_located_in_the_image():
+    """
+    Pyramid search and ROI tracking need to know where the ROIs from the mtf
+    package lie in the image, and silently do nothing if they cannot.
+    """
+    mtf = pytest.importorskip("mtf")
+    from benchmarks.phantom import PhantomSpec, phantom_dataset
+    from gui.pipeline import ImagePipeline
+
+    pipeline = ImagePipeline.from_dataset(phantom_dataset(PhantomSpec()), "phantom.dcm")
+    array = pipeline.preprocessed.array
+    rois, _ = mtf.get_labelled_rois(array)
+    assert rois
+    assert roi_boxes(array, rois).keys() == rois.keys()
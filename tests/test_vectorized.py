@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+from scipy.special import erf
+from gui.vectorized import calculate_mtfs
+
+# Nyquist, in cycles/pixel
+FREQUENCIES = np.arange(0, 0.5 + 0.00125, 0.0025)
+
+
+def slanted_edge(sigma: float, angle: float = 3.0, shape=(120, 100)) -> tuple:
+    """
+    Edge ROI blurred by a Gaussian of sigma pixels, whose MTF is
+    exp(-2 pi^2 sigma^2 f^2), with its canny edge map.
+    """
+    y, x = np.indices(shape, dtype=float) + 0.5
+    tilt = np.radians(angle)
+    distance = (x - shape[1] / 2 - np.tan(tilt) * y) * np.cos(tilt)
+    roi = 0.5 * (1 + erf(distance / (np.sqrt(2) * sigma)))
+    canny = np.where(np.abs(distance) < 0.5, 255, 0).astype(np.uint8)
+    return roi, canny
+
+
+@pytest.mark.parametrize("sigma", [0.5, 0.8, 1.2])
+def test_calculate_mtfs_matches_gaussian_mtf(sigma):
+    roi, canny = slanted_edge(sigma)
+    mtfs = calculate_mtfs(
+        [roi, roi.T], [canny, canny.T], ["vertical", "horizontal"], [1, 1], FREQUENCIES
+    )
+    truth = np.exp(-2 * np.pi**2 * sigma**2 * FREQUENCIES**2)
+    # Within 0.01 of the true MTF up to Nyquist, for either edge direction.
+    np.testing.assert_allclose(mtfs, np.stack([truth, truth]), atol=0.01)
+
+
+def test_calculate_mtfs_nan_without_edge():
+    roi, canny = slanted_edge(0.8)
+    mtfs = calculate_mtfs(
+        [roi, roi], [canny, np.zeros_like(canny)], ["vertical"] * 2, [1, 1], FREQUENCIES
+    )
+    assert not np.isnan(mtfs[0]).any()
+    assert np.isnan(mtfs[1]).all()
+
+
+@pytest.mark.parametrize("sigma", [0.5, 0.8, 1.2])
+def test_calculate_mtfs_matches_mtf_package(sigma):
+    """
+    The vectorized calculation is its own estimator, fitting the edge and
+    binning at a tenth of a pixel, so it is compared with the mtf package
+    within a tolerance rather than exactly.
+    """
+    mtf = pytest.importorskip("mtf")
+    roi, canny = slanted_edge(sigma)
+    sample_spacing = 0.1
+    reference = mtf.calculate_mtf(roi, sample_spacing, canny, edge_dir="vertical")
+    f = np.asarray(reference.f)
+    below_nyquist = f <= 0.5 / sample_spacing
+    mtfs = calculate_mtfs(
+        [roi], [canny], ["vertical"], [sample_spacing], f[below_nyquist]
+    )
+    # Within 0.05 of the mtf package up to Nyquist.
+    np.testing.assert_allclose(
+        mtfs[0], np.asarray(reference.mtf)[below_nyquist], atol=0.05
+    )
+
+
+def test_batched_results_match_per_image_results(tmp_path):
+    pytest.importorskip("mtf")
+    from benchmarks.phantom import PhantomSpec, write_phantoms
+    from gui.calculator import MammoTemplateCalc
+    from gui.cli import DEFAULT_PARAMS_PATH
+    from gui.model import Model
+
+    specs = [PhantomSpec(vendor=vendor) for vendor in ("hologic", "ge", "siemens")]
+    fpaths = [str(fpath) for fpath in write_phantoms(tmp_path, specs)]
+    results = {}
+    for batch_size in (len(fpaths), 1):
+        model = Model(MammoTemplateCalc(DEFAULT_PARAMS_PATH, vectorized=True))
+        model.vectorized_batch_size = batch_size
+        results[batch_size] = {
+            result.fpath: result for result in model.iter_results(fpaths)
+        }
+    for fpath in fpaths:
+        batched, single = results[len(fpaths)][fpath], results[1][fpath]
+        assert batched.ok and single.ok
+        np.testing.assert_array_equal(batched.results_array, single.results_array)